@@ -0,0 +1,338 @@
+"""
+Agendador de ações por câmera (set_ircut dia/noite, set_white_balance, set_exposure_by_modes...)
+em horários fixos ou no nascer/pôr do sol da posição da câmera, para milhares de câmeras.
+
+As ações ficam numa roda de tempo hierárquica (níveis de 64 posições; com tick de 1 s o nível 0
+cobre 64 s, o 1 ~68 min, o 2 ~3 dias e o 3 ~6 meses): agendar e vencer custam O(1) por ação e um
+tick sem nada vencido não percorre as ações agendadas. Ao entrar na roda, cada ação ganha um
+atraso aleatório entre 0 e `espalhamento_s`, para que as 3.000 trocas das 18:00 se espalhem pela
+janela em vez de saírem juntas; na hora, vão para um pool com no máximo `concorrencia` execuções
+simultâneas.
+
+Para cada execução fica registrado o desvio real: início - horário nominal (inclui o espalhamento)
+e início - horário sorteado (atraso do tick e da fila do pool).
+
+Uso:
+    python agendador.py inventario.json agenda.json
+agenda.json:
+    [{"operacao": "set_ircut", "kwargs": {"ircut_filter_type": "night"}, "solar": "por", "deslocamento_s": 600},
+     {"operacao": "set_ircut", "kwargs": {"ircut_filter_type": "day"}, "solar": "nascer"},
+     {"operacao": "set_white_balance", "kwargs": {"white_balance_style": "auto2"}, "horario": "07:30"}]
+As câmeras do inventário com "latitude" e "longitude" recebem as ações solares; as demais são puladas.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from eventos import evento
+
+BITS_NIVEL = 6
+POSICOES = 1 << BITS_NIVEL
+
+
+def horario_solar(data, latitude, longitude, tipo="nascer"):
+    """
+    Epoch (UTC) do nascer ou pôr do sol em `data` (datetime.date) para a posição (graus, longitude
+    positiva a leste), pela equação do nascer do sol; None em dia ou noite polar.
+    """
+    jd = data.toordinal() + 1721424.5
+    n = math.ceil(jd - 2451545.0 + 0.0008)
+    j_medio = n - longitude / 360
+    m = math.radians((357.5291 + 0.98560028 * j_medio) % 360)
+    centro = 1.9148 * math.sin(m) + 0.02 * math.sin(2 * m) + 0.0003 * math.sin(3 * m)
+    eclitica = math.radians((math.degrees(m) + centro + 180 + 102.9372) % 360)
+    transito = 2451545.0 + j_medio + 0.0053 * math.sin(m) - 0.0069 * math.sin(2 * eclitica)
+    declinacao = math.asin(math.sin(eclitica) * math.sin(math.radians(23.4397)))
+    lat = math.radians(latitude)
+    cos_omega = (math.sin(math.radians(-0.833)) - math.sin(lat) * math.sin(declinacao)) / (math.cos(lat) * math.cos(declinacao))
+    if abs(cos_omega) > 1:
+        return None
+    omega = math.degrees(math.acos(cos_omega)) / 360
+    juliano = transito - omega if tipo == "nascer" else transito + omega
+    return (juliano - 2440587.5) * 86400
+
+
+def proximo_solar(latitude, longitude, tipo, deslocamento_s=0):
+    """Função que devolve o próximo nascer/pôr do sol (+ deslocamento) depois de um epoch."""
+    def proximo(apos):
+        dia = datetime.datetime.fromtimestamp(apos, datetime.timezone.utc).date()
+        for d in range(-1, 370):
+            instante = horario_solar(dia + datetime.timedelta(days=d), latitude, longitude, tipo)
+            if instante is not None and instante + deslocamento_s > apos:
+                return instante + deslocamento_s
+        return None
+    return proximo
+
+
+def proximo_diario(hora, minuto=0):
+    """Função que devolve o próximo hora:minuto (horário local da máquina) depois de um epoch."""
+    def proximo(apos):
+        base = datetime.datetime.fromtimestamp(apos)
+        alvo = base.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+        while alvo.timestamp() <= apos:
+            alvo += datetime.timedelta(days=1)
+        return alvo.timestamp()
+    return proximo
+
+
+class Acao:
+    __slots__ = ("id", "camera", "operacao", "kwargs", "nominal", "alvo", "espalhamento_s", "proximo", "cancelada", "_tick")
+
+    def __init__(self, id, camera, operacao, kwargs, nominal, espalhamento_s, proximo=None):
+        self.id = id
+        self.camera = camera
+        self.operacao = operacao
+        self.kwargs = kwargs
+        self.nominal = nominal
+        self.espalhamento_s = espalhamento_s
+        self.alvo = nominal + random.uniform(0, espalhamento_s)
+        self.proximo = proximo
+        self.cancelada = False
+        self._tick = 0
+
+    def __repr__(self):
+        return f"<Acao {self.id} {self.operacao} {self.camera['camera_ip']} em {self.alvo:.0f}>"
+
+
+class RodaTempo:
+    """Roda hierárquica: `niveis` níveis de 64 posições; o que não cabe fica em `excedentes`."""
+
+    def __init__(self, tick, niveis=4, agora=None):
+        self.tick = tick
+        self.niveis = niveis
+        self.atual = int((time.time() if agora is None else agora) // tick)
+        self._posicoes = [[[] for _ in range(POSICOES)] for _ in range(niveis)]
+        self._excedentes = []
+        self._vencidas = []
+        self.tamanho = 0
+
+    def inserir(self, acao):
+        acao._tick = math.ceil(acao.alvo / self.tick)
+        self.tamanho += 1
+        self._colocar(acao)
+
+    def _colocar(self, acao):
+        t = acao._tick
+        if t <= self.atual:
+            self._vencidas.append(acao)
+            return
+        for nivel in range(self.niveis):
+            # Menor nível em que t e o tick atual coincidem nos dígitos acima dele
+            if t >> (BITS_NIVEL * (nivel + 1)) == self.atual >> (BITS_NIVEL * (nivel + 1)):
+                self._posicoes[nivel][(t >> (BITS_NIVEL * nivel)) & (POSICOES - 1)].append(acao)
+                return
+        self._excedentes.append(acao)
+
+    def avancar(self, ate):
+        """Avança até o epoch `ate` e devolve as ações vencidas, na ordem dos ticks."""
+        vencidas, self._vencidas = self._vencidas, []
+        fim = int(ate // self.tick)
+        while self.atual < fim:
+            self.atual += 1
+            t = self.atual
+            if t & ((1 << (BITS_NIVEL * self.niveis)) - 1) == 0:
+                excedentes, self._excedentes = self._excedentes, []
+                for acao in excedentes:
+                    self._colocar(acao)
+            # Cascata: ao virar um dígito, a posição correspondente do nível de cima desce
+            for nivel in range(self.niveis - 1, 0, -1):
+                if t & ((1 << (BITS_NIVEL * nivel)) - 1) == 0:
+                    posicao = self._posicoes[nivel][(t >> (BITS_NIVEL * nivel)) & (POSICOES - 1)]
+                    descer = posicao[:]
+                    posicao.clear()
+                    for acao in descer:
+                        self._colocar(acao)
+            posicao = self._posicoes[0][t & (POSICOES - 1)]
+            vencidas += posicao
+            posicao.clear()
+            vencidas += self._vencidas
+            self._vencidas = []
+        self.tamanho -= len(vencidas)
+        return vencidas
+
+
+class Agendador:
+    """Roda de tempo + thread de ticks + pool de execução com limite de concorrência."""
+
+    def __init__(self, concorrencia=32, tick=1.0, espalhamento_s=60, historico=100_000):
+        self.tick = tick
+        self.espalhamento_s = espalhamento_s
+        self.concorrencia = concorrencia
+        self._roda = RodaTempo(tick)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._acoes = {}
+        self._pool = ThreadPoolExecutor(concorrencia, thread_name_prefix="agendador")
+        self._parar = threading.Event()
+        self._thread = None
+        self.execucoes = deque(maxlen=historico)
+
+    def agendar(self, camera, operacao, kwargs=None, quando=None, proximo=None, espalhamento_s=None):
+        """
+        Agenda `operacao` (nome de função do requests_isapi) para `camera` no epoch `quando`, ou no
+        próximo horário devolvido por `proximo(agora)`; com `proximo`, a ação se repete.
+        """
+        if quando is None:
+            quando = proximo(time.time())
+            if quando is None:
+                raise ValueError(f"Sem próximo horário para {operacao} em {camera['camera_ip']}.")
+        espalhamento = self.espalhamento_s if espalhamento_s is None else espalhamento_s
+        with self._lock:
+            acao = Acao(next(self._ids), camera, operacao, kwargs or {}, quando, espalhamento, proximo)
+            self._acoes[acao.id] = acao
+            self._roda.inserir(acao)
+        return acao.id
+
+    def agendar_solar(self, camera, operacao, kwargs=None, tipo="por", deslocamento_s=0, espalhamento_s=None):
+        """Todo dia no nascer (tipo="nascer") ou pôr do sol da latitude/longitude da câmera."""
+        proximo = proximo_solar(camera["latitude"], camera["longitude"], tipo, deslocamento_s)
+        return self.agendar(camera, operacao, kwargs, proximo=proximo, espalhamento_s=espalhamento_s)
+
+    def agendar_diario(self, camera, operacao, kwargs=None, hora=0, minuto=0, espalhamento_s=None):
+        return self.agendar(camera, operacao, kwargs, proximo=proximo_diario(hora, minuto), espalhamento_s=espalhamento_s)
+
+    def cancelar(self, acao_id):
+        # A ação continua na roda e é ignorada quando vencer
+        with self._lock:
+            acao = self._acoes.pop(acao_id, None)
+        if acao:
+            acao.cancelada = True
+
+    def pendentes(self):
+        return len(self._acoes)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="agendador-ticks", daemon=True)
+        self._thread.start()
+
+    def parar(self, esperar=True):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+        self._pool.shutdown(wait=esperar, cancel_futures=not esperar)
+
+    def _loop(self):
+        while not self._parar.is_set():
+            agora = time.time()
+            with self._lock:
+                vencidas = self._roda.avancar(agora)
+            for acao in vencidas:
+                if not acao.cancelada:
+                    self._pool.submit(self._executar, acao)
+            proximo_tick = (self._roda.atual + 1) * self.tick
+            self._parar.wait(max(0.0, proximo_tick - time.time()))
+
+    def _executar(self, acao):
+        import requests_isapi
+
+        inicio = time.time()
+        camera = acao.camera
+        registro = {"id": acao.id, "camera_ip": camera["camera_ip"], "operacao": acao.operacao,
+                    "nominal": acao.nominal, "alvo": round(acao.alvo, 3), "inicio": round(inicio, 3),
+                    "atraso_s": round(inicio - acao.nominal, 3), "desvio_s": round(inicio - acao.alvo, 3)}
+        try:
+            retorno = getattr(requests_isapi, acao.operacao)(camera["camera_ip"], camera["username"], camera["password"], **acao.kwargs)
+            registro["ok"] = bool(retorno)
+            registro["erro"] = getattr(retorno, "erro", None)
+        except Exception as e:
+            registro["ok"] = False
+            registro["erro"] = f"{type(e).__name__}: {e}"
+        registro["duracao_s"] = round(time.time() - inicio, 3)
+        self.execucoes.append(registro)
+        evento("acao_executada", logging.INFO if registro["ok"] else logging.WARNING,
+               "{operacao} em {camera_ip}: desvio {desvio_s:.3f} s", **registro)
+
+        if acao.proximo and not acao.cancelada:
+            quando = acao.proximo(max(acao.nominal, inicio))
+            with self._lock:
+                self._acoes.pop(acao.id, None)
+                if quando is not None:
+                    nova = Acao(acao.id, camera, acao.operacao, acao.kwargs, quando, acao.espalhamento_s, acao.proximo)
+                    self._acoes[nova.id] = nova
+                    self._roda.inserir(nova)
+        else:
+            with self._lock:
+                self._acoes.pop(acao.id, None)
+
+    def relatorio(self):
+        """Desvio de execução por operação: atraso sobre o nominal e desvio sobre o horário sorteado."""
+        por_operacao = {}
+        for registro in list(self.execucoes):
+            por_operacao.setdefault(registro["operacao"], []).append(registro)
+
+        def percentis(valores):
+            valores = sorted(valores)
+            return {"p50": valores[len(valores) // 2], "p95": valores[min(len(valores) - 1, int(len(valores) * 0.95))],
+                    "max": valores[-1]}
+
+        return {
+            operacao: {
+                "execucoes": len(registros),
+                "falhas": sum(not r["ok"] for r in registros),
+                "atraso_s": percentis([r["atraso_s"] for r in registros]),
+                "desvio_s": percentis([r["desvio_s"] for r in registros]),
+            }
+            for operacao, registros in por_operacao.items()
+        }
+
+
+def carregar_agenda(agendador, cameras, agenda):
+    """Agenda cada item de `agenda` (formato do agenda.json) para todas as câmeras aplicáveis."""
+    agendadas = 0
+    for item in agenda:
+        for camera in cameras:
+            if "solar" in item:
+                if camera.get("latitude") is None or camera.get("longitude") is None:
+                    continue
+                agendador.agendar_solar(camera, item["operacao"], item.get("kwargs"), item["solar"],
+                                        item.get("deslocamento_s", 0), item.get("espalhamento_s"))
+            else:
+                hora, minuto = map(int, item["horario"].split(":"))
+                agendador.agendar_diario(camera, item["operacao"], item.get("kwargs"), hora, minuto, item.get("espalhamento_s"))
+            agendadas += 1
+    return agendadas
+
+
+def main(argv=None):
+    from fleet_runner import carregar_cameras
+    import eventos
+
+    parser = argparse.ArgumentParser(description="Agenda ações por câmera (horário fixo ou nascer/pôr do sol).")
+    parser.add_argument("inventario")
+    parser.add_argument("agenda", help="JSON com a lista de ações")
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--espalhamento", type=float, default=60, help="Janela máxima de espalhamento (s)")
+    parser.add_argument("--relatorio", type=float, default=3600, help="Intervalo entre relatórios de desvio (s)")
+    args = parser.parse_args(argv)
+
+    with open(args.agenda, encoding="utf-8") as file:
+        agenda = json.load(file)
+    eventos.configurar(nivel=logging.INFO)
+    agendador = Agendador(args.concorrencia, espalhamento_s=args.espalhamento)
+    agendadas = carregar_agenda(agendador, carregar_cameras(args.inventario), agenda)
+    evento("agenda_carregada", mensagem="{acoes} ações agendadas", acoes=agendadas)
+    agendador.iniciar()
+    try:
+        while True:
+            time.sleep(args.relatorio)
+            evento("relatorio_desvio", relatorio=agendador.relatorio())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agendador.parar(esperar=False)
+        print(json.dumps(agendador.relatorio(), indent=4))
+        eventos.parar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
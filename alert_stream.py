@@ -0,0 +1,310 @@
+"""
+Consumidor do /ISAPI/Event/notification/alertStream (movimento, cruzamento de linha, etc.)
+por conexão persistente, no lugar de ficar consultando /ISAPI/System/status ou tirando snapshots.
+
+Cada câmera tem uma tarefa asyncio que lê o multipart incrementalmente (isapi_stream) e publica
+os eventos num HubEventos; os inscritos recebem por filas assíncronas limitadas. O XML do evento
+só é parseado se alguém acessar Evento.xml: tipo, estado, canal e data vêm de uma busca direta
+nos bytes. Ao cair, a conexão é refeita com backoff e os eventos reenviados na reconexão são
+descartados pela assinatura (dateTime, eventType, canal, activePostCount).
+
+Exemplo:
+    async def main():
+        servico = ServicoAlertas()
+        servico.adicionar(camera_ip, username, password)
+        inscricao = servico.hub.inscrever(tipos={"VMD", "linedetection"})
+        servico.iniciar()
+        async for evento in inscricao:
+            print(evento.camera_ip, evento.tipo, evento.estado, evento.data_hora)
+"""
+import asyncio
+import random
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+
+from isapi_stream import ErroStream, abrir_stream, partes_multipart
+
+CAMINHO_ALERT_STREAM = "/ISAPI/Event/notification/alertStream"
+
+_CAMPOS = {
+    "tipo": re.compile(rb"<eventType>([^<]*)</eventType>"),
+    "estado": re.compile(rb"<eventState>([^<]*)</eventState>"),
+    "canal": re.compile(rb"<(?:channelID|dynChannelID)>([^<]*)</(?:channelID|dynChannelID)>"),
+    "data_hora": re.compile(rb"<dateTime>([^<]*)</dateTime>"),
+    "contagem": re.compile(rb"<activePostCount>([^<]*)</activePostCount>"),
+}
+
+
+class Evento:
+    """
+    Um EventNotificationAlert. Guarda só os bytes da parte; os campos são extraídos sob demanda
+    e o ElementTree completo só é montado no primeiro acesso a .xml.
+    """
+    __slots__ = ("camera_ip", "recebido_em", "content_type", "dados", "_campos", "_xml")
+
+    def __init__(self, camera_ip, content_type, dados):
+        self.camera_ip = camera_ip
+        self.recebido_em = time.time()
+        self.content_type = content_type
+        self.dados = dados
+        self._campos = {}
+        self._xml = None
+
+    def _campo(self, nome):
+        if nome not in self._campos:
+            achado = _CAMPOS[nome].search(self.dados)
+            self._campos[nome] = achado.group(1).decode("utf-8") if achado else None
+        return self._campos[nome]
+
+    @property
+    def tipo(self):
+        return self._campo("tipo")
+
+    @property
+    def estado(self):
+        return self._campo("estado")
+
+    @property
+    def canal(self):
+        return self._campo("canal")
+
+    @property
+    def data_hora(self):
+        return self._campo("data_hora")
+
+    @property
+    def xml(self):
+        if self._xml is None:
+            self._xml = ET.fromstring(self.dados)
+        return self._xml
+
+    @property
+    def heartbeat(self):
+        # As câmeras mandam "videoloss inactive" periodicamente só para manter o stream vivo
+        return self.tipo == "videoloss" and self.estado == "inactive"
+
+    def assinatura(self):
+        return (self.data_hora, self.tipo, self.canal, self._campo("contagem"))
+
+    def __repr__(self):
+        return f"<Evento {self.camera_ip} {self.tipo} {self.estado} canal={self.canal} {self.data_hora}>"
+
+
+class Inscricao:
+    """
+    Fila de um inscrito no hub. É um iterador assíncrono; se o inscrito não acompanhar, o evento
+    mais antigo é descartado (o stream da câmera nunca espera por um consumidor lento).
+    """
+
+    def __init__(self, hub, tipos=None, cameras=None, maxsize=256):
+        self._hub = hub
+        self.tipos = set(tipos) if tipos else None
+        self.cameras = set(cameras) if cameras else None
+        self._fila = asyncio.Queue(maxsize=maxsize)
+        self.descartados = 0
+
+    def _aceita(self, evento):
+        if self.tipos is not None and evento.tipo not in self.tipos:
+            return False
+        return self.cameras is None or evento.camera_ip in self.cameras
+
+    def _entregar(self, evento):
+        if not self._aceita(evento):
+            return
+        if self._fila.full():
+            self._fila.get_nowait()
+            self.descartados += 1
+        self._fila.put_nowait(evento)
+
+    async def proximo(self, timeout=None):
+        return await asyncio.wait_for(self._fila.get(), timeout)
+
+    def cancelar(self):
+        self._hub._inscricoes.discard(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._fila.get()
+
+
+class HubEventos:
+    """Distribui cada evento publicado para todas as inscrições cujo filtro aceita o evento."""
+
+    def __init__(self):
+        self._inscricoes = set()
+        self.publicados = 0
+
+    def inscrever(self, tipos=None, cameras=None, maxsize=256):
+        inscricao = Inscricao(self, tipos=tipos, cameras=cameras, maxsize=maxsize)
+        self._inscricoes.add(inscricao)
+        return inscricao
+
+    def publicar(self, evento):
+        self.publicados += 1
+        for inscricao in tuple(self._inscricoes):
+            inscricao._entregar(evento)
+
+
+class ConsumidorAlertas:
+    """Mantém o alertStream de uma câmera aberto, reconectando com backoff exponencial e jitter."""
+
+    def __init__(self, camera_ip, username, password, hub, https=False, timeout_ocioso=60,
+                 backoff_max=60, publicar_heartbeat=False, incluir_anexos=False, max_parte=2 * 1024 * 1024):
+        self.camera_ip = camera_ip
+        self.username = username
+        self.password = password
+        self.hub = hub
+        self.https = https
+        self.timeout_ocioso = timeout_ocioso  # sem nenhuma parte nesse tempo (nem heartbeat), reconecta
+        self.backoff_max = backoff_max
+        self.publicar_heartbeat = publicar_heartbeat
+        self.incluir_anexos = incluir_anexos  # partes não-XML (ex.: imagens anexas ao evento)
+        self.max_parte = max_parte
+
+        self.parando = False
+        self._vistos = deque(maxlen=512)
+        self._vistos_set = set()
+
+        self.conectado = False
+        self.conexoes = 0
+        self.eventos = 0
+        self.duplicados = 0
+        self.ultimo_erro = None
+        self.ultima_parte_em = None
+
+    def _duplicado(self, evento):
+        assinatura = evento.assinatura()
+        if assinatura in self._vistos_set:
+            return True
+        if len(self._vistos) == self._vistos.maxlen:
+            self._vistos_set.discard(self._vistos[0])
+        self._vistos.append(assinatura)
+        self._vistos_set.add(assinatura)
+        return False
+
+    async def _consumir_uma_conexao(self, sem_conexao):
+        async with sem_conexao:
+            resposta = await abrir_stream(self.camera_ip, self.username, self.password, CAMINHO_ALERT_STREAM, https=self.https)
+        self.conectado = True
+        self.conexoes += 1
+        try:
+            boundary = resposta.boundary
+            if boundary is None:
+                raise ErroStream(f"alertStream de {self.camera_ip} não é multipart: {resposta.headers.get('content-type')}")
+
+            partes = partes_multipart(resposta.corpo, boundary, max_parte=self.max_parte).__aiter__()
+            while not self.parando:
+                headers, dados = await asyncio.wait_for(partes.__anext__(), self.timeout_ocioso)
+                self.ultima_parte_em = time.time()
+                content_type = headers.get("content-type", "")
+
+                if "xml" not in content_type and not self.incluir_anexos:
+                    continue
+                evento = Evento(self.camera_ip, content_type, dados)
+                if "xml" in content_type:
+                    if evento.heartbeat and not self.publicar_heartbeat:
+                        continue
+                    if self._duplicado(evento):
+                        self.duplicados += 1
+                        continue
+                self.eventos += 1
+                self.hub.publicar(evento)
+        finally:
+            self.conectado = False
+            await resposta.fechar()
+
+    async def executar(self, sem_conexao=None):
+        """Loop de consumo até parando=True; o ServicoAlertas marca parando e cancela a tarefa."""
+        sem_conexao = sem_conexao or asyncio.Semaphore(1)
+        espera = 1
+        # O parando complementa o cancel(): no Python 3.11 o wait_for pode engolir o cancelamento
+        # quando a leitura termina no mesmo instante, e a tarefa seguiria reconectando
+        while not self.parando:
+            inicio = time.monotonic()
+            try:
+                await self._consumir_uma_conexao(sem_conexao)
+            except asyncio.CancelledError:
+                raise
+            except StopAsyncIteration:
+                self.ultimo_erro = "stream encerrado pela câmera"
+            except (ErroStream, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                if isinstance(e, ErroStream) and e.status_code == 401:
+                    espera = self.backoff_max  # senha errada não melhora reconectando rápido
+
+            if self.parando:
+                break
+            # Conexão que durou bastante zera o backoff
+            if time.monotonic() - inicio > self.backoff_max:
+                espera = 1
+            await asyncio.sleep(espera * random.uniform(0.5, 1.0))
+            espera = min(espera * 2, self.backoff_max)
+
+    def estatisticas(self):
+        return {
+            "camera_ip": self.camera_ip,
+            "conectado": self.conectado,
+            "conexoes": self.conexoes,
+            "eventos": self.eventos,
+            "duplicados": self.duplicados,
+            "ultima_parte_em": self.ultima_parte_em,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+class ServicoAlertas:
+    """
+    Roda um ConsumidorAlertas por câmera no mesmo event loop. O semáforo limita quantas conexões
+    estão no handshake ao mesmo tempo, para não abrir centenas de sockets de uma vez ao iniciar.
+    """
+
+    def __init__(self, hub=None, conexoes_simultaneas=32):
+        self.hub = hub or HubEventos()
+        self.consumidores = {}
+        self._tarefas = {}
+        self._conexoes_simultaneas = conexoes_simultaneas
+        self._sem_conexao = None
+
+    def adicionar(self, camera_ip, username, password, **kwargs):
+        consumidor = ConsumidorAlertas(camera_ip, username, password, self.hub, **kwargs)
+        self.consumidores[camera_ip] = consumidor
+        if self._sem_conexao is not None:
+            self._iniciar_consumidor(consumidor)
+        return consumidor
+
+    def _iniciar_consumidor(self, consumidor):
+        self._tarefas[consumidor.camera_ip] = asyncio.create_task(
+            consumidor.executar(self._sem_conexao), name=f"alertStream-{consumidor.camera_ip}"
+        )
+
+    def iniciar(self):
+        """Cria as tarefas; precisa ser chamado de dentro do event loop."""
+        self._sem_conexao = asyncio.Semaphore(self._conexoes_simultaneas)
+        for consumidor in self.consumidores.values():
+            if consumidor.camera_ip not in self._tarefas:
+                self._iniciar_consumidor(consumidor)
+
+    async def remover(self, camera_ip):
+        consumidor = self.consumidores.pop(camera_ip, None)
+        if consumidor:
+            consumidor.parando = True
+        tarefa = self._tarefas.pop(camera_ip, None)
+        if tarefa:
+            tarefa.cancel()
+            await asyncio.gather(tarefa, return_exceptions=True)
+
+    async def parar(self):
+        for consumidor in self.consumidores.values():
+            consumidor.parando = True
+        tarefas = list(self._tarefas.values())
+        self._tarefas.clear()
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+    def estatisticas(self):
+        return [consumidor.estatisticas() for consumidor in self.consumidores.values()]
@@ -0,0 +1,238 @@
+"""
+Orçamento de banda por site: as câmeras de um site remoto dividem um uplink fino, e um upload de
+certificado ou um backup de configuração não pode deixar o ajuste interativo esperando.
+
+O BandaSites é um adapter montado na sessão do requests_isapi (como o ControleCarga). Cada câmera
+pertence a um site; cada site tem um orçamento em bytes/s, gasto pelos dois sentidos (corpo do
+pedido e corpo da resposta). Os corpos passam em pedaços de `pedaco` bytes e cada pedaço espera a
+vez num escalonador WFQ (weighted fair queuing) do site:
+- o tráfego é separado em classes: "interativo" (configuração), "snapshot" (.../picture) e
+  "bulk" (certificados, backup/firmware, corpos grandes), com pesos 8, 2 e 1 por padrão;
+- cada pedaço recebe o tempo virtual de término max(V, último da classe) + tamanho / peso e sai
+  o de menor término, no ritmo de um balde de fichas com a taxa do site.
+Assim um PUT de cor entra na frente dos pedaços que faltam de um PFX de 200 KB, em vez de
+esperar o upload inteiro.
+
+Câmeras sem site (ou site sem orçamento) passam direto.
+
+Exemplo:
+    banda = BandaSites.instalar(orcamentos={"fazenda-norte": 64_000}, sites={"10.8.0.21": "fazenda-norte"})
+    requests_isapi.upload_pfx_certificate_pkcs12(...)  # bulk, em pedaços
+    requests_isapi.set_color(...)                       # interativo, passa na frente
+    print(banda.estatisticas())
+"""
+import heapq
+import io
+import itertools
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from requests.adapters import BaseAdapter
+
+import requests_isapi
+
+PESOS = {"interativo": 8, "snapshot": 2, "bulk": 1}
+
+_CAMINHOS_CERTIFICADO = ("/ISAPI/Security/serverCertificate", "/ISAPI/Security/deviceCertificate")
+_CAMINHOS_BULK = ("/ISAPI/System/configurationData", "/ISAPI/System/updateFirmware")
+
+
+def classificar(metodo, caminho, tamanho_corpo=0, limite_bulk=64 * 1024):
+    """Classe de tráfego de uma requisição."""
+    if caminho.startswith("/ISAPI/Streaming/") and caminho.endswith("/picture"):
+        return "snapshot"
+    if tamanho_corpo > limite_bulk or caminho.startswith(_CAMINHOS_BULK):
+        return "bulk"
+    if caminho.startswith(_CAMINHOS_CERTIFICADO) and metodo != "GET":
+        return "bulk"
+    return "interativo"
+
+
+class Site:
+    """Escalonador WFQ de um site, com balde de fichas na taxa do orçamento."""
+
+    def __init__(self, nome, taxa, pesos=None, rajada_s=0.05, janela_s=10):
+        self.nome = nome
+        self.taxa = taxa
+        self.pesos = dict(pesos or PESOS)
+        self.rajada = taxa * rajada_s
+        self.janela_s = janela_s
+
+        self._cond = threading.Condition()
+        self._fila = []  # (término virtual, sequência)
+        self._seq = itertools.count()
+        self._virtual = 0.0
+        self._ultimo_termino = {classe: 0.0 for classe in self.pesos}
+        self._fichas = self.rajada
+        self._atualizado = time.monotonic()
+        self._inicio = self._atualizado
+        self._recentes = deque()  # (instante, bytes) da janela de utilização
+
+        self.bytes = {classe: 0 for classe in self.pesos}
+        self.pedacos = {classe: 0 for classe in self.pesos}
+        self.espera_s = {classe: 0.0 for classe in self.pesos}
+        self.espera_max_s = {classe: 0.0 for classe in self.pesos}
+
+    def _repor(self, agora):
+        self._fichas = min(self.rajada, self._fichas + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    def transmitir(self, classe, tamanho):
+        """Bloqueia até o pedaço de `tamanho` bytes da `classe` poder passar."""
+        chegada = time.monotonic()
+        with self._cond:
+            termino = max(self._virtual, self._ultimo_termino[classe]) + tamanho / self.pesos[classe]
+            self._ultimo_termino[classe] = termino
+            minha = (termino, next(self._seq))
+            heapq.heappush(self._fila, minha)
+            while True:
+                if self._fila[0] == minha:
+                    agora = time.monotonic()
+                    self._repor(agora)
+                    # Fichas podem ficar negativas: um pedaço maior que a rajada passa e é pago depois
+                    if self._fichas >= 0:
+                        self._fichas -= tamanho
+                        heapq.heappop(self._fila)
+                        self._virtual = termino
+                        break
+                    self._cond.wait(-self._fichas / self.taxa)
+                else:
+                    self._cond.wait()
+            espera = agora - chegada
+            self.bytes[classe] += tamanho
+            self.pedacos[classe] += 1
+            self.espera_s[classe] += espera
+            self.espera_max_s[classe] = max(self.espera_max_s[classe], espera)
+            self._recentes.append((agora, tamanho))
+            while self._recentes and agora - self._recentes[0][0] > self.janela_s:
+                self._recentes.popleft()
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        with self._cond:
+            agora = time.monotonic()
+            decorrido = max(agora - self._inicio, 1e-9)
+            recentes = sum(b for t, b in self._recentes if agora - t <= self.janela_s)
+            return {
+                "site": self.nome,
+                "taxa_bytes_s": self.taxa,
+                "utilizacao": round(sum(self.bytes.values()) / (decorrido * self.taxa), 3),
+                "utilizacao_janela": round(recentes / (min(decorrido, self.janela_s) * self.taxa), 3),
+                "na_fila": len(self._fila),
+                "classes": {
+                    classe: {
+                        "bytes": self.bytes[classe],
+                        "pedacos": self.pedacos[classe],
+                        "espera_media_ms": round(self.espera_s[classe] / self.pedacos[classe] * 1000, 2) if self.pedacos[classe] else 0.0,
+                        "espera_max_ms": round(self.espera_max_s[classe] * 1000, 2),
+                    }
+                    for classe in self.pesos
+                },
+            }
+
+
+class _CorpoRitmado(io.RawIOBase):
+    """Corpo do pedido lido pelo http.client em blocos; cada bloco passa pelo escalonador do site."""
+
+    def __init__(self, dados, site, classe, pedaco):
+        self._dados = memoryview(dados)
+        self._posicao = 0
+        self._site = site
+        self._classe = classe
+        self._pedaco = pedaco
+
+    def __len__(self):
+        return len(self._dados)
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        if self._posicao >= len(self._dados):
+            return b""
+        n = self._pedaco if n is None or n < 0 else min(n, self._pedaco)
+        bloco = self._dados[self._posicao:self._posicao + n]
+        self._site.transmitir(self._classe, len(bloco))
+        self._posicao += len(bloco)
+        return bytes(bloco)
+
+
+class BandaSites(BaseAdapter):
+    """Adapter com um escalonador WFQ por site; `sites` mapeia camera_ip (host[:porta]) -> site."""
+
+    def __init__(self, internos, orcamentos, sites, pesos=None, pedaco=16 * 1024, classificador=classificar):
+        super().__init__()
+        self.internos = internos  # prefixo -> adapter original
+        self.sites = dict(sites)
+        self.pedaco = pedaco
+        self.classificador = classificador
+        self._sites = {nome: Site(nome, taxa, pesos) for nome, taxa in orcamentos.items()}
+
+    @classmethod
+    def instalar(cls, orcamentos, sites, sessao=None, **kwargs):
+        """Envolve os adapters da sessão (padrão: requests_isapi.sessao) e devolve o escalonador."""
+        sessao = sessao or requests_isapi.sessao
+        atual = sessao.get_adapter("http://")
+        if isinstance(atual, BandaSites):
+            return atual
+        banda = cls({prefixo: sessao.get_adapter(prefixo) for prefixo in ("https://", "http://")}, orcamentos, sites, **kwargs)
+        for prefixo in banda.internos:
+            sessao.mount(prefixo, banda)
+        return banda
+
+    @classmethod
+    def de_inventario(cls, cameras, orcamentos, **kwargs):
+        """Instala usando o campo "site" de cada câmera do inventário."""
+        return cls.instalar(orcamentos, {c["camera_ip"]: c["site"] for c in cameras if c.get("site")}, **kwargs)
+
+    def site(self, nome):
+        return self._sites[nome]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        interno = self.internos["https://" if partes.scheme == "https" else "http://"]
+        site = self._sites.get(self.sites.get(partes.netloc) or self.sites.get(partes.hostname))
+        if site is None:
+            resposta = interno.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            resposta.connection = self
+            return resposta
+
+        corpo = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        tamanho = len(corpo) if isinstance(corpo, bytes) else 0
+        classe = self.classificador(request.method, partes.path, tamanho)
+
+        enviado = request
+        if tamanho:
+            # Cópia: o HTTPDigestAuth reenvia o request original (com o corpo inteiro) depois do 401
+            enviado = request.copy()
+            enviado.body = _CorpoRitmado(corpo, site, classe, self.pedaco)
+        resposta = interno.send(enviado, stream=True, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        resposta.request = request
+
+        # Corpo da resposta lido em pedaços, cada um pago no orçamento do site
+        if resposta.raw is None or resposta._content_consumed:
+            # Adapter interno sem urllib3 (Reprodutor, CacheConfiguracao, VooUnico, respostas
+            # gravadas): o corpo já está em memória e só o ritmo é aplicado, pedaço a pedaço
+            corpo_resposta = resposta.content or b""
+            for inicio in range(0, len(corpo_resposta), self.pedaco):
+                site.transmitir(classe, len(corpo_resposta[inicio:inicio + self.pedaco]))
+        else:
+            partes_corpo = []
+            for bloco in resposta.raw.stream(self.pedaco, decode_content=True):
+                site.transmitir(classe, len(bloco))
+                partes_corpo.append(bloco)
+            resposta._content = b"".join(partes_corpo)
+            resposta._content_consumed = True
+
+        # O HTTPDigestAuth reenvia pelo resposta.connection: a perna autenticada também é escalonada
+        resposta.connection = self
+        return resposta
+
+    def close(self):
+        for interno in set(self.internos.values()):
+            interno.close()
+
+    def estatisticas(self):
+        return [site.estatisticas() for site in self._sites.values()]
@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks do custo do lado Python de requests_isapi: montagem dos payloads XML,
+leitura do ResponseStatus, formatação do salvar_xml_conteudo e o JSON dos certificados.
+
+As respostas da câmera (inclusive o desafio Digest 401) vêm de benchmarks/respostas/ e são
+servidas por um adapter montado na sessão do módulo, então tudo roda offline.
+
+Uso:
+    python benchmarks/bench_isapi.py executar                    # mede e mostra os tempos
+    python benchmarks/bench_isapi.py executar --salvar-baseline  # grava benchmarks/baseline.json
+    python benchmarks/bench_isapi.py comparar --limite 0.25      # exit 1 se algum caso piorar mais de 25%
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+DIR_BENCH = Path(__file__).resolve().parent
+sys.path.insert(0, str(DIR_BENCH.parent))
+
+import requests_isapi  # noqa: E402
+
+DIR_RESPOSTAS = DIR_BENCH / "respostas"
+ARQUIVO_BASELINE = DIR_BENCH / "baseline.json"
+
+CAMERA_IP = "192.0.2.10"
+USERNAME = "admin"
+PASSWORD = "senha-de-bench"
+
+# Mesmo formato do WWW-Authenticate devolvido pelas câmeras Hikvision
+DESAFIO_DIGEST = 'Digest qop="auth", realm="IP Camera(C6258)", nonce="4e5449794d444d354f4451364f446c6a5a6a4d305a44453d", stale="FALSE"'
+
+
+def carregar_rotas():
+    """Mapeia (método, caminho) -> (status, content-type, corpo) a partir das respostas gravadas."""
+    def ler(nome):
+        return (DIR_RESPOSTAS / nome).read_bytes()
+
+    status_ok = (200, "application/xml", ler("response_status_ok.xml"))
+    return {
+        ("GET", "/ISAPI/Security/UserPermission/1"): (200, "application/xml", ler("user_permission.xml")),
+        ("GET", "/ISAPI/Image/channels"): (200, "application/xml", ler("image_channels.xml")),
+        ("GET", "/ISAPI/System/capabilities"): (200, "application/xml", ler("system_capabilities.xml")),
+        ("GET", "/ISAPI/System/status"): (200, "application/xml", ler("device_status.xml")),
+        ("GET", "/ISAPI/Security/serverCertificate/certificates"): (200, "application/json", ler("server_certificates.json")),
+        ("PUT", "/ISAPI/Image/channels/1/exposure"): status_ok,
+        ("PUT", "/ISAPI/Image/channels/1/gain"): status_ok,
+        ("PUT", "/ISAPI/Image/channels/1/whiteBalance"): status_ok,
+        ("PUT", "/ISAPI/Image/channels/1/color"): status_ok,
+        ("PUT", "/ISAPI/Image/channels/1/sharpness"): status_ok,
+    }
+
+
+class RespostasGravadasAdapter(BaseAdapter):
+    """Adapter do requests que responde com as respostas gravadas, sem abrir conexão."""
+
+    def __init__(self, rotas, desafio_digest=True):
+        super().__init__()
+        self.rotas = rotas
+        self.desafio_digest = desafio_digest
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        # Como a câmera, exige o handshake Digest: sem Authorization a resposta é 401
+        if self.desafio_digest and "Authorization" not in request.headers:
+            return self._resposta(request, 401, "text/html", b"", {"WWW-Authenticate": DESAFIO_DIGEST})
+
+        caminho = urlsplit(request.url).path
+        status, content_type, corpo = self.rotas.get((request.method, caminho), (404, "text/plain", b"Not Found"))
+        return self._resposta(request, status, content_type, corpo)
+
+    def _resposta(self, request, status, content_type, corpo, headers_extras=None):
+        resposta = Response()
+        resposta.status_code = status
+        resposta.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(corpo))})
+        if headers_extras:
+            resposta.headers.update(headers_extras)
+        resposta._content = corpo
+        resposta._content_consumed = True
+        resposta.encoding = "utf-8"
+        resposta.url = request.url
+        resposta.request = request
+        resposta.connection = self
+        return resposta
+
+    def close(self):
+        pass
+
+
+def montar_casos(dir_saida):
+    """Casos de benchmark: nome -> função sem argumentos."""
+    r = requests_isapi
+    xml_capabilities = (DIR_RESPOSTAS / "system_capabilities.xml").read_bytes()
+    arquivo_xml = os.path.join(dir_saida, "saida.xml")
+
+    return {
+        "set_exposure_by_modes[p-iris-manual]": lambda: r.set_exposure_by_modes(CAMERA_IP, USERNAME, PASSWORD, modo="p-iris-manual", iris_level=20),
+        "set_gain_level": lambda: r.set_gain_level(CAMERA_IP, USERNAME, PASSWORD, channel_id=1, gain_level=40),
+        "set_white_balance[manual]": lambda: r.set_white_balance(CAMERA_IP, USERNAME, PASSWORD, channel_id=1, white_balance_style="manual", white_balance_red=60, white_balance_blue=70),
+        "set_image_adjustment": lambda: r.set_image_adjustment(CAMERA_IP, USERNAME, PASSWORD, channel_id=1),
+        "salvar_xml_conteudo[DeviceCap]": lambda: r.salvar_xml_conteudo(xml_capabilities, arquivo_xml),
+        "get_system_capacities": lambda: r.get_system_capacities(CAMERA_IP, USERNAME, PASSWORD, output_file=arquivo_xml),
+        "get_device_status_capacities": lambda: r.get_device_status_capacities(CAMERA_IP, USERNAME, PASSWORD, output_file=arquivo_xml),
+        "get_parametros_imagem": lambda: r.get_parametros_imagem(CAMERA_IP, USERNAME, PASSWORD, output_file=arquivo_xml),
+        "get_server_certificates": lambda: r.get_server_certificates(CAMERA_IP, USERNAME, PASSWORD, https=False),
+    }
+
+
+def executar(repeticoes=7, filtro=None):
+    """Roda os casos e devolve {nome: {"mediana_us": ..., "min_us": ...}} (tempo por chamada)."""
+    adapter = RespostasGravadasAdapter(carregar_rotas())
+    requests_isapi.sessao.mount("http://", adapter)
+    requests_isapi.sessao.mount("https://", adapter)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as dir_saida:
+        for nome, funcao in montar_casos(dir_saida).items():
+            if filtro and filtro not in nome:
+                continue
+            # Sem eventos.configurar() os eventos INFO ficam abaixo do nível do logger "isapi":
+            # o que se mede é o custo de um evento desligado, como numa frota em produção
+            timer = timeit.Timer(funcao)
+            numero, _ = timer.autorange()
+            tempos = [t / numero * 1e6 for t in timer.repeat(repeat=repeticoes, number=numero)]
+            resultados[nome] = {"mediana_us": round(statistics.median(tempos), 2), "min_us": round(min(tempos), 2)}
+            print(f"{nome:<40} mediana {resultados[nome]['mediana_us']:>10.2f} us   min {resultados[nome]['min_us']:>10.2f} us")
+    return resultados
+
+
+def salvar_baseline(resultados, arquivo=ARQUIVO_BASELINE):
+    conteudo = {
+        "meta": {"python": platform.python_version(), "plataforma": platform.platform()},
+        "casos": resultados,
+    }
+    with open(arquivo, "w", encoding="utf-8") as file:
+        json.dump(conteudo, file, indent=4, ensure_ascii=False)
+        file.write("\n")
+    print(f"Baseline salva em '{arquivo}'.")
+
+
+def comparar(resultados, limite, arquivo=ARQUIVO_BASELINE):
+    """
+    Compara com a baseline pelo menor tempo por chamada (o mínimo é bem menos sensível ao ruído
+    da máquina que a mediana). Retorna a lista de casos que pioraram mais que o limite.
+    """
+    with open(arquivo, encoding="utf-8") as file:
+        baseline = json.load(file)["casos"]
+
+    regressoes = []
+    print(f"\n{'caso (min us)':<40} {'baseline':>12} {'atual':>12} {'razão':>8}")
+    for nome, atual in resultados.items():
+        if nome not in baseline:
+            print(f"{nome:<40} {'-':>12} {atual['min_us']:>12.2f} {'novo':>8}")
+            continue
+        base = baseline[nome]["min_us"]
+        razao = atual["min_us"] / base
+        marca = ""
+        if razao > 1 + limite:
+            regressoes.append(nome)
+            marca = "  <-- REGRESSÃO"
+        print(f"{nome:<40} {base:>12.2f} {atual['min_us']:>12.2f} {razao:>8.2f}{marca}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do lado cliente de requests_isapi (offline).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_exec = sub.add_parser("executar", help="Mede os casos")
+    p_exec.add_argument("--salvar-baseline", action="store_true", help="Grava o resultado como nova baseline")
+
+    p_comp = sub.add_parser("comparar", help="Mede e compara com a baseline gravada")
+    p_comp.add_argument("--limite", type=float, default=0.25, help="Piora relativa tolerada (0.25 = 25%%)")
+
+    for p in (p_exec, p_comp):
+        p.add_argument("--repeticoes", type=int, default=7)
+        p.add_argument("--filtro", default=None, help="Roda só os casos cujo nome contém esse texto")
+        p.add_argument("--baseline", default=str(ARQUIVO_BASELINE), help="Arquivo de baseline")
+
+    args = parser.parse_args(argv)
+    resultados = executar(repeticoes=args.repeticoes, filtro=args.filtro)
+
+    if args.comando == "executar":
+        if args.salvar_baseline:
+            salvar_baseline(resultados, args.baseline)
+        return 0
+
+    regressoes = comparar(resultados, args.limite, args.baseline)
+    if regressoes:
+        print(f"\n{len(regressoes)} caso(s) acima do limite de {args.limite:.0%}: {', '.join(regressoes)}")
+        return 1
+    print("\nNenhuma regressão acima do limite.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
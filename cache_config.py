@@ -0,0 +1,270 @@
+"""
+Cache por câmera das configurações de imagem (/ISAPI/Image/...), para os painéis que leem muito
+mais do que escrevem.
+
+Como o ControleCarga, o CacheConfiguracao é um adapter do requests montado na sessão do
+requests_isapi, então get_color_config, get_exposure_mode, get_parametros_imagem e qualquer outro
+GET em /ISAPI/Image/ passam a ser servidos localmente enquanto a entrada não expirar, sem mudar as
+funções. O get_parametros_imagem pergunta ao cache (em_cache) antes do verificar_camera_conectada
+e, com a entrada de /ISAPI/Image/channels válida, pula essa verificação; sem ela, a verificação
+vai à câmera como antes (não é configuração e não entra no cache).
+
+Escrita direta (write-through): um PUT com resposta 200 e ResponseStatus OK aplica os valores do
+XML enviado nas entradas em cache do mesmo recurso e dos recursos que o contêm, por exemplo
+um set_color em .../channels/1/color atualiza a entrada de .../channels/1/color e o <Color> do
+canal 1 dentro da entrada de /ISAPI/Image/channels. Se algum valor não puder ser aplicado sem
+ambiguidade (tag ausente ou repetida no trecho), a entrada é descartada. PUTs que falharam,
+outros métodos e PUTs no documento inteiro descartam as entradas afetadas.
+
+As entradas são separadas pela credencial (usuário e senha do HTTPDigestAuth da requisição): uma
+leitura só é servida do cache a quem tem as mesmas credenciais que a câmera aceitou ao preencher a
+entrada; senha errada vai à câmera e recebe o 401 dela.
+
+Exemplo:
+    cache = CacheConfiguracao.instalar(ttl=300)
+    requests_isapi.get_color_config(camera_ip, username, password)  # vai à câmera
+    requests_isapi.set_color(camera_ip, username, password, brightness=60)  # atualiza o cache
+    requests_isapi.get_color_config(camera_ip, username, password)  # servido localmente, brightness 60
+    print(cache.estatisticas())
+"""
+import datetime
+import logging
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import requests_isapi
+from eventos import evento
+
+PREFIXO_IMAGEM = "/ISAPI/Image/channels"
+
+_CAMINHO_CANAL = re.compile(r"^/ISAPI/Image/channels/(\d+)(?:/(.+))?$")
+_FOLHA = re.compile(r"<(\w+)(?:\s[^>]*)?>([^<]*)</\1>")
+_RAIZ = re.compile(r"<(\w+)[\s>]")
+
+
+def _bloco(texto, tag, inicio=0, fim=None):
+    """(início, fim) do primeiro elemento `tag` em texto[inicio:fim], ou None."""
+    fim = len(texto) if fim is None else fim
+    abertura = re.compile(rf"<{tag}[\s>/]").search(texto, inicio, fim)
+    if not abertura:
+        return None
+    fechamento = texto.find(f"</{tag}>", abertura.start(), fim)
+    if fechamento < 0:
+        return None
+    return abertura.start(), fechamento + len(tag) + 3
+
+
+def _raiz(xml):
+    for encontrado in _RAIZ.finditer(xml):
+        if not xml[encontrado.start() + 1] in "?!":
+            return encontrado.group(1)
+    return None
+
+
+def aplicar_put(cacheado, enviado, canal=None):
+    """
+    Aplica os valores folha do XML `enviado` (corpo do PUT) no XML `cacheado`, dentro do elemento
+    com a mesma raiz do enviado; com `canal`, dentro do <ImageChannel> de <id> igual. Devolve o
+    novo texto ou None se não der para aplicar sem ambiguidade.
+    """
+    raiz = _raiz(enviado)
+    if raiz is None:
+        return None
+    inicio, fim = 0, len(cacheado)
+    if canal is not None:
+        posicao = 0
+        while True:
+            trecho = _bloco(cacheado, "ImageChannel", posicao)
+            if trecho is None:
+                return None
+            if re.search(rf"<id>\s*{canal}\s*</id>", cacheado[trecho[0]:trecho[1]]):
+                inicio, fim = trecho
+                break
+            posicao = trecho[1]
+    trecho = _bloco(cacheado, raiz, inicio, fim)
+    if trecho is None:
+        return None
+    inicio, fim = trecho
+
+    novo = cacheado
+    for tag, valor in _FOLHA.findall(enviado):
+        padrao = re.compile(rf"(<{tag}(?:\s[^>]*)?>)[^<]*(</{tag}>)")
+        ocorrencias = list(padrao.finditer(novo, inicio, fim))
+        if len(ocorrencias) != 1:
+            return None
+        antes = len(novo)
+        ocorrencia = ocorrencias[0]
+        novo = novo[:ocorrencia.start()] + ocorrencia.group(1) + valor + ocorrencia.group(2) + novo[ocorrencia.end():]
+        fim += len(novo) - antes
+    return novo
+
+
+class _Entrada:
+    __slots__ = ("status_code", "headers", "conteudo", "expira_em")
+
+    def __init__(self, status_code, headers, conteudo, expira_em):
+        self.status_code = status_code
+        self.headers = headers
+        self.conteudo = conteudo
+        self.expira_em = expira_em
+
+
+class CacheConfiguracao(BaseAdapter):
+    """Adapter com cache dos GETs de configuração e escrita direta dos PUTs bem-sucedidos."""
+
+    def __init__(self, internos, ttl=300, prefixos=(PREFIXO_IMAGEM,)):
+        super().__init__()
+        self.internos = internos  # prefixo -> adapter original
+        self.ttl = ttl
+        self.prefixos = tuple(prefixos)
+        self._entradas = {}  # (host, caminho, query, credencial) -> _Entrada
+        self._lock = threading.Lock()
+
+        self.acertos = 0
+        self.falhas = 0
+        self.expiradas = 0
+        self.escritas = 0
+        self.descartes = 0
+
+    @classmethod
+    def instalar(cls, sessao=None, **kwargs):
+        """Envolve os adapters da sessão (padrão: requests_isapi.sessao) e devolve o cache."""
+        sessao = sessao or requests_isapi.sessao
+        atual = sessao.get_adapter("http://")
+        if isinstance(atual, CacheConfiguracao):
+            return atual
+        cache = cls({prefixo: sessao.get_adapter(prefixo) for prefixo in ("https://", "http://")}, **kwargs)
+        for prefixo in cache.internos:
+            sessao.mount(prefixo, cache)
+        return cache
+
+    def _cacheavel(self, caminho):
+        return caminho.startswith(self.prefixos)
+
+    def em_cache(self, url, auth=None):
+        """True se um GET de url com o HTTPDigestAuth `auth` seria servido localmente agora."""
+        partes = urlsplit(url)
+        credencial = requests_isapi._impressao_credencial(auth.username, auth.password) if auth is not None else None
+        with self._lock:
+            entrada = self._entradas.get((partes.netloc, partes.path, partes.query, credencial))
+            return entrada is not None and entrada.expira_em > time.monotonic()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        if not self._cacheavel(partes.path) or stream:
+            return self._repassar(request, partes, stream, timeout, verify, cert, proxies)
+
+        credencial = requests_isapi._credencial_da_requisicao(request)
+        chave = (partes.netloc, partes.path, partes.query, credencial)
+        if request.method == "GET":
+            with self._lock:
+                entrada = self._entradas.get(chave)
+                if entrada is not None and entrada.expira_em <= time.monotonic():
+                    del self._entradas[chave]
+                    self.expiradas += 1
+                    entrada = None
+                if entrada is not None:
+                    self.acertos += 1
+                    return self._resposta(request, entrada)
+                # A primeira perna do Digest (sem Authorization) e a autenticada são o mesmo GET:
+                # só a autenticada conta
+                if credencial is None or "Authorization" in request.headers:
+                    self.falhas += 1
+
+        resposta = self._repassar(request, partes, stream, timeout, verify, cert, proxies)
+        if request.method == "GET":
+            if resposta.status_code == 200:
+                with self._lock:
+                    self._entradas[chave] = _Entrada(200, dict(resposta.headers), resposta.content,
+                                                     time.monotonic() + self.ttl)
+        elif resposta.status_code != 401:
+            # O 401 é a primeira perna do Digest: o PUT ainda vai ser reenviado
+            self._escrever(partes, request, resposta)
+        return resposta
+
+    def _repassar(self, request, partes, stream, timeout, verify, cert, proxies):
+        interno = self.internos["https://" if partes.scheme == "https" else "http://"]
+        resposta = interno.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        # O HTTPDigestAuth reenvia pelo resposta.connection: apontando para cá, o PUT autenticado
+        # também passa pelo cache
+        resposta.connection = self
+        return resposta
+
+    def _resposta(self, request, entrada):
+        resposta = Response()
+        resposta.status_code = entrada.status_code
+        resposta.reason = "OK"
+        resposta.headers = CaseInsensitiveDict(entrada.headers)
+        resposta.encoding = get_encoding_from_headers(resposta.headers)
+        resposta._content = entrada.conteudo
+        resposta.url = request.url
+        resposta.request = request
+        resposta.elapsed = datetime.timedelta(0)
+        resposta.connection = self
+        return resposta
+
+    def _escrever(self, partes, request, resposta):
+        host, caminho = partes.netloc, partes.path
+        corpo = request.body.decode("utf-8", "replace") if isinstance(request.body, bytes) else (request.body or "")
+        ok = request.method == "PUT" and resposta.status_code == 200 and "<statusString>OK</statusString>" in resposta.text
+
+        recurso = _CAMINHO_CANAL.match(caminho)
+        with self._lock:
+            for chave in [c for c in self._entradas if c[0] == host]:
+                cacheado = chave[1]
+                if cacheado == caminho:
+                    canal = None
+                elif recurso and recurso.group(2) and cacheado == f"{PREFIXO_IMAGEM}/{recurso.group(1)}":
+                    canal = None  # ImageChannel de um canal: o recurso é um trecho dele
+                elif recurso and recurso.group(2) and cacheado == PREFIXO_IMAGEM:
+                    canal = recurso.group(1)
+                elif cacheado.startswith(caminho + "/"):
+                    # PUT num documento que contém a entrada (ex.: set_parametros_imagem)
+                    self._descartar(chave)
+                    continue
+                else:
+                    continue
+
+                entrada = self._entradas[chave]
+                novo = aplicar_put(entrada.conteudo.decode("utf-8", "replace"), corpo, canal) if ok and corpo else None
+                if novo is None:
+                    self._descartar(chave)
+                else:
+                    entrada.conteudo = novo.encode("utf-8")
+                    self.escritas += 1
+        if ok:
+            evento("cache_escrito", logging.DEBUG, camera_ip=host, caminho=caminho)
+
+    def _descartar(self, chave):
+        del self._entradas[chave]
+        self.descartes += 1
+
+    def invalidar(self, camera_ip=None, caminho=None):
+        """Descarta as entradas da câmera (ou de todas), opcionalmente só as do `caminho`."""
+        with self._lock:
+            for chave in [c for c in self._entradas
+                          if (camera_ip is None or c[0] == camera_ip) and (caminho is None or c[1] == caminho)]:
+                self._descartar(chave)
+
+    def close(self):
+        for interno in set(self.internos.values()):
+            interno.close()
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            "entradas": len(self._entradas),
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / consultas, 3) if consultas else 0.0,
+            "expiradas": self.expiradas,
+            "escritas": self.escritas,
+            "descartes": self.descartes,
+        }
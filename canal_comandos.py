@@ -0,0 +1,189 @@
+"""
+Canal de comandos por câmera para ajustes vindos de sliders (brilho, contraste, ganho, íris...).
+
+Cada chamada a enviar() só substitui o valor pendente daquele parâmetro: se o operador mexer o
+slider 50 vezes enquanto um PUT está em andamento, apenas o último valor é mandado. Uma única
+thread por câmera despacha os pendentes em sequência, pela conexão keep-alive da sessão de
+requests_isapi e com o Digest já autenticado, então a câmera fica no máximo um lote atrás do operador.
+
+Exemplo:
+    canal = obter_canal(camera_ip, username, password)
+    canal.enviar("brightness", 60)
+    canal.enviar("gain", 30)
+    print(canal.estatisticas())
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import requests_isapi
+from eventos import evento
+
+# brilho, contraste e saturação vão juntos num único PUT em /color
+PARAMETROS_COR = ("brightness", "contrast", "saturation")
+PARAMETROS_VALIDOS = PARAMETROS_COR + ("gain", "iris")
+
+
+class CanalComandos:
+    """
+    Fila "último valor vence" de uma câmera. O lote pendente é um dict parametro -> (valor, instante
+    do primeiro pedido ainda não enviado), então o tamanho da fila nunca passa do número de parâmetros.
+
+    A latência registrada vai do primeiro pedido absorvido pelo lote até a resposta da câmera, ou
+    seja, o atraso que o operador enxerga, e não só o tempo do último PUT.
+    """
+
+    def __init__(self, camera_ip, username, password, channel_id=1, ao_aplicar=None, historico=256):
+        self.camera_ip = camera_ip
+        self.username = username
+        self.password = password
+        self.channel_id = channel_id
+        self.ao_aplicar = ao_aplicar  # callback(parametro, valor, ok, latencia_s)
+
+        self._pendentes = {}
+        self._cond = threading.Condition()
+        self._fechado = False
+        self._enviando = False
+
+        self.pedidos = 0
+        self.coalescidos = 0
+        self.enviados = 0
+        self.falhas = 0
+        self._latencias = deque(maxlen=historico)
+
+        self._thread = threading.Thread(target=self._loop, name=f"canal-{camera_ip}", daemon=True)
+        self._thread.start()
+
+    def enviar(self, parametro, valor):
+        """Agenda o valor do parâmetro, substituindo um valor ainda não enviado."""
+        if parametro not in PARAMETROS_VALIDOS:
+            raise ValueError(f"Parâmetro inválido. Escolha entre: {', '.join(PARAMETROS_VALIDOS)}")
+
+        with self._cond:
+            if self._fechado:
+                raise RuntimeError(f"Canal da câmera {self.camera_ip} já foi fechado.")
+            self.pedidos += 1
+            if parametro in self._pendentes:
+                self.coalescidos += 1
+                _, instante = self._pendentes[parametro]
+            else:
+                instante = time.perf_counter()
+            self._pendentes[parametro] = (valor, instante)
+            self._cond.notify()
+
+    def aguardar(self, timeout=None):
+        """Bloqueia até não haver nada pendente nem em envio. Retorna False se o timeout estourar."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pendentes and not self._enviando, timeout)
+
+    def fechar(self, esperar=True, timeout=None):
+        """Encerra o canal; com esperar=True ainda despacha o que estiver pendente."""
+        with self._cond:
+            self._fechado = True
+            if not esperar:
+                self._pendentes.clear()
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._cond:
+            ultima = self._latencias[-1] if self._latencias else None
+            latencias = sorted(self._latencias)
+            estat = {
+                "camera_ip": self.camera_ip,
+                "pedidos": self.pedidos,
+                "coalescidos": self.coalescidos,
+                "enviados": self.enviados,
+                "falhas": self.falhas,
+                "pendentes": len(self._pendentes),
+            }
+        if latencias:
+            estat["latencia_ms"] = {
+                "ultima": round(ultima * 1000, 2),
+                "media": round(sum(latencias) / len(latencias) * 1000, 2),
+                "p95": round(latencias[int(0.95 * (len(latencias) - 1))] * 1000, 2),
+                "max": round(latencias[-1] * 1000, 2),
+            }
+        return estat
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pendentes or self._fechado)
+                if not self._pendentes:
+                    return
+                lote, self._pendentes = self._pendentes, {}
+                self._enviando = True
+
+            try:
+                self._despachar(lote)
+            finally:
+                with self._cond:
+                    self._enviando = False
+                    self._cond.notify_all()
+
+    def _despachar(self, lote):
+        cor = {p: lote.pop(p) for p in PARAMETROS_COR if p in lote}
+        if cor:
+            self._aplicar(cor, requests_isapi.set_color, channel_id=self.channel_id,
+                          **{p: valor for p, (valor, _) in cor.items()})
+
+        if "gain" in lote:
+            valor, _ = lote["gain"]
+            self._aplicar({"gain": lote["gain"]}, requests_isapi.set_gain_level, channel_id=self.channel_id, gain_level=valor)
+
+        if "iris" in lote:
+            valor, _ = lote["iris"]
+            self._aplicar({"iris": lote["iris"]}, requests_isapi.set_exposure_by_modes,
+                          modo="p-iris-manual", iris_level=valor, channel_id=self.channel_id)
+
+    def _aplicar(self, aplicados, funcao, **kwargs):
+        # Uma exceção (do setter ou do ao_aplicar) conta como falha do lote e não derruba a thread
+        try:
+            ok = bool(funcao(self.camera_ip, self.username, self.password, **kwargs))
+        except Exception as e:
+            ok = False
+            evento("comando_falhou", logging.WARNING, "{parametros} em {camera_ip}: {erro}",
+                   camera_ip=self.camera_ip, parametros=", ".join(aplicados), erro=f"{type(e).__name__}: {e}")
+        self._registrar(aplicados, ok)
+
+    def _registrar(self, aplicados, ok):
+        agora = time.perf_counter()
+        latencias = {parametro: agora - instante for parametro, (_, instante) in aplicados.items()}
+        with self._cond:
+            if ok:
+                self.enviados += len(aplicados)
+                self._latencias.extend(latencias.values())
+            else:
+                self.falhas += len(aplicados)
+        if self.ao_aplicar:
+            for parametro, (valor, _) in aplicados.items():
+                try:
+                    self.ao_aplicar(parametro, valor, ok, latencias[parametro])
+                except Exception as e:
+                    evento("ao_aplicar_falhou", logging.WARNING, "Callback de {parametro} em {camera_ip}: {erro}",
+                           camera_ip=self.camera_ip, parametro=parametro, erro=f"{type(e).__name__}: {e}")
+
+
+_canais = {}
+_canais_lock = threading.Lock()
+
+
+def obter_canal(camera_ip, username, password, channel_id=1):
+    """Devolve o canal da câmera/canal de vídeo, criando na primeira chamada."""
+    chave = (camera_ip, channel_id)
+    with _canais_lock:
+        canal = _canais.get(chave)
+        if canal is None or canal._fechado:
+            canal = CanalComandos(camera_ip, username, password, channel_id=channel_id)
+            _canais[chave] = canal
+        return canal
+
+
+def fechar_canais(esperar=True):
+    with _canais_lock:
+        canais = list(_canais.values())
+        _canais.clear()
+    for canal in canais:
+        canal.fechar(esperar=esperar)
@@ -0,0 +1,283 @@
+"""
+Índice de capacidades da frota a partir do /ISAPI/System/capabilities (DeviceCap).
+
+Cada flag isSupport* ganha uma posição de bit fixa (a ordem em que apareceu pela primeira vez) e
+cada câmera uma linha de `palavras` inteiros de 64 bits, guardadas lado a lado num único bloco de
+bytes: 10.000 câmeras com até 128 flags ocupam 160 KB, contra milhares de XMLs formatados.
+
+Perguntas como "quais câmeras suportam EIS e correção de distorção" não percorrem as câmeras uma a
+uma: o bloco inteiro vira um único int do Python (int.from_bytes) e a consulta é feita com
+operações bit a bit sobre todas as linhas de uma vez (SWAR: cada linha é uma "lane"), em C.
+
+Uma flag que aparece em mais de uma seção do DeviceCap conta como suportada se alguma delas for true.
+
+Uso:
+    python capacidades.py coletar inventario.json --indice capacidades.idx
+    python capacidades.py consultar --indice capacidades.idx isSupportEIS isSupportLensDistortionCorrection
+    python capacidades.py consultar --indice capacidades.idx isSupportEIS --sem isSupportWireless
+"""
+import argparse
+import json
+import os
+import re
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+
+_FLAG = re.compile(rb"<(isSupport\w*)>\s*(true|false)\s*</")
+
+MAGICO = b"CAPIDX1\0"
+_CABECALHO = struct.Struct("<8sIII")  # mágico, tamanho dos metadados JSON, palavras por câmera, câmeras
+
+
+def ler_flags(xml):
+    """Devolve {flag: bool} de um DeviceCap (bytes ou str), sem montar a árvore XML."""
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    flags = {}
+    for nome, valor in _FLAG.findall(xml):
+        nome = nome.decode("ascii")
+        flags[nome] = flags.get(nome, False) or valor == b"true"
+    return flags
+
+
+class IndiceCapacidades:
+    """Flags -> bits e câmeras -> linhas de um bytearray (palavras de 64 bits, little-endian)."""
+
+    def __init__(self, flags=(), cameras=(), palavras=1, linhas=None, atualizado_em=None):
+        self.flags = list(flags)
+        self._bit = {flag: i for i, flag in enumerate(self.flags)}
+        self.cameras = list(cameras)
+        self._linha = {camera_ip: i for i, camera_ip in enumerate(self.cameras)}
+        self.palavras = palavras
+        self.linhas = bytearray(linhas) if linhas is not None else bytearray(len(self.cameras) * palavras * 8)
+        self.atualizado_em = dict(atualizado_em or {})
+        self._cache_int = None
+        self._cache_repetidos = {}
+
+    @property
+    def largura(self):
+        """Bits por câmera (largura da lane)."""
+        return self.palavras * 64
+
+    def _bit_da_flag(self, flag):
+        bit = self._bit.get(flag)
+        if bit is None:
+            bit = len(self.flags)
+            if bit >= self.largura:
+                self._alargar(self.palavras * 2)
+            self.flags.append(flag)
+            self._bit[flag] = bit
+        return bit
+
+    def _alargar(self, palavras):
+        # Raro (mais flags do que cabem na linha): reescreve as linhas com a nova largura
+        antigo = self.palavras * 8
+        novas = bytearray(len(self.cameras) * palavras * 8)
+        for i in range(len(self.cameras)):
+            novas[i * palavras * 8:i * palavras * 8 + antigo] = self.linhas[i * antigo:(i + 1) * antigo]
+        self.palavras = palavras
+        self.linhas = novas
+        self._invalidar()
+
+    def _invalidar(self):
+        self._cache_int = None
+        self._cache_repetidos.clear()
+
+    def atualizar(self, camera_ip, xml_ou_flags):
+        """Grava a linha da câmera a partir do XML do DeviceCap (ou de um dict {flag: bool})."""
+        flags = xml_ou_flags if isinstance(xml_ou_flags, dict) else ler_flags(xml_ou_flags)
+        valor = 0
+        for flag, suportada in flags.items():
+            bit = self._bit_da_flag(flag)
+            if suportada:
+                valor |= 1 << bit
+
+        linha = self._linha.get(camera_ip)
+        if linha is None:
+            linha = len(self.cameras)
+            self.cameras.append(camera_ip)
+            self._linha[camera_ip] = linha
+            self.linhas += bytes(self.palavras * 8)
+        tamanho = self.palavras * 8
+        self.linhas[linha * tamanho:(linha + 1) * tamanho] = valor.to_bytes(tamanho, "little")
+        self.atualizado_em[camera_ip] = time.time()
+        self._invalidar()
+
+    def remover(self, camera_ip):
+        linha = self._linha.pop(camera_ip)
+        tamanho = self.palavras * 8
+        del self.linhas[linha * tamanho:(linha + 1) * tamanho]
+        del self.cameras[linha]
+        self._linha = {c: i for i, c in enumerate(self.cameras)}
+        self.atualizado_em.pop(camera_ip, None)
+        self._invalidar()
+
+    def flags_da_camera(self, camera_ip):
+        tamanho = self.palavras * 8
+        linha = self._linha[camera_ip]
+        valor = int.from_bytes(self.linhas[linha * tamanho:(linha + 1) * tamanho], "little")
+        return [flag for flag, bit in self._bit.items() if valor >> bit & 1]
+
+    def suporta(self, camera_ip, flag):
+        bit = self._bit.get(flag)
+        if bit is None:
+            return False
+        tamanho = self.palavras * 8
+        linha = self._linha[camera_ip]
+        return bool(self.linhas[linha * tamanho + bit // 8] >> (bit % 8) & 1)
+
+    # ------------------------------------------------------------------ consultas vetorizadas
+
+    def _mascara(self, flags):
+        mascara = 0
+        for flag in flags:
+            bit = self._bit.get(flag)
+            if bit is None:
+                return None  # flag que nenhuma câmera informou
+            mascara |= 1 << bit
+        return mascara
+
+    def _repetido(self, valor):
+        # valor copiado em todas as lanes; a chave inclui o número de câmeras
+        chave = (valor, len(self.cameras))
+        repetido = self._cache_repetidos.get(chave)
+        if repetido is None:
+            repetido = int.from_bytes(valor.to_bytes(self.palavras * 8, "little") * len(self.cameras), "little")
+            if len(self._cache_repetidos) > 64:
+                self._cache_repetidos.clear()
+            self._cache_repetidos[chave] = repetido
+        return repetido
+
+    def _todas(self):
+        if self._cache_int is None:
+            self._cache_int = int.from_bytes(self.linhas, "little")
+        return self._cache_int
+
+    def _lanes_zeradas(self, x):
+        """Bit alto de cada lane ligado onde a lane de x é zero."""
+        alto = self._repetido(1 << (self.largura - 1))
+        baixos = self._repetido((1 << (self.largura - 1)) - 1)
+        # (x & baixos) + baixos liga o bit alto se algum bit baixo estiver ligado, sem vazar para a
+        # lane vizinha; com o próprio bit alto de x, sobra ligado só nas lanes não-zero
+        nao_zero = (((x & baixos) + baixos) | x) & alto
+        return nao_zero ^ alto
+
+    def _cameras_das_lanes(self, altos):
+        # O bit alto de cada lane fica no último byte da linha: um byte por câmera, filtrado em C
+        tamanho = self.palavras * 8
+        marcas = altos.to_bytes(len(self.linhas), "little")[tamanho - 1::tamanho]
+        return list(compress(self.cameras, marcas))
+
+    def consultar(self, *flags, sem=()):
+        """Câmeras que suportam todas as `flags` e nenhuma das flags em `sem`."""
+        if not self.cameras:
+            return []
+        exigidas = self._mascara(flags)
+        if exigidas is None:
+            return []
+        proibidas = self._mascara([f for f in sem if f in self._bit]) or 0
+
+        todas = self._todas()
+        # Lane zera quando tem todas as exigidas (xor anula) e nenhuma proibida
+        faltando = (todas & self._repetido(exigidas)) ^ self._repetido(exigidas)
+        if proibidas:
+            faltando |= todas & self._repetido(proibidas)
+        return self._cameras_das_lanes(self._lanes_zeradas(faltando))
+
+    def qualquer(self, *flags):
+        """Câmeras que suportam pelo menos uma das `flags`."""
+        mascara = self._mascara([f for f in flags if f in self._bit]) or 0
+        if not mascara or not self.cameras:
+            return []
+        alto = self._repetido(1 << (self.largura - 1))
+        return self._cameras_das_lanes(self._lanes_zeradas(self._todas() & self._repetido(mascara)) ^ alto)
+
+    def contagem(self):
+        """Quantas câmeras suportam cada flag."""
+        return {flag: len(self.consultar(flag)) for flag in self.flags}
+
+    # ------------------------------------------------------------------ arquivo
+
+    def salvar(self, caminho):
+        metadados = json.dumps({"flags": self.flags, "cameras": self.cameras, "atualizado_em": self.atualizado_em},
+                               ensure_ascii=False).encode("utf-8")
+        metadados += b" " * (-(_CABECALHO.size + len(metadados)) % 8)  # linhas alinhadas em 8 bytes
+        temporario = caminho + ".tmp"
+        with open(temporario, "wb") as file:
+            file.write(_CABECALHO.pack(MAGICO, len(metadados), self.palavras, len(self.cameras)))
+            file.write(metadados)
+            file.write(self.linhas)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with open(caminho, "rb") as file:
+            magico, tamanho_meta, palavras, n_cameras = _CABECALHO.unpack(file.read(_CABECALHO.size))
+            if magico != MAGICO:
+                raise ValueError(f"'{caminho}' não é um índice de capacidades.")
+            metadados = json.loads(file.read(tamanho_meta))
+            linhas = file.read(n_cameras * palavras * 8)
+        if len(linhas) != n_cameras * palavras * 8 or len(metadados["cameras"]) != n_cameras:
+            raise ValueError(f"Índice '{caminho}' truncado ou inconsistente.")
+        return cls(metadados["flags"], metadados["cameras"], palavras, linhas, metadados.get("atualizado_em"))
+
+
+def coletar(indice, cameras, concorrencia=16):
+    """Busca o DeviceCap de cada câmera (sem salvar XML) e atualiza o índice. Devolve as que falharam."""
+    import requests_isapi
+
+    def uma(camera):
+        return camera["camera_ip"], requests_isapi.get_system_capacities(
+            camera["camera_ip"], camera["username"], camera["password"], output_file=None
+        )
+
+    falhas = []
+    with ThreadPoolExecutor(concorrencia) as executor:
+        for camera_ip, resultado in executor.map(uma, cameras):
+            if resultado:
+                indice.atualizar(camera_ip, resultado.conteudo)
+            else:
+                falhas.append(camera_ip)
+    return falhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice de capacidades (isSupport*) da frota.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_col = sub.add_parser("coletar", help="Consulta /ISAPI/System/capabilities e atualiza o índice")
+    p_col.add_argument("inventario", help="Arquivo JSON ou CSV com camera_ip, username e password")
+    p_col.add_argument("--concorrencia", type=int, default=16)
+
+    p_cons = sub.add_parser("consultar", help="Lista as câmeras que suportam todas as flags")
+    p_cons.add_argument("flags", nargs="+")
+    p_cons.add_argument("--sem", nargs="+", default=[], help="Flags que a câmera não pode suportar")
+
+    sub.add_parser("flags", help="Mostra as flags conhecidas e quantas câmeras suportam cada uma")
+
+    for p in sub.choices.values():
+        p.add_argument("--indice", default="capacidades.idx")
+    args = parser.parse_args(argv)
+
+    if args.comando == "coletar":
+        from fleet_runner import carregar_cameras
+        indice = IndiceCapacidades.carregar(args.indice) if os.path.exists(args.indice) else IndiceCapacidades()
+        falhas = coletar(indice, carregar_cameras(args.inventario), args.concorrencia)
+        indice.salvar(args.indice)
+        print(json.dumps({"cameras": len(indice.cameras), "flags": len(indice.flags), "falhas": falhas}, indent=4))
+        return 1 if falhas else 0
+
+    indice = IndiceCapacidades.carregar(args.indice)
+    if args.comando == "consultar":
+        for camera_ip in indice.consultar(*args.flags, sem=args.sem):
+            print(camera_ip)
+    else:
+        print(json.dumps(indice.contagem(), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
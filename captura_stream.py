@@ -0,0 +1,201 @@
+"""
+Captura contínua de frames por /ISAPI/Streaming/channels/<id>/httpPreview (MJPEG multipart),
+alternativa ao fps_captura_imagem, que faz um GET autenticado novo em .../picture para cada imagem.
+
+Uma única conexão por canal fica aberta; cada parte do multipart é um JPEG completo lido de uma
+vez pelo Content-Length (isapi_stream.partes_multipart), sem juntar pedaços. Os frames vão para
+uma fila limitada: se o consumidor atrasar, o frame mais antigo é descartado, nunca a leitura.
+
+Exemplo:
+    async def main():
+        captura = CapturaStream(camera_ip, username, password)
+        captura.iniciar()
+        async for frame in captura:
+            ...
+"""
+import asyncio
+import logging
+import random
+import time
+
+from eventos import evento
+from isapi_stream import ErroStream, abrir_stream, partes_multipart
+
+INICIO_JPEG = b"\xff\xd8"
+
+
+class Frame:
+    __slots__ = ("camera_ip", "channel_id", "numero", "recebido_em", "dados")
+
+    def __init__(self, camera_ip, channel_id, numero, dados):
+        self.camera_ip = camera_ip
+        self.channel_id = channel_id
+        self.numero = numero
+        self.recebido_em = time.perf_counter()
+        self.dados = dados
+
+    def __repr__(self):
+        return f"<Frame {self.camera_ip} canal={self.channel_id} n={self.numero} {len(self.dados)} bytes>"
+
+
+class CapturaStream:
+    """
+    Stream httpPreview de um canal. Nas câmeras Hikvision o canal 101 é o stream principal e o
+    102 o sub-stream (resolução menor).
+    """
+
+    def __init__(self, camera_ip, username, password, channel_id=101, tamanho_fila=8, https=False,
+                 max_frame=4 * 1024 * 1024, timeout_ocioso=10, backoff_max=30):
+        self.camera_ip = camera_ip
+        self.username = username
+        self.password = password
+        self.channel_id = channel_id
+        self.https = https
+        self.max_frame = max_frame
+        self.timeout_ocioso = timeout_ocioso
+        self.backoff_max = backoff_max
+
+        self._fila = asyncio.Queue(maxsize=tamanho_fila)
+        self._tarefa = None
+        self._parando = False
+
+        self.frames = 0
+        self.descartados = 0
+        self.invalidos = 0
+        self.bytes = 0
+        self.conexoes = 0
+        self.ultimo_erro = None
+        self._inicio = None
+
+    @property
+    def caminho(self):
+        return f"/ISAPI/Streaming/channels/{self.channel_id}/httpPreview"
+
+    def _enfileirar(self, frame):
+        if self._fila.full():
+            self._fila.get_nowait()
+            self.descartados += 1
+        self._fila.put_nowait(frame)
+
+    async def _ler_uma_conexao(self):
+        resposta = await abrir_stream(self.camera_ip, self.username, self.password, self.caminho, https=self.https)
+        self.conexoes += 1
+        try:
+            boundary = resposta.boundary
+            if boundary is None:
+                raise ErroStream(f"httpPreview de {self.camera_ip} não é multipart: {resposta.headers.get('content-type')}")
+
+            partes = partes_multipart(resposta.corpo, boundary, max_parte=self.max_frame).__aiter__()
+            while not self._parando:
+                _, dados = await asyncio.wait_for(partes.__anext__(), self.timeout_ocioso)
+                if not dados.startswith(INICIO_JPEG):
+                    self.invalidos += 1
+                    continue
+                self.frames += 1
+                self.bytes += len(dados)
+                self._enfileirar(Frame(self.camera_ip, self.channel_id, self.frames, dados))
+        finally:
+            await resposta.fechar()
+
+    async def _executar(self):
+        espera = 0.5
+        # O _parando complementa o cancel(): no Python 3.11 o wait_for pode engolir o cancelamento
+        # quando a leitura termina no mesmo instante, e a tarefa seguiria reconectando
+        while not self._parando:
+            try:
+                await self._ler_uma_conexao()
+            except asyncio.CancelledError:
+                raise
+            except StopAsyncIteration:
+                self.ultimo_erro = "stream encerrado pela câmera"
+            except (ErroStream, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                if isinstance(e, ErroStream) and e.status_code in (401, 403, 404):
+                    espera = self.backoff_max
+            if self._parando:
+                break
+            await asyncio.sleep(espera * random.uniform(0.5, 1.0))
+            espera = min(espera * 2, self.backoff_max)
+
+    def iniciar(self):
+        """Abre o stream numa tarefa do event loop atual."""
+        self._inicio = time.perf_counter()
+        self._parando = False
+        self._tarefa = asyncio.create_task(self._executar(), name=f"httpPreview-{self.camera_ip}-{self.channel_id}")
+
+    async def parar(self):
+        self._parando = True
+        if self._tarefa:
+            self._tarefa.cancel()
+            await asyncio.gather(self._tarefa, return_exceptions=True)
+            self._tarefa = None
+
+    async def proximo_frame(self, timeout=None):
+        return await asyncio.wait_for(self._fila.get(), timeout)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._fila.get()
+
+    def estatisticas(self):
+        decorrido = time.perf_counter() - self._inicio if self._inicio else 0
+        return {
+            "camera_ip": self.camera_ip,
+            "channel_id": self.channel_id,
+            "frames": self.frames,
+            "descartados": self.descartados,
+            "invalidos": self.invalidos,
+            "bytes": self.bytes,
+            "conexoes": self.conexoes,
+            "fps": round(self.frames / decorrido, 2) if decorrido else 0.0,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+def capturar_intervalos(camera_ip, username, password, n=500, channel_id=101, salvar=True, timeout=10, ao_frame=None):
+    """
+    Versão síncrona usada pelo fps_captura_imagem(modo="stream"): lê n frames do httpPreview,
+    salva como o modo snapshot ({camera_ip}_{i}_snapshot.jpg) e devolve o intervalo entre frames
+    (n - 1 intervalos: a contagem começa no primeiro frame, fora a conexão e o handshake Digest,
+    por isso n precisa ser pelo menos 2). ao_frame(nome_arquivo, bytes) recebe cada frame, como no
+    modo snapshot.
+
+    Roda o próprio event loop (asyncio.run): só pode ser chamada de código síncrono. Dentro de um
+    event loop, use a CapturaStream diretamente.
+    """
+    if n < 2:
+        raise ValueError("O modo stream mede intervalos entre frames: n precisa ser pelo menos 2.")
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("capturar_intervalos é síncrona; dentro de um event loop use CapturaStream.")
+
+    async def _capturar():
+        captura = CapturaStream(camera_ip, username, password, channel_id=channel_id, tamanho_fila=n)
+        tempos = []
+        captura.iniciar()
+        anterior = None
+        try:
+            for i in range(n):
+                frame = await captura.proximo_frame(timeout)
+                if anterior is not None:
+                    tempos.append(frame.recebido_em - anterior)
+                anterior = frame.recebido_em
+                nome = f"{camera_ip}_{i}_snapshot.jpg"
+                if salvar:
+                    with open(nome, "wb") as file:
+                        file.write(frame.dados)
+                if ao_frame:
+                    ao_frame(nome, frame.dados)
+        except asyncio.TimeoutError:
+            evento("stream_parado", logging.WARNING, "Stream de {camera_ip} parou de entregar frames: {erro}",
+                   camera_ip=camera_ip, channel_id=channel_id, frames=captura.frames, erro=captura.ultimo_erro)
+        finally:
+            await captura.parar()
+        return tempos
+
+    return asyncio.run(_capturar())
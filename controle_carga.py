@@ -0,0 +1,250 @@
+"""
+Limite adaptativo de requisições simultâneas por câmera, para tirar o máximo de cada câmera sem
+derrubar o processador embarcado.
+
+O ControleCarga é um adapter do requests que envolve o adapter já montado na sessão do
+requests_isapi; toda requisição do módulo (inclusive a segunda perna do Digest, depois do 401)
+passa por ele e espera a vez no LimitadorCamera do host. O limite de cada câmera segue um AIMD
+no estilo Vegas:
+
+- a latência base é a menor latência recente da câmera; enquanto as respostas chegam em até
+  `tolerancia` vezes a base e o limite está sendo usado, ele sobe de 1/limite por resposta
+  (≈ +1 a cada limite respostas);
+- latência acima disso, erro de conexão, timeout ou 5xx multiplicam o limite por `fator_reducao`,
+  no máximo uma vez por janela de latência (respostas da mesma rajada não reduzem de novo);
+- CPU ou memória acima de `cpu_alta`/`memoria_alta` no /ISAPI/System/status congelam o limite,
+  e acima de `cpu_critica` reduzem como uma latência alta.
+
+O status vem de graça sempre que alguém chama get_device_status_capacities (a resposta é lida ao
+passar pelo adapter) e, para as câmeras registradas com monitorar(), de uma consulta periódica.
+
+Exemplo:
+    controle = ControleCarga.instalar()
+    controle.monitorar(camera_ip, username, password, intervalo=30)
+    requests_isapi.salvar_imagem(camera_ip, username, password)  # já passa pelo limitador
+    print(controle.estatisticas())
+"""
+import logging
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+import requests_isapi
+from eventos import evento
+
+CAMINHO_STATUS = "/ISAPI/System/status"
+
+_CPU = re.compile(rb"<cpuUtilization>([\d.]+)</cpuUtilization>")
+_MEMORIA_USADA = re.compile(rb"<memoryUsage>([\d.]+)</memoryUsage>")
+_MEMORIA_LIVRE = re.compile(rb"<memoryAvailable>([\d.]+)</memoryAvailable>")
+
+
+class LimiteEsgotado(requests.exceptions.RequestException):
+    """A requisição esperou mais que `espera_max` por uma vaga no limite da câmera."""
+
+
+def ler_carga(xml):
+    """Extrai (cpu %, memória %) de um DeviceStatus; None no que não vier na resposta."""
+    cpu = [float(v) for v in _CPU.findall(xml)]
+    usada = _MEMORIA_USADA.search(xml)
+    livre = _MEMORIA_LIVRE.search(xml)
+    memoria = None
+    if usada and livre:
+        total = float(usada.group(1)) + float(livre.group(1))
+        memoria = 100 * float(usada.group(1)) / total if total else None
+    return (max(cpu) if cpu else None), memoria
+
+
+class LimitadorCamera:
+    """Vagas de uma câmera. O limite é float; o número de requisições em voo é int(limite)."""
+
+    def __init__(self, host, limite_inicial=2, limite_min=1, limite_max=8, tolerancia=2.0,
+                 fator_reducao=0.7, cpu_alta=70, cpu_critica=90, memoria_alta=90, janela=128):
+        self.host = host
+        self.limite = float(limite_inicial)
+        self.limite_min = limite_min
+        self.limite_max = limite_max
+        self.tolerancia = tolerancia
+        self.fator_reducao = fator_reducao
+        self.cpu_alta = cpu_alta
+        self.cpu_critica = cpu_critica
+        self.memoria_alta = memoria_alta
+
+        self._cond = threading.Condition()
+        self.janela = janela
+        self._latencias = {}  # rota -> latências recentes
+        self._ultima_reducao = 0.0
+        self.em_voo = 0
+        self.cpu = None
+        self.memoria = None
+        self.carga_em = None
+
+        self.requisicoes = 0
+        self.reducoes = 0
+        self.esperas = 0
+        self.espera_total_s = 0.0
+
+    def latencia_base(self, rota):
+        latencias = self._latencias.get(rota)
+        return min(latencias) if latencias else None
+
+    def adquirir(self, espera_max=None):
+        inicio = time.perf_counter()
+        with self._cond:
+            if self.em_voo >= int(self.limite):
+                self.esperas += 1
+                if not self._cond.wait_for(lambda: self.em_voo < int(self.limite), espera_max):
+                    raise LimiteEsgotado(f"Sem vaga em {self.host} após {espera_max} s (limite {int(self.limite)}).")
+            self.em_voo += 1
+            self.requisicoes += 1
+            self.espera_total_s += time.perf_counter() - inicio
+
+    def liberar(self, latencia, falhou=False, rota=None):
+        with self._cond:
+            em_uso = self.em_voo >= int(self.limite)
+            self.em_voo -= 1
+            agora = time.monotonic()
+
+            # A base é por rota (método, caminho, status): um snapshot não é "lento" comparado
+            # com o 401 do Digest ou com um PUT de poucos bytes
+            base = self.latencia_base(rota)
+            if not falhou:
+                self._latencias.setdefault(rota, deque(maxlen=self.janela)).append(latencia)
+            lenta = base is not None and latencia > base * self.tolerancia
+            critica = self.cpu is not None and self.cpu >= self.cpu_critica
+
+            if falhou or lenta or critica:
+                # Uma redução por janela: as outras respostas da mesma rajada também chegam lentas
+                if agora - self._ultima_reducao > latencia:
+                    self._ultima_reducao = agora
+                    self.limite = max(self.limite_min, self.limite * self.fator_reducao)
+                    self.reducoes += 1
+            elif em_uso and not self._carregada():
+                self.limite = min(self.limite_max, self.limite + 1 / self.limite)
+            self._cond.notify_all()
+
+    def _carregada(self):
+        return (self.cpu is not None and self.cpu >= self.cpu_alta) or \
+               (self.memoria is not None and self.memoria >= self.memoria_alta)
+
+    def registrar_carga(self, cpu, memoria):
+        with self._cond:
+            self.cpu, self.memoria, self.carga_em = cpu, memoria, time.time()
+            if cpu is not None and cpu >= self.cpu_critica:
+                self.limite = max(self.limite_min, self.limite * self.fator_reducao)
+                self.reducoes += 1
+            self._cond.notify_all()
+        if self._carregada():
+            evento("camera_carregada", logging.WARNING, "{camera_ip} com CPU {cpu}% e memória {memoria:.0f}%: limite {limite:.1f}",
+                   camera_ip=self.host, cpu=cpu, memoria=memoria or 0, limite=self.limite)
+
+    def estatisticas(self):
+        return {
+            "camera_ip": self.host,
+            "limite": round(self.limite, 2),
+            "em_voo": self.em_voo,
+            "latencia_base_ms": {" ".join(map(str, rota)): round(min(latencias) * 1000, 2)
+                                 for rota, latencias in list(self._latencias.items()) if latencias},
+            "cpu": self.cpu,
+            "memoria": round(self.memoria, 1) if self.memoria is not None else None,
+            "requisicoes": self.requisicoes,
+            "esperas": self.esperas,
+            "espera_media_ms": round(self.espera_total_s / self.requisicoes * 1000, 2) if self.requisicoes else 0.0,
+            "reducoes": self.reducoes,
+        }
+
+
+class ControleCarga(BaseAdapter):
+    """
+    Adapter montado em http:// e https:// da sessão: passa cada requisição pelo LimitadorCamera
+    do host e depois pelo adapter que estava montado antes (HTTPAdapter, respostas gravadas...).
+    """
+
+    def __init__(self, internos, espera_max=60, **parametros_limitador):
+        super().__init__()
+        self.internos = internos  # prefixo -> adapter original
+        self.espera_max = espera_max
+        self.parametros_limitador = parametros_limitador
+        self._limitadores = {}
+        self._lock = threading.Lock()
+        self._monitoradas = {}
+        self._monitor = None
+        self._parar_monitor = threading.Event()
+
+    @classmethod
+    def instalar(cls, sessao=None, **kwargs):
+        """Envolve os adapters da sessão (padrão: requests_isapi.sessao) e devolve o controle."""
+        sessao = sessao or requests_isapi.sessao
+        atual = sessao.get_adapter("http://")
+        if isinstance(atual, ControleCarga):
+            return atual
+        controle = cls({prefixo: sessao.get_adapter(prefixo) for prefixo in ("https://", "http://")}, **kwargs)
+        for prefixo in controle.internos:
+            sessao.mount(prefixo, controle)
+        return controle
+
+    def limitador(self, host):
+        limitador = self._limitadores.get(host)
+        if limitador is None:
+            with self._lock:
+                limitador = self._limitadores.setdefault(host, LimitadorCamera(host, **self.parametros_limitador))
+        return limitador
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        limitador = self.limitador(partes.netloc)
+        limitador.adquirir(self.espera_max)
+        inicio = time.perf_counter()
+        falhou = True
+        rota = (request.method, partes.path, None)
+        try:
+            interno = self.internos["https://" if partes.scheme == "https" else "http://"]
+            resposta = interno.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            # O corpo é lido ainda com a vaga: com stream=True (snapshots do _baixar_imagem e do
+            # fps_captura_imagem) o JPEG viria depois de liberar, fora do limite e da latência medida
+            resposta.content
+            falhou = resposta.status_code >= 500
+            rota = (request.method, partes.path, resposta.status_code)
+        finally:
+            limitador.liberar(time.perf_counter() - inicio, falhou, rota)
+
+        # O HTTPDigestAuth reenvia pelo resposta.connection: apontando para cá, a perna autenticada
+        # também espera vaga no limitador
+        resposta.connection = self
+        if partes.path == CAMINHO_STATUS and resposta.status_code == 200:
+            limitador.registrar_carga(*ler_carga(resposta.content))
+        return resposta
+
+    def close(self):
+        self._parar_monitor.set()
+        for interno in set(self.internos.values()):
+            interno.close()
+
+    def monitorar(self, camera_ip, username, password, intervalo=30):
+        """Consulta o /ISAPI/System/status da câmera a cada `intervalo` s, numa thread de fundo."""
+        self._monitoradas[camera_ip] = (username, password, intervalo, 0.0)
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitorar_loop, name="controle-carga", daemon=True)
+            self._monitor.start()
+
+    def _monitorar_loop(self):
+        while not self._parar_monitor.wait(1):
+            agora = time.monotonic()
+            for camera_ip, (username, password, intervalo, ultima) in list(self._monitoradas.items()):
+                if agora - ultima < intervalo:
+                    continue
+                self._monitoradas[camera_ip] = (username, password, intervalo, agora)
+                try:
+                    # Passa pelo próprio limitador, como as outras; o send registra a carga
+                    requests_isapi.sessao.get(f"http://{camera_ip}{CAMINHO_STATUS}",
+                                              auth=requests_isapi._auth_digest(camera_ip, username, password), timeout=5)
+                except requests.exceptions.RequestException as e:
+                    evento("status_indisponivel", logging.DEBUG, camera_ip=camera_ip, erro=str(e))
+
+    def estatisticas(self):
+        return [limitador.estatisticas() for limitador in list(self._limitadores.values())]
@@ -0,0 +1,276 @@
+"""
+Descoberta de câmeras ISAPI em faixas CIDR, para montar o inventário usado pelo fleet_runner
+em vez de digitar camera_ip à mão.
+
+Cada endereço passa por três etapas, todas assíncronas e com timeout curto:
+1. conexão TCP na porta (a maioria dos endereços de uma /16 para aqui, sem resposta);
+2. GET sem autenticação em /ISAPI/System/deviceInfo: uma câmera ISAPI responde 401 com desafio
+   Digest (ou 200 com XML); qualquer outra coisa é descartada;
+3. validação das credenciais no mesmo endpoint do verificar_camera_conectada
+   (/ISAPI/Security/UserPermission/1), testando as credenciais informadas em ordem.
+
+Um número fixo de tarefas consome os endereços de um gerador (faixas sobrepostas são juntadas antes),
+então a memória não cresce com o tamanho da faixa e o número de sockets abertos nunca passa da
+concorrência. Com concorrência 1024
+e timeout de 0,5 s, uma /16 vazia leva cerca de 65536 / 1024 * 0,5 s ≈ 32 s. A concorrência é
+limitada ao ulimit -n do processo (menos uma margem): sem descritores livres, a conexão falha com
+EMFILE e a câmera pareceria ausente. Se mesmo assim faltar descritor (outros sockets do processo),
+o endereço é tentado de novo algumas vezes e, por fim, fica em `nao_sondados`, sem interromper a
+varredura.
+
+Cada câmera vai para o inventário com "https" e "porta"; o fleet_runner repassa https=True às
+funções do requests_isapi que aceitam o parâmetro.
+
+Uso:
+    python descoberta.py 10.10.0.0/16 --credencial admin:senha --saida inventario.json
+    python descoberta.py 192.168.1.0/24 192.168.2.0/24 --credencial admin:a --credencial admin:b --portas 80 8080
+"""
+import argparse
+import asyncio
+import errno
+import ipaddress
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from eventos import evento
+from isapi_stream import ErroStream, _enviar_get, abrir_stream
+
+CAMINHO_SONDA = "/ISAPI/System/deviceInfo"
+CAMINHO_VALIDACAO = "/ISAPI/Security/UserPermission/1"
+
+# Sem descritores livres (processo ou sistema): não diz nada sobre a porta
+_SEM_DESCRITORES = (errno.EMFILE, errno.ENFILE)
+
+
+def _limite_descritores(margem=64):
+    """Sockets que o processo ainda pode abrir: ulimit -n menos uma margem para arquivos, logs etc."""
+    if resource is None:
+        return None
+    suave, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if suave == resource.RLIM_INFINITY:
+        return None
+    return max(1, suave - margem)
+
+
+def _camera_ip(ip, porta, https):
+    # Mesmo formato aceito pelas funções do requests_isapi: "ip" na porta padrão, senão "ip:porta"
+    return str(ip) if porta == (443 if https else 80) else f"{ip}:{porta}"
+
+
+def _redes(faixas):
+    """Faixas sem sobreposição: as repetidas ou contidas em outra são juntadas antes da varredura."""
+    redes = [ipaddress.ip_network(faixa, strict=False) for faixa in faixas]
+    return [rede for versao in (4, 6) for rede in ipaddress.collapse_addresses(r for r in redes if r.version == versao)]
+
+
+def _enderecos(faixas, portas):
+    # Faixas e portas já sem repetição: nenhum conjunto de endereços vistos crescendo com a faixa
+    portas = list(dict.fromkeys(portas))
+    for rede in _redes(faixas):
+        for ip in (rede.hosts() if rede.num_addresses > 1 else [rede.network_address]):
+            for porta in portas:
+                yield ip, porta
+
+
+class Descoberta:
+    """
+    Varredura de uma ou mais faixas. `credenciais` é uma lista de (username, password) testada
+    em ordem em cada câmera encontrada; a primeira aceita vai para o inventário.
+    """
+
+    def __init__(self, credenciais, portas=(80,), https_portas=(443,), concorrencia=1024,
+                 timeout_conexao=0.5, timeout_http=3):
+        self.credenciais = list(credenciais)
+        self.portas = tuple(portas)
+        self.https_portas = set(https_portas)
+        limite = _limite_descritores()
+        if limite is not None and concorrencia > limite:
+            evento("concorrencia_limitada", logging.WARNING,
+                   "Concorrência {pedida} acima do limite de descritores; usando {concorrencia}",
+                   pedida=concorrencia, concorrencia=limite)
+            concorrencia = limite
+        self.concorrencia = concorrencia
+        self.timeout_conexao = timeout_conexao
+        self.timeout_http = timeout_http
+
+        self.sondados = 0
+        self.abertos = 0
+        self.isapi = 0
+        self.validados = 0
+        self.nao_sondados = []  # (ip, porta) que ficaram sem descritor livre mesmo após as tentativas
+
+    async def _porta_aberta(self, ip, porta, tentativas=5):
+        for tentativa in range(tentativas):
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(str(ip), porta), self.timeout_conexao)
+            except asyncio.TimeoutError:
+                return False
+            except OSError as e:
+                if e.errno not in _SEM_DESCRITORES:
+                    return False
+                # Outros sockets do processo ocupam os descritores: espera liberar em vez de
+                # dar a porta como fechada
+                if tentativa == tentativas - 1:
+                    raise
+                await asyncio.sleep(0.05 * 2 ** tentativa)
+                continue
+            writer.close()
+            return True
+
+    async def _eh_isapi(self, camera_ip, https):
+        try:
+            _, writer, status_code, headers = await _enviar_get(
+                camera_ip, CAMINHO_SONDA, https, self.timeout_http, 64 * 1024
+            )
+        except (OSError, asyncio.TimeoutError, ErroStream) as e:
+            if isinstance(e, OSError) and e.errno in _SEM_DESCRITORES:
+                raise
+            return False
+        writer.close()
+        if status_code == 401:
+            return "digest" in headers.get("www-authenticate", "").lower()
+        return status_code == 200 and "xml" in headers.get("content-type", "")
+
+    async def _validar(self, camera_ip, https):
+        for username, password in self.credenciais:
+            try:
+                resposta = await abrir_stream(camera_ip, username, password, CAMINHO_VALIDACAO,
+                                              https=https, timeout=self.timeout_http)
+            except ErroStream as e:
+                if e.status_code == 401:
+                    continue
+                return None, f"HTTP {e.status_code}"
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                if isinstance(e, OSError) and e.errno in _SEM_DESCRITORES:
+                    raise
+                return None, f"{type(e).__name__}: {e}"
+            await resposta.fechar()
+            return (username, password), None
+        return None, "Login ou senha incorretos" if self.credenciais else "nenhuma credencial informada"
+
+    async def _sondar(self, ip, porta):
+        try:
+            return await self._sondar_endereco(ip, porta)
+        except OSError as e:
+            if e.errno not in _SEM_DESCRITORES:
+                raise
+            # Sem descritor livre nem depois das tentativas: o endereço fica registrado como não
+            # sondado e a varredura continua com o que já achou
+            self.nao_sondados.append((str(ip), porta))
+            evento("endereco_nao_sondado", logging.WARNING, "{camera_ip} não sondado: {erro}",
+                   camera_ip=_camera_ip(ip, porta, porta in self.https_portas), erro=str(e))
+            return None
+
+    async def _sondar_endereco(self, ip, porta):
+        self.sondados += 1
+        if not await self._porta_aberta(ip, porta):
+            return None
+        self.abertos += 1
+
+        https = porta in self.https_portas
+        camera_ip = _camera_ip(ip, porta, https)
+        if not await self._eh_isapi(camera_ip, https):
+            return None
+        self.isapi += 1
+
+        credencial, erro = await self._validar(camera_ip, https)
+        camera = {"camera_ip": camera_ip, "https": https, "porta": porta, "validado": credencial is not None,
+                  "descoberto_em": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if credencial:
+            self.validados += 1
+            camera["username"], camera["password"] = credencial
+            evento("camera_descoberta", mensagem="Câmera ISAPI em {camera_ip} (credenciais válidas)",
+                   camera_ip=camera_ip, validado=True)
+        else:
+            camera["erro"] = erro
+            evento("camera_descoberta", logging.WARNING, "Câmera ISAPI em {camera_ip} sem credencial válida: {erro}",
+                   camera_ip=camera_ip, validado=False, erro=erro)
+        return camera
+
+    async def varrer(self, faixas, ao_encontrar=None):
+        """Varre as faixas e devolve a lista de câmeras ISAPI encontradas (validadas ou não)."""
+        enderecos = _enderecos(faixas, self.portas)
+        encontradas = []
+        inicio = time.perf_counter()
+
+        async def trabalhador():
+            # Os trabalhadores dividem o mesmo gerador: ninguém cria uma tarefa por endereço
+            for ip, porta in enderecos:
+                camera = await self._sondar(ip, porta)
+                if camera is not None:
+                    encontradas.append(camera)
+                    if ao_encontrar:
+                        ao_encontrar(camera)
+
+        await asyncio.gather(*(trabalhador() for _ in range(self.concorrencia)))
+        evento("varredura_concluida", mensagem="{sondados} endereços, {isapi} câmeras ISAPI, {validados} validadas em {tempo_s:.1f} s",
+               **self.estatisticas(), tempo_s=time.perf_counter() - inicio)
+        return encontradas
+
+    def estatisticas(self):
+        return {"sondados": self.sondados, "abertos": self.abertos, "isapi": self.isapi, "validados": self.validados,
+                "nao_sondados": len(self.nao_sondados)}
+
+
+def salvar_inventario(cameras, caminho):
+    """
+    Junta as câmeras ao inventário existente em `caminho` (se houver), sem IPs repetidos: uma
+    câmera validada agora substitui a entrada antiga; uma não validada não apaga credenciais já
+    conhecidas. Grava num arquivo temporário e renomeia, para não deixar um JSON pela metade.
+    """
+    inventario = {}
+    if os.path.exists(caminho):
+        with open(caminho, encoding="utf-8") as file:
+            for camera in json.load(file):
+                inventario[camera["camera_ip"]] = camera
+
+    for camera in cameras:
+        anterior = inventario.get(camera["camera_ip"])
+        if anterior is None or camera["validado"] or not anterior.get("validado"):
+            inventario[camera["camera_ip"]] = camera
+
+    ordenado = sorted(inventario.values(), key=lambda c: ipaddress.ip_address(c["camera_ip"].split(":")[0]))
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as file:
+        json.dump(ordenado, file, indent=4, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return ordenado
+
+
+def _credencial(valor):
+    username, separador, password = valor.partition(":")
+    if not separador or not username:
+        raise argparse.ArgumentTypeError(f"credencial '{valor}' fora do formato usuario:senha")
+    return username, password
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Descobre câmeras ISAPI em faixas CIDR e grava o inventário.")
+    parser.add_argument("faixas", nargs="+", help="Faixas CIDR (ex.: 10.10.0.0/16)")
+    parser.add_argument("--credencial", action="append", default=[], type=_credencial, help="usuario:senha (pode repetir)")
+    parser.add_argument("--portas", type=int, nargs="+", default=[80])
+    parser.add_argument("--https-portas", type=int, nargs="+", default=[443], help="Portas sondadas com TLS")
+    parser.add_argument("--concorrencia", type=int, default=1024)
+    parser.add_argument("--timeout", type=float, default=0.5, help="Timeout da conexão TCP (s)")
+    parser.add_argument("--saida", default="inventario.json")
+    args = parser.parse_args(argv)
+
+    descoberta = Descoberta(args.credencial, portas=args.portas, https_portas=args.https_portas,
+                            concorrencia=args.concorrencia, timeout_conexao=args.timeout)
+    cameras = asyncio.run(descoberta.varrer(args.faixas))
+    inventario = salvar_inventario(cameras, args.saida)
+
+    print(json.dumps({**descoberta.estatisticas(), "inventario": len(inventario), "saida": args.saida}, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Camada de eventos estruturados usada por requests_isapi e pelos módulos da frota, no lugar de print().
+
+Cada evento tem um nome fixo (ex.: "conexao_validada", "frame_salvo"), um nível do logging e
+campos (camera_ip, status_code, ...). Por baixo é o logging da biblioteca padrão, no logger "isapi":
+
+- evento desabilitado pelo nível custa só um isEnabledFor; a mensagem legível é um template
+  formatado apenas se algum handler realmente escrever o registro;
+- amostragem (fração dos eventos mantida) e limite de taxa (eventos por segundo) por nome de evento,
+  aplicados antes de criar o LogRecord;
+- configurar() liga um QueueHandler não bloqueante: quem chama só enfileira, e a escrita em
+  stderr/arquivo fica na thread do QueueListener. Com a fila cheia o registro é descartado e contado.
+
+Sem configurar(), vale o padrão do logging: só WARNING e acima aparecem (em stderr).
+
+Exemplo:
+    import eventos
+    eventos.configurar(nivel="INFO", amostragem={"frame_salvo": 0.01}, limites={"conexao_falhou": 5})
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger("isapi")
+
+_regras = {}
+_regras_lock = threading.Lock()
+_suprimidos = {}
+_listener = None
+_handler = None
+
+
+class _Mensagem:
+    """Template da mensagem legível, só formatado quando um handler chama getMessage()."""
+    __slots__ = ("template", "campos")
+
+    def __init__(self, template, campos):
+        self.template = template
+        self.campos = campos
+
+    def __str__(self):
+        try:
+            return self.template.format_map(self.campos)
+        except (KeyError, IndexError, ValueError):
+            return self.template
+
+
+class _Regra:
+    """Amostragem e balde de tokens de um nome de evento."""
+    __slots__ = ("fracao", "por_segundo", "_tokens", "_ultimo")
+
+    def __init__(self, fracao=1.0, por_segundo=None):
+        self.fracao = fracao
+        self.por_segundo = por_segundo
+        self._tokens = por_segundo or 0.0
+        self._ultimo = time.monotonic()
+
+    def permitir(self):
+        if self.fracao < 1.0 and random.random() >= self.fracao:
+            return False
+        if self.por_segundo is None:
+            return True
+        with _regras_lock:
+            agora = time.monotonic()
+            self._tokens = min(self.por_segundo, self._tokens + (agora - self._ultimo) * self.por_segundo)
+            self._ultimo = agora
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+def evento(nome, nivel=logging.INFO, mensagem=None, **campos):
+    """
+    Emite o evento `nome` com os campos informados. `mensagem` é um template str.format usando os
+    campos (ex.: "Conexão com a câmera {camera_ip} VALIDADA"); sem ela, o texto é o próprio nome.
+    """
+    if not logger.isEnabledFor(nivel):
+        return
+    regra = _regras.get(nome)
+    if regra is not None and not regra.permitir():
+        _suprimidos[nome] = _suprimidos.get(nome, 0) + 1
+        return
+    logger.log(nivel, _Mensagem(mensagem or nome, campos), extra={"evento": nome, "campos": campos})
+
+
+def definir_regra(nome, fracao=1.0, por_segundo=None):
+    """Mantém só `fracao` dos eventos `nome` e no máximo `por_segundo` deles por segundo."""
+    _regras[nome] = _Regra(fracao, por_segundo)
+
+
+def estatisticas():
+    """Eventos suprimidos por amostragem/limite e registros descartados com a fila cheia."""
+    return {
+        "suprimidos": dict(_suprimidos),
+        "descartados_fila": _handler.descartados if _handler else 0,
+    }
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por evento: ts, nivel, evento, mensagem e os campos."""
+
+    def format(self, record):
+        registro = {
+            "ts": round(record.created, 6),
+            "nivel": record.levelname,
+            "evento": getattr(record, "evento", record.name),
+            "mensagem": record.getMessage(),
+        }
+        registro.update(getattr(record, "campos", {}))
+        if record.exc_info:
+            registro["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(registro, default=str, ensure_ascii=False)
+
+
+class QueueHandlerDescarte(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloqueia quem loga: com a fila cheia, descarta e conta."""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # A mensagem continua lazy até o handler final; só evitamos copiar o record como o padrão faz
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def configurar(nivel=logging.INFO, destino=None, formato="json", amostragem=None, limites=None, tamanho_fila=10000):
+    """
+    Liga a saída dos eventos: QueueHandler no logger "isapi" e um QueueListener escrevendo em
+    `destino` (stream, caminho de arquivo ou handler do logging; padrão stderr).
+    amostragem={"nome": fração} e limites={"nome": eventos_por_segundo} viram regras por evento.
+    Retorna o QueueListener (já iniciado); chamar de novo substitui a configuração anterior,
+    inclusive as regras de amostragem e limite.
+    """
+    global _listener, _handler
+    parar()
+    with _regras_lock:
+        _regras.clear()
+
+    if isinstance(destino, logging.Handler):
+        handler_final = destino
+    elif isinstance(destino, str):
+        handler_final = logging.FileHandler(destino, encoding="utf-8")
+    else:
+        handler_final = logging.StreamHandler(destino or sys.stderr)
+    if formato == "json":
+        handler_final.setFormatter(FormatadorJson())
+    else:
+        handler_final.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(evento)s: %(message)s", defaults={"evento": "-"}))
+
+    for nome, fracao in (amostragem or {}).items():
+        definir_regra(nome, fracao=fracao, por_segundo=(limites or {}).get(nome))
+    for nome, por_segundo in (limites or {}).items():
+        if nome not in (amostragem or {}):
+            definir_regra(nome, por_segundo=por_segundo)
+
+    _handler = QueueHandlerDescarte(queue.Queue(maxsize=tamanho_fila))
+    logger.addHandler(_handler)
+    logger.setLevel(nivel)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(_handler.queue, handler_final, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def parar():
+    """Esvazia a fila, para o listener e remove o handler instalado por configurar()."""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler = None
+        logger.propagate = True
@@ -0,0 +1,235 @@
+"""
+Fila de jobs persistente (SQLite) para operações longas na frota, como trocar o ircut ou girar
+certificados em 3.000 câmeras.
+
+Um job guarda a operação, os argumentos e uma tarefa por câmera (pendente, ok ou falha, com
+tentativas e último erro). A execução usa o FleetRunner e grava os resultados em lotes, numa
+transação por lote (cada commit é um checkpoint). Se o processo cair, o que já foi gravado está
+no banco e a próxima execução do mesmo job só roda as câmeras pendentes e as que falharam e ainda
+têm tentativas; no pior caso repete as câmeras do último lote não gravado.
+
+As senhas não vão para o banco: a cada execução as credenciais vêm do inventário, pelo camera_ip.
+
+Uso:
+    python fila_jobs.py criar inventario.json set_ircut --kw ircut_filter_type='"night"'
+    python fila_jobs.py executar 1 inventario.json --processos 4
+    python fila_jobs.py status 1
+    python fila_jobs.py listar
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    operacao TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    max_tentativas INTEGER NOT NULL,
+    criado_em REAL NOT NULL,
+    execucoes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tarefas (
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    camera_ip TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    status_code INTEGER,
+    erro TEXT,
+    duracao_s REAL,
+    resultado TEXT,
+    atualizado_em REAL,
+    PRIMARY KEY (job_id, camera_ip)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tarefas_estado ON tarefas (job_id, estado);
+"""
+
+
+class FilaJobs:
+    def __init__(self, caminho="jobs.sqlite"):
+        self.caminho = caminho
+        self.conexao = sqlite3.connect(caminho)
+        # WAL + synchronous NORMAL: cada commit de lote é durável contra queda do processo e
+        # barato o bastante para gravar centenas de resultados por segundo
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        self.conexao.executescript(ESQUEMA)
+
+    def fechar(self):
+        self.conexao.close()
+
+    def criar(self, operacao, cameras, kwargs=None, max_tentativas=3):
+        """Cria o job com uma tarefa pendente por câmera e devolve o id."""
+        with self.conexao:
+            cursor = self.conexao.execute(
+                "INSERT INTO jobs (operacao, kwargs, max_tentativas, criado_em) VALUES (?, ?, ?, ?)",
+                (operacao, json.dumps(kwargs or {}), max_tentativas, time.time()),
+            )
+            job_id = cursor.lastrowid
+            self.conexao.executemany(
+                "INSERT OR IGNORE INTO tarefas (job_id, camera_ip) VALUES (?, ?)",
+                ((job_id, camera["camera_ip"]) for camera in cameras),
+            )
+        return job_id
+
+    def job(self, job_id):
+        linha = self.conexao.execute(
+            "SELECT operacao, kwargs, max_tentativas, criado_em, execucoes FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if linha is None:
+            raise KeyError(f"Job {job_id} não existe em '{self.caminho}'.")
+        operacao, kwargs, max_tentativas, criado_em, execucoes = linha
+        return {"id": job_id, "operacao": operacao, "kwargs": json.loads(kwargs), "max_tentativas": max_tentativas,
+                "criado_em": criado_em, "execucoes": execucoes}
+
+    def a_executar(self, job_id):
+        """camera_ip das tarefas pendentes e das falhas que ainda têm tentativas."""
+        max_tentativas = self.job(job_id)["max_tentativas"]
+        return [camera_ip for (camera_ip,) in self.conexao.execute(
+            "SELECT camera_ip FROM tarefas WHERE job_id = ? AND (estado = 'pendente' OR (estado = 'falha' AND tentativas < ?))",
+            (job_id, max_tentativas),
+        )]
+
+    def registrar(self, job_id, resultados, guardar_conteudo=False):
+        """Grava um lote de resultados do FleetRunner numa única transação."""
+        agora = time.time()
+        linhas = []
+        for resultado in resultados:
+            conteudo = resultado.get("conteudo", resultado.get("retorno")) if guardar_conteudo else None
+            linhas.append((
+                "ok" if resultado["ok"] else "falha",
+                resultado.get("status_code"),
+                resultado.get("erro"),
+                resultado.get("duracao_s"),
+                json.dumps(conteudo, default=str, ensure_ascii=False) if conteudo is not None else None,
+                agora,
+                job_id,
+                resultado["camera_ip"],
+            ))
+        with self.conexao:
+            self.conexao.executemany(
+                "UPDATE tarefas SET estado = ?, tentativas = tentativas + 1, status_code = ?, erro = ?, duracao_s = ?, "
+                "resultado = ?, atualizado_em = ? WHERE job_id = ? AND camera_ip = ?",
+                linhas,
+            )
+
+    def executar(self, job_id, cameras, lote_commit=200, intervalo_commit=2.0, guardar_conteudo=False, **opcoes_runner):
+        """
+        Roda (ou retoma) o job nas câmeras que faltam. `cameras` é o inventário com as credenciais;
+        as câmeras do job que não estiverem nele continuam pendentes. Os resultados são gravados a
+        cada `lote_commit` câmeras ou `intervalo_commit` segundos, o que vier antes.
+        """
+        from fleet_runner import FleetRunner
+
+        job = self.job(job_id)
+        por_ip = {camera["camera_ip"]: camera for camera in cameras}
+        faltando = self.a_executar(job_id)
+        alvo = [por_ip[camera_ip] for camera_ip in faltando if camera_ip in por_ip]
+        sem_credencial = len(faltando) - len(alvo)
+
+        with self.conexao:
+            self.conexao.execute("UPDATE jobs SET execucoes = execucoes + 1 WHERE id = ?", (job_id,))
+        if not alvo:
+            return {"job": job_id, "executadas": 0, "sem_credencial": sem_credencial, **self.resumo(job_id)}
+
+        buffer = []
+        registradas = set()
+        ultimo_commit = time.monotonic()
+
+        def ao_receber(resultado):
+            nonlocal ultimo_commit
+            # Uma tentativa por câmera por execução, mesmo que o resultado chegue repetido
+            if resultado["camera_ip"] in registradas:
+                return
+            registradas.add(resultado["camera_ip"])
+            buffer.append(resultado)
+            if len(buffer) >= lote_commit or time.monotonic() - ultimo_commit >= intervalo_commit:
+                self.registrar(job_id, buffer, guardar_conteudo)
+                buffer.clear()
+                ultimo_commit = time.monotonic()
+
+        runner = FleetRunner(job["operacao"], job["kwargs"], **opcoes_runner)
+        try:
+            execucao = runner.executar(alvo, ao_receber=ao_receber)
+        finally:
+            # Inclusive no Ctrl+C: o que já voltou dos workers não precisa rodar de novo
+            if buffer:
+                self.registrar(job_id, buffer, guardar_conteudo)
+
+        return {"job": job_id, "executadas": len(alvo), "sem_credencial": sem_credencial,
+                "tempo_s": execucao["tempo_s"], **self.resumo(job_id)}
+
+    def resumo(self, job_id):
+        max_tentativas = self.job(job_id)["max_tentativas"]
+        contagem = dict(self.conexao.execute(
+            "SELECT estado, COUNT(*) FROM tarefas WHERE job_id = ? GROUP BY estado", (job_id,)
+        ).fetchall())
+        esgotadas = self.conexao.execute(
+            "SELECT COUNT(*) FROM tarefas WHERE job_id = ? AND estado = 'falha' AND tentativas >= ?", (job_id, max_tentativas)
+        ).fetchone()[0]
+        return {"pendentes": contagem.get("pendente", 0), "ok": contagem.get("ok", 0),
+                "falhas": contagem.get("falha", 0), "falhas_esgotadas": esgotadas}
+
+    def falhas(self, job_id):
+        return [
+            {"camera_ip": camera_ip, "tentativas": tentativas, "status_code": status_code, "erro": erro}
+            for camera_ip, tentativas, status_code, erro in self.conexao.execute(
+                "SELECT camera_ip, tentativas, status_code, erro FROM tarefas WHERE job_id = ? AND estado = 'falha'", (job_id,)
+            )
+        ]
+
+    def listar(self):
+        return [self.job(job_id) | self.resumo(job_id) for (job_id,) in self.conexao.execute("SELECT id FROM jobs ORDER BY id")]
+
+
+def main(argv=None):
+    from fleet_runner import _parse_kwargs, carregar_cameras
+
+    parser = argparse.ArgumentParser(description="Fila de jobs persistente para operações na frota.")
+    parser.add_argument("--banco", default="jobs.sqlite")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_criar = sub.add_parser("criar", help="Cria um job com uma tarefa por câmera do inventário")
+    p_criar.add_argument("inventario")
+    p_criar.add_argument("operacao", help="Nome da função do requests_isapi")
+    p_criar.add_argument("--kw", action="append", help="Argumento extra chave=valor (valor em JSON quando possível)")
+    p_criar.add_argument("--max-tentativas", type=int, default=3)
+
+    p_exec = sub.add_parser("executar", help="Executa ou retoma um job")
+    p_exec.add_argument("job_id", type=int)
+    p_exec.add_argument("inventario", help="Inventário com as credenciais das câmeras")
+    p_exec.add_argument("--processos", type=int, default=None)
+    p_exec.add_argument("--concorrencia", type=int, default=32)
+    p_exec.add_argument("--lote-commit", type=int, default=200)
+    p_exec.add_argument("--limitar-carga", action="store_true")
+
+    p_status = sub.add_parser("status", help="Resumo e falhas de um job")
+    p_status.add_argument("job_id", type=int)
+
+    sub.add_parser("listar", help="Lista os jobs")
+    args = parser.parse_args(argv)
+
+    fila = FilaJobs(args.banco)
+    try:
+        if args.comando == "criar":
+            job_id = fila.criar(args.operacao, carregar_cameras(args.inventario), _parse_kwargs(args.kw), args.max_tentativas)
+            print(json.dumps({"job": job_id, **fila.resumo(job_id)}, indent=4))
+        elif args.comando == "executar":
+            resumo = fila.executar(args.job_id, carregar_cameras(args.inventario), lote_commit=args.lote_commit,
+                                   processos=args.processos, concorrencia=args.concorrencia, limitar_carga=args.limitar_carga)
+            print(json.dumps(resumo, indent=4))
+            return 1 if resumo["falhas"] or resumo["pendentes"] else 0
+        elif args.comando == "status":
+            print(json.dumps({**fila.job(args.job_id), **fila.resumo(args.job_id), "cameras_com_falha": fila.falhas(args.job_id)},
+                             indent=4, ensure_ascii=False))
+        else:
+            print(json.dumps(fila.listar(), indent=4))
+    finally:
+        fila.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Executa uma função do requests_isapi em toda a frota, dividida entre vários processos.
+
+O parse de XML (ET, minidom do salvar_xml_conteudo) e de JSON (get_server_certificates) das
+respostas prende um núcleo por causa do GIL; aqui cada processo tem sua própria sessão/pool de
+conexões e seu event loop, e atende várias câmeras ao mesmo tempo (as chamadas bloqueantes rodam
+em threads com limite de concorrência).
+
+O inventário é dividido em shards, um por processo, e cada shard em lotes pequenos. O coordenador
+manda os lotes sob demanda pelo pipe de cada worker; quando o shard de um worker acaba, ele passa a
+receber lotes do shard com mais pendências (rebalanceamento). Os resultados voltam por uma única
+fila (pipe) e são gravados em JSONL conforme chegam.
+
+Uso:
+    python fleet_runner.py inventario.json get_server_certificates --kw https=false --processos 8
+    python fleet_runner.py inventario.csv set_ircut --kw ircut_filter_type='"night"' --saida ircut.jsonl
+
+Formato do inventário: lista JSON de objetos ou CSV com cabeçalho, com ao menos camera_ip,
+username e password. A coluna opcional https (true/false) vira https=True nas funções que aceitam
+o parâmetro; as demais colunas são ignoradas aqui. O inventario.json gerado pelo descoberta.py
+serve direto; as câmeras sem credencial validada ficam de fora.
+"""
+import argparse
+import asyncio
+import csv
+import functools
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+CAMPOS_CAMERA = ("camera_ip", "username", "password")
+
+
+def booleano(valor):
+    """Campo booleano do inventário: bool do JSON ou texto do CSV ("true", "False", "1"...). None se vazio."""
+    if isinstance(valor, bool) or valor is None:
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in ("true", "1", "sim", "yes"):
+        return True
+    if texto in ("false", "0", "nao", "não", "no"):
+        return False
+    return None
+
+
+def carregar_cameras(caminho):
+    """Lê o inventário (JSON ou CSV) e devolve a lista de dicts das câmeras, sem IPs repetidos."""
+    with open(caminho, encoding="utf-8") as file:
+        if caminho.lower().endswith(".csv"):
+            cameras = list(csv.DictReader(file))
+        else:
+            cameras = json.load(file)
+
+    vistos = set()
+    unicas = []
+    for camera in cameras:
+        if booleano(camera.get("validado")) is False:
+            continue  # achada pelo descoberta.py, mas sem credencial válida ("False" no CSV)
+        faltando = [campo for campo in CAMPOS_CAMERA if campo not in camera]
+        if faltando:
+            raise ValueError(f"Câmera sem {', '.join(faltando)} no inventário: {camera}")
+        if camera["camera_ip"] not in vistos:
+            vistos.add(camera["camera_ip"])
+            unicas.append(camera)
+    return unicas
+
+
+def _preparar_worker(concorrencia, limitar_carga=False):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    import requests_isapi
+
+    # Sessão própria do processo, com um pool por câmera em atendimento (o padrão guarda só 10 hosts)
+    sessao = requests.Session()
+    adapter = HTTPAdapter(pool_connections=concorrencia * 2, pool_maxsize=2)
+    sessao.mount("http://", adapter)
+    sessao.mount("https://", adapter)
+    requests_isapi.sessao = sessao
+    if limitar_carga:
+        from controle_carga import ControleCarga
+        ControleCarga.instalar(sessao)
+    return requests_isapi
+
+
+@functools.lru_cache(maxsize=None)
+def _aceita_https(funcao):
+    return "https" in inspect.signature(funcao).parameters
+
+
+def _executar_camera(funcao, camera, kwargs):
+    from requests_isapi import Resultado
+
+    inicio = time.perf_counter()
+    resultado = {"camera_ip": camera["camera_ip"], "pid": os.getpid()}
+    if booleano(camera.get("https")) and "https" not in kwargs:
+        if not _aceita_https(funcao):
+            # Câmera só em HTTPS: a função montaria http://camera_ip e falharia de um jeito confuso
+            resultado.update(ok=False, erro=f"{funcao.__name__} só usa HTTP e a câmera está em HTTPS", duracao_s=0.0)
+            return resultado
+        kwargs = {**kwargs, "https": True}
+    try:
+        retorno = funcao(camera["camera_ip"], camera["username"], camera["password"], **kwargs)
+        if isinstance(retorno, Resultado):
+            resultado.update(retorno.como_dict())
+        else:
+            resultado["retorno"] = retorno
+            resultado["ok"] = bool(retorno)
+    except Exception as e:
+        resultado["ok"] = False
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+    resultado["duracao_s"] = round(time.perf_counter() - inicio, 4)
+    return resultado
+
+
+async def _executar_lote(funcao, lote, kwargs, semaforo, fila_resultados, worker_id):
+    async def uma(camera):
+        async with semaforo:
+            resultado = await asyncio.to_thread(_executar_camera, funcao, camera, kwargs)
+        fila_resultados.put(("resultado", worker_id, resultado))
+
+    await asyncio.gather(*(uma(camera) for camera in lote))
+
+
+def _worker(worker_id, conexao, fila_resultados, operacao, kwargs, concorrencia, silencioso, limitar_carga):
+    import eventos
+
+    requests_isapi = _preparar_worker(concorrencia, limitar_carga)
+    funcao = getattr(requests_isapi, operacao)
+
+    async def loop_principal():
+        # O executor padrão tem min(32, núcleos + 4) threads e uma fica presa no conexao.recv: sem
+        # isto, --concorrencia 32 rodaria só núcleos + 3 câmeras por worker
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concorrencia + 1))
+        semaforo = asyncio.Semaphore(concorrencia)
+        tarefas = set()
+
+        async def processar(lote_id, lote):
+            inicio = time.perf_counter()
+            await _executar_lote(funcao, lote, kwargs, semaforo, fila_resultados, worker_id)
+            fila_resultados.put(("lote_concluido", worker_id, lote_id, time.perf_counter() - inicio))
+
+        while True:
+            mensagem = await asyncio.to_thread(conexao.recv)
+            if mensagem is None:
+                break
+            # Não espera o lote terminar: o semáforo é que limita as câmeras em paralelo, e o
+            # próximo lote já começa enquanto o anterior tem as últimas câmeras lentas
+            tarefa = asyncio.create_task(processar(*mensagem))
+            tarefas.add(tarefa)
+            tarefa.add_done_callback(tarefas.discard)
+        await asyncio.gather(*tarefas)
+
+    if silencioso:
+        # Só os eventos de erro do worker chegam ao stderr; falhas por câmera já vão no resultado
+        eventos.logger.setLevel(logging.ERROR)
+    else:
+        eventos.configurar(nivel=logging.INFO)
+    asyncio.run(loop_principal())
+    eventos.parar()
+
+
+class FleetRunner:
+    """
+    Coordena os workers. Cada worker mantém até `lotes_em_voo` lotes enviados, para nunca ficar
+    ocioso esperando o coordenador.
+    """
+
+    def __init__(self, operacao, kwargs=None, processos=None, concorrencia=32, tamanho_lote=64,
+                 lotes_em_voo=2, silencioso=True, limitar_carga=False):
+        self.operacao = operacao
+        self.kwargs = kwargs or {}
+        self.processos = processos or os.cpu_count() or 1
+        self.concorrencia = concorrencia
+        self.tamanho_lote = tamanho_lote
+        self.lotes_em_voo = lotes_em_voo
+        self.silencioso = silencioso
+        self.limitar_carga = limitar_carga  # ControleCarga (limite adaptativo por câmera) em cada worker
+        self.estatisticas = {}
+
+    def _particionar(self, cameras):
+        shards = [deque() for _ in range(self.processos)]
+        for i in range(0, len(cameras), self.tamanho_lote):
+            lote = cameras[i:i + self.tamanho_lote]
+            shards[(i // self.tamanho_lote) % self.processos].append(lote)
+        return shards
+
+    def _proximo_lote(self, worker_id, shards):
+        if shards[worker_id]:
+            return shards[worker_id].popleft(), False
+        # Shard próprio vazio: rouba do fim do shard mais atrasado
+        maior = max(range(len(shards)), key=lambda i: len(shards[i]))
+        if shards[maior]:
+            return shards[maior].pop(), True
+        return None, False
+
+    def executar(self, cameras, ao_receber=None):
+        """Roda a operação em todas as câmeras. ao_receber(resultado) é chamado a cada câmera concluída."""
+        import requests_isapi  # noqa: F401  (garante o import antes de criar os processos)
+
+        contexto = multiprocessing.get_context("spawn")
+        fila_resultados = contexto.Queue()
+        shards = self._particionar(cameras)
+        inicio = time.perf_counter()
+
+        workers, conexoes = [], []
+        for worker_id in range(self.processos):
+            conexao_coord, conexao_worker = contexto.Pipe()
+            processo = contexto.Process(
+                target=_worker,
+                args=(worker_id, conexao_worker, fila_resultados, self.operacao, self.kwargs, self.concorrencia, self.silencioso, self.limitar_carga),
+                daemon=True,
+            )
+            processo.start()
+            workers.append(processo)
+            conexoes.append(conexao_coord)
+            self.estatisticas[worker_id] = {"cameras": 0, "lotes": 0, "lotes_roubados": 0, "falhas": 0, "tempo_s": 0.0}
+
+        em_voo = [{} for _ in range(self.processos)]  # lote_id -> lote enviado e ainda não concluído
+        proximo_id = 0
+        concluidas = set()
+        vivos = set(range(self.processos))
+
+        def abastecer(worker_id):
+            nonlocal proximo_id
+            while worker_id in vivos and len(em_voo[worker_id]) < self.lotes_em_voo:
+                lote, roubado = self._proximo_lote(worker_id, shards)
+                if lote is None:
+                    return
+                conexoes[worker_id].send((proximo_id, lote))
+                em_voo[worker_id][proximo_id] = lote
+                proximo_id += 1
+                if roubado:
+                    self.estatisticas[worker_id]["lotes_roubados"] += 1
+
+        def registrar(resultado, worker_id):
+            # Resultados que um worker já declarado morto deixou na fila chegam depois das falhas
+            # registradas para o lote dele: contariam a câmera duas vezes
+            if resultado["camera_ip"] in concluidas:
+                return
+            concluidas.add(resultado["camera_ip"])
+            self.estatisticas[worker_id]["cameras"] += 1
+            if not resultado["ok"]:
+                self.estatisticas[worker_id]["falhas"] += 1
+            if ao_receber:
+                ao_receber(resultado)
+
+        def verificar_workers():
+            for worker_id in list(vivos):
+                if workers[worker_id].is_alive():
+                    continue
+                # Worker morreu: o que estava com ele e não voltou conta como falha, e o shard
+                # dele fica para os outros roubarem
+                vivos.discard(worker_id)
+                for lote in em_voo[worker_id].values():
+                    for camera in lote:
+                        if camera["camera_ip"] not in concluidas:
+                            registrar({"camera_ip": camera["camera_ip"], "ok": False,
+                                       "erro": f"worker {worker_id} encerrou (exitcode {workers[worker_id].exitcode})"}, worker_id)
+                em_voo[worker_id].clear()
+                for outro in vivos:
+                    abastecer(outro)
+            if not vivos:
+                raise RuntimeError("Todos os workers encerraram antes de terminar a frota.")
+
+        for worker_id in range(self.processos):
+            abastecer(worker_id)
+
+        try:
+            total = len({camera["camera_ip"] for camera in cameras})
+            while len(concluidas) < total:
+                try:
+                    tipo, worker_id, *dados = fila_resultados.get(timeout=1)
+                except queue.Empty:
+                    verificar_workers()
+                    continue
+                if worker_id not in vivos:
+                    continue
+                if tipo == "resultado":
+                    registrar(dados[0], worker_id)
+                elif tipo == "lote_concluido":
+                    em_voo[worker_id].pop(dados[0])
+                    self.estatisticas[worker_id]["lotes"] += 1
+                    self.estatisticas[worker_id]["tempo_s"] = round(self.estatisticas[worker_id]["tempo_s"] + dados[1], 4)
+                    abastecer(worker_id)
+        finally:
+            for worker_id in vivos:
+                conexoes[worker_id].send(None)
+            for processo in workers:
+                processo.join(timeout=10)
+
+        decorrido = time.perf_counter() - inicio
+        return {
+            "cameras": len(cameras),
+            "tempo_s": round(decorrido, 3),
+            "cameras_por_s": round(len(cameras) / decorrido, 2) if decorrido else 0.0,
+            "workers": self.estatisticas,
+        }
+
+
+def _parse_kwargs(pares):
+    kwargs = {}
+    for par in pares or []:
+        chave, _, valor = par.partition("=")
+        try:
+            kwargs[chave] = json.loads(valor)
+        except ValueError:
+            kwargs[chave] = valor
+    return kwargs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa uma função do requests_isapi na frota, em vários processos.")
+    parser.add_argument("inventario", help="Arquivo JSON ou CSV com camera_ip, username e password")
+    parser.add_argument("operacao", help="Nome da função do requests_isapi (ex.: get_server_certificates)")
+    parser.add_argument("--kw", action="append", help="Argumento extra chave=valor (valor em JSON quando possível)")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--concorrencia", type=int, default=32, help="Câmeras simultâneas por processo")
+    parser.add_argument("--tamanho-lote", type=int, default=64)
+    parser.add_argument("--saida", default="resultados.jsonl")
+    parser.add_argument("--limitar-carga", action="store_true", help="Limite adaptativo de requisições por câmera (controle_carga)")
+    args = parser.parse_args(argv)
+
+    cameras = carregar_cameras(args.inventario)
+    runner = FleetRunner(args.operacao, _parse_kwargs(args.kw), processos=args.processos,
+                         concorrencia=args.concorrencia, tamanho_lote=args.tamanho_lote,
+                         limitar_carga=args.limitar_carga)
+
+    with open(args.saida, "w", encoding="utf-8") as saida:
+        resumo = runner.executar(cameras, ao_receber=lambda r: saida.write(json.dumps(r, default=str, ensure_ascii=False) + "\n"))
+
+    print(json.dumps(resumo, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""
+Gravação e reprodução das trocas HTTP do requests_isapi, para reproduzir problemas de desempenho
+da produção sem acesso às câmeras.
+
+O Gravador é um adapter do requests montado na sessão do módulo (como o ControleCarga): cada
+requisição (inclusive o 401 do Digest) vai para a câmera e a troca é gravada no arquivo: método,
+URL, cabeçalhos e corpo da requisição (sem o Authorization), status, cabeçalhos e corpo da
+resposta, início relativo e latência. Por padrão, o corpo das escritas em /ISAPI/Security/ (upload
+de certificado PFX com a chave e a senha, troca de senha) não é gravado. Servem snapshots JPEG, XMLs de capacidades, JSON dos
+certificados e ResponseStatus. Uma exceção no lugar da resposta (timeout, conexão recusada) também
+vira troca, com o tipo do erro e o tempo até ele.
+
+O arquivo é um gzip de registros (tipo de 1 byte + tamanho + dados); cada corpo distinto é
+gravado uma vez só, identificado pelo SHA-1, e as trocas que o repetem (o mesmo ResponseStatus
+em mil PUTs) guardam só a referência.
+
+O Reprodutor responde às mesmas chamadas do módulo a partir do arquivo, na ordem gravada para
+cada (método, câmera, caminho, query, autenticada), esperando a latência gravada dividida por
+`velocidade` (1 = original, 10 = dez vezes mais rápido, 0 = sem espera). As trocas gravadas
+com exceção levantam a mesma classe do requests.exceptions depois dessa espera.
+
+Exemplo:
+    gravador = Gravador.instalar("producao.isapirec")
+    requests_isapi.salvar_imagem(camera_ip, username, password)
+    gravador.fechar()
+
+    Reprodutor.instalar("producao.isapirec", velocidade=0)
+    requests_isapi.salvar_imagem(camera_ip, username, password)  # mesma resposta, sem rede
+
+    python gravacao.py resumo producao.isapirec
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import statistics
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import requests_isapi
+
+MAGICO = b"ISAPIREC1"
+_REGISTRO = struct.Struct("<cI")  # tipo, tamanho
+CORPO = b"C"
+TROCA = b"T"
+
+# Escritas cujo corpo leva segredos (chave privada, senha do PFX, senhas de usuário)
+CAMINHOS_SENSIVEIS = ("/ISAPI/Security/",)
+
+
+def _corpo_requisicao(request):
+    corpo = request.body
+    if corpo is None:
+        return b""
+    if isinstance(corpo, str):
+        return corpo.encode("utf-8")
+    if isinstance(corpo, bytes):
+        return corpo
+    return b""  # gerador/arquivo: não dá para gravar sem consumir
+
+
+class Gravador(BaseAdapter):
+    """Adapter que repassa as requisições ao adapter original e grava as trocas."""
+
+    def __init__(self, internos, caminho, gravar_corpo_requisicao=None):
+        super().__init__()
+        self.internos = internos  # prefixo -> adapter original
+        self.caminho = caminho
+        # None: todos menos as escritas em CAMINHOS_SENSIVEIS; True: todos; False: nenhum
+        self.gravar_corpo_requisicao = gravar_corpo_requisicao
+        self._arquivo = gzip.open(caminho, "wb")
+        self._arquivo.write(MAGICO)
+        self._corpos = set()
+        self._lock = threading.Lock()
+        self._inicio = time.perf_counter()
+        self.trocas = 0
+        self.bytes_corpos = 0
+
+    @classmethod
+    def instalar(cls, caminho, sessao=None, **kwargs):
+        """Envolve os adapters da sessão (padrão: requests_isapi.sessao) e devolve o gravador."""
+        sessao = sessao or requests_isapi.sessao
+        gravador = cls({prefixo: sessao.get_adapter(prefixo) for prefixo in ("https://", "http://")}, caminho, **kwargs)
+        for prefixo in gravador.internos:
+            sessao.mount(prefixo, gravador)
+        return gravador
+
+    def _gravar_corpo(self, corpo):
+        # Chamado com o lock
+        if not corpo:
+            return None
+        chave = hashlib.sha1(corpo).digest()
+        if chave not in self._corpos:
+            self._corpos.add(chave)
+            self._arquivo.write(_REGISTRO.pack(CORPO, len(chave) + len(corpo)))
+            self._arquivo.write(chave)
+            self._arquivo.write(corpo)
+            self.bytes_corpos += len(corpo)
+        return chave.hex()
+
+    def _grava_corpo_requisicao(self, metodo, caminho):
+        if self.gravar_corpo_requisicao is None:
+            return metodo == "GET" or not caminho.startswith(CAMINHOS_SENSIVEIS)
+        return self.gravar_corpo_requisicao
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        interno = self.internos["https://" if partes.scheme == "https" else "http://"]
+        inicio = time.perf_counter()
+        troca = {
+            "metodo": request.method,
+            "host": partes.netloc,
+            "caminho": partes.path,
+            "query": partes.query,
+            "https": partes.scheme == "https",
+            "autenticada": "Authorization" in request.headers,
+            "cabecalhos_requisicao": {k: v for k, v in request.headers.items() if k.lower() != "authorization"},
+            "inicio_s": round(inicio - self._inicio, 6),
+        }
+        try:
+            resposta = interno.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            corpo = resposta.content  # o snapshot vem com stream=True: lê aqui para gravar
+        except Exception as e:
+            # Timeout, conexão recusada...: a troca vai sem resposta, com o tipo do erro e o tempo
+            # até ele, para o Reprodutor levantar o mesmo erro depois da mesma espera
+            troca.update(status=None, motivo=None, cabecalhos={}, erro={"tipo": type(e).__name__, "mensagem": str(e)},
+                         latencia_s=round(time.perf_counter() - inicio, 6))
+            self._gravar_troca(troca, request, partes, None)
+            raise
+        troca.update(status=resposta.status_code, motivo=resposta.reason, cabecalhos=dict(resposta.headers),
+                     latencia_s=round(time.perf_counter() - inicio, 6))
+        self._gravar_troca(troca, request, partes, corpo)
+
+        # O HTTPDigestAuth reenvia pelo resposta.connection: a perna autenticada também é gravada
+        resposta.connection = self
+        return resposta
+
+    def _gravar_troca(self, troca, request, partes, corpo):
+        with self._lock:
+            troca["corpo_requisicao"] = (self._gravar_corpo(_corpo_requisicao(request))
+                                         if self._grava_corpo_requisicao(request.method, partes.path) else None)
+            troca["corpo"] = self._gravar_corpo(corpo)
+            dados = json.dumps(troca, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            self._arquivo.write(_REGISTRO.pack(TROCA, len(dados)))
+            self._arquivo.write(dados)
+            self.trocas += 1
+
+    def fechar(self):
+        with self._lock:
+            self._arquivo.close()
+
+    def close(self):
+        self.fechar()
+        for interno in set(self.internos.values()):
+            interno.close()
+
+    def estatisticas(self):
+        return {"trocas": self.trocas, "corpos_distintos": len(self._corpos), "bytes_corpos": self.bytes_corpos}
+
+
+def ler_arquivo(caminho):
+    """Devolve (trocas, corpos {sha1 hex: bytes}) de um arquivo gravado; tolera um final truncado."""
+    trocas, corpos = [], {}
+    with gzip.open(caminho, "rb") as arquivo:
+        if arquivo.read(len(MAGICO)) != MAGICO:
+            raise ValueError(f"'{caminho}' não é uma gravação do requests_isapi.")
+        try:
+            while True:
+                cabecalho = arquivo.read(_REGISTRO.size)
+                if len(cabecalho) < _REGISTRO.size:
+                    break
+                tipo, tamanho = _REGISTRO.unpack(cabecalho)
+                dados = arquivo.read(tamanho)
+                if len(dados) < tamanho:
+                    break
+                if tipo == CORPO:
+                    corpos[dados[:20].hex()] = dados[20:]
+                elif tipo == TROCA:
+                    trocas.append(json.loads(dados))
+        except EOFError:
+            pass  # gravação interrompida: usa o que foi gravado inteiro
+    return trocas, corpos
+
+
+def _excecao(erro, request):
+    """A exceção gravada: a mesma classe do requests.exceptions (RequestException se não for dele)."""
+    classe = getattr(requests.exceptions, erro["tipo"], None)
+    if not (isinstance(classe, type) and issubclass(classe, requests.exceptions.RequestException)):
+        classe = requests.exceptions.RequestException
+    return classe(f"{erro['mensagem']} (gravado)", request=request)
+
+
+class Reprodutor(BaseAdapter):
+    """Adapter que responde a partir de uma gravação, com a latência gravada escalada por `velocidade`."""
+
+    def __init__(self, caminho, velocidade=1.0, repetir=True):
+        super().__init__()
+        self.velocidade = velocidade
+        self.repetir = repetir
+        trocas, self._corpos = ler_arquivo(caminho)
+        # Cada troca fica em duas filas (com e sem query); sem repetir, a servida por uma não pode
+        # sair de novo pela outra
+        self._servidas = set()
+        self._filas = {}
+        self._desafios = {}  # host -> um 401 gravado, para pedidos sem Authorization fora da ordem gravada
+        for troca in trocas:
+            self._filas.setdefault(self._chave(troca), deque()).append(troca)
+            self._filas.setdefault(self._chave(troca, com_query=False), deque()).append(troca)
+            if troca["status"] == 401 and not troca["autenticada"]:
+                self._desafios.setdefault(troca["host"], troca)
+        self._lock = threading.Lock()
+        self.reproduzidas = 0
+        self.nao_gravadas = 0
+        self.espera_s = 0.0
+
+    @staticmethod
+    def _chave(troca, com_query=True):
+        return (troca["metodo"], troca["host"], troca["caminho"], troca["query"] if com_query else None, troca["autenticada"])
+
+    @classmethod
+    def instalar(cls, caminho, sessao=None, **kwargs):
+        """Monta o reprodutor em http:// e https:// da sessão (padrão: requests_isapi.sessao)."""
+        sessao = sessao or requests_isapi.sessao
+        reprodutor = cls(caminho, **kwargs)
+        for prefixo in ("https://", "http://"):
+            sessao.mount(prefixo, reprodutor)
+        return reprodutor
+
+    def _proxima(self, pedido):
+        with self._lock:
+            for chave in (self._chave(pedido), self._chave(pedido, com_query=False)):
+                fila = self._filas.get(chave)
+                while fila:
+                    troca = fila.popleft()
+                    if self.repetir:
+                        fila.append(troca)  # gravação circular: o benchmark pode chamar mais vezes do que foi gravado
+                        return troca
+                    if id(troca) not in self._servidas:
+                        self._servidas.add(id(troca))
+                        return troca
+        if not pedido["autenticada"]:
+            return self._desafios.get(pedido["host"])
+        return None
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        pedido = {"metodo": request.method, "host": partes.netloc, "caminho": partes.path, "query": partes.query,
+                  "autenticada": "Authorization" in request.headers}
+        troca = self._proxima(pedido)
+
+        resposta = Response()
+        resposta.url = request.url
+        resposta.request = request
+        resposta.connection = self
+        if troca is None:
+            self.nao_gravadas += 1
+            resposta.status_code = 404
+            resposta.reason = "Not Found"
+            resposta.headers = CaseInsensitiveDict({"Content-Type": "text/plain"})
+            resposta._content = f"{request.method} {partes.path} não está na gravação".encode("utf-8")
+            resposta.elapsed = datetime.timedelta(0)
+            return resposta
+
+        if self.velocidade:
+            espera = troca["latencia_s"] / self.velocidade
+            time.sleep(espera)
+            self.espera_s += espera
+        self.reproduzidas += 1
+        if troca.get("erro"):
+            raise _excecao(troca["erro"], request)
+        resposta.status_code = troca["status"]
+        resposta.reason = troca["motivo"]
+        resposta.headers = CaseInsensitiveDict(troca["cabecalhos"])
+        resposta.encoding = get_encoding_from_headers(resposta.headers)
+        resposta._content = self._corpos.get(troca["corpo"], b"") if troca["corpo"] else b""
+        resposta.elapsed = datetime.timedelta(seconds=troca["latencia_s"])
+        return resposta
+
+    def close(self):
+        pass
+
+    def estatisticas(self):
+        return {"reproduzidas": self.reproduzidas, "nao_gravadas": self.nao_gravadas, "espera_s": round(self.espera_s, 3)}
+
+
+def resumo(caminho):
+    """Trocas, bytes e latência (p50/máx, ms) por método, caminho e status de uma gravação."""
+    trocas, corpos = ler_arquivo(caminho)
+    rotas = {}
+    for troca in trocas:
+        rota = f"{troca['metodo']} {troca['caminho']} {troca['status'] or troca['erro']['tipo']}"
+        rotas.setdefault(rota, []).append(troca)
+    return {
+        "trocas": len(trocas),
+        "corpos_distintos": len(corpos),
+        "bytes_corpos": sum(map(len, corpos.values())),
+        "rotas": {
+            rota: {
+                "trocas": len(lista),
+                "bytes": sum(len(corpos.get(t["corpo"], b"")) for t in lista if t["corpo"]),
+                "latencia_p50_ms": round(statistics.median(t["latencia_s"] for t in lista) * 1000, 2),
+                "latencia_max_ms": round(max(t["latencia_s"] for t in lista) * 1000, 2),
+            }
+            for rota, lista in sorted(rotas.items())
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gravações de trocas HTTP do requests_isapi.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_resumo = sub.add_parser("resumo", help="Mostra as rotas, bytes e latências de uma gravação")
+    p_resumo.add_argument("arquivo")
+    args = parser.parse_args(argv)
+
+    print(json.dumps(resumo(args.arquivo), indent=4, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+Registro do inventário da frota em colunas, com índices por site, modelo, firmware, número de
+canais e saúde, para escolher os alvos de um job sem scripts sobre planilhas.
+
+Cada atributo é uma coluna codificada por dicionário (array de códigos + tabela de valores) e cada
+valor tem um índice secundário em bitmap: um int do Python com o bit i ligado para a câmera da
+linha i, como no índice de capacidades. Uma consulta é só & | ~ entre ints (em C); com 100.000
+câmeras, site & modelo & saúde leva alguns microssegundos. A lista de IPs sai do bitmap em bytes
+(to_bytes, em C): a busca dos bytes não nulos também é em C e o laço em Python passa só por eles,
+então o custo acompanha o tamanho da seleção, não o da frota.
+
+O registro não guarda senhas: cada câmera aponta para uma referência de credencial (coluna
+"credencial"), resolvida só na hora de executar, por um arquivo separado ou por variável de
+ambiente ISAPI_CREDENCIAL_<REF>=usuario:senha. Inventários antigos com username/password na linha
+ainda carregam; essas credenciais ficam no resolvedor, em memória, sob uma referência "inline:".
+
+Uso:
+    python inventario.py inventario.csv --credenciais credenciais.json --site fazenda-norte --saude ok
+    python inventario.py inventario.json --modelo DS-2CD2T47G2 --canais-min 2 --operacao set_ircut --kw ircut_filter_type='"night"'
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+from array import array
+
+from eventos import evento
+from fleet_runner import booleano
+
+ATRIBUTOS = ("site", "modelo", "firmware", "canais", "saude")
+
+# Posições dos bits ligados de cada valor de byte, para tirar as linhas do bitmap byte a byte
+_BITS_DO_BYTE = tuple(tuple(bit for bit in range(8) if valor >> bit & 1) for valor in range(256))
+_BYTE_NAO_NULO = re.compile(rb"[^\x00]")
+
+
+class Credenciais:
+    """Resolve referências de credencial: arquivo JSON {ref: {username, password}} e/ou ambiente."""
+
+    def __init__(self, arquivo=None, ambiente=True):
+        self._arquivo = {}
+        if arquivo:
+            with open(arquivo, encoding="utf-8") as file:
+                self._arquivo = json.load(file)
+        self.ambiente = ambiente
+        self._inline = {}  # ref -> (username, password)
+        self._ref_inline = {}  # (username, password) -> ref
+
+    def registrar_inline(self, username, password):
+        ref = self._ref_inline.get((username, password))
+        if ref is None:
+            ref = self._ref_inline[(username, password)] = f"inline:{username}:{len(self._inline)}"
+            self._inline[ref] = (username, password)
+        return ref
+
+    def resolver(self, ref):
+        if ref in self._inline:
+            return self._inline[ref]
+        if ref in self._arquivo:
+            entrada = self._arquivo[ref]
+            return entrada["username"], entrada["password"]
+        if self.ambiente:
+            valor = os.environ.get("ISAPI_CREDENCIAL_" + re.sub(r"\W", "_", ref).upper())
+            if valor and ":" in valor:
+                username, _, password = valor.partition(":")
+                return username, password
+        raise KeyError(f"Credencial '{ref}' não encontrada (arquivo de credenciais ou ISAPI_CREDENCIAL_*).")
+
+
+class Coluna:
+    """Coluna codificada por dicionário, com um bitmap por valor."""
+
+    __slots__ = ("nome", "valores", "_codigo", "codigos", "bitmaps")
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.valores = []  # código -> valor
+        self._codigo = {}  # valor -> código
+        self.codigos = array("I")  # linha -> código
+        self.bitmaps = []  # código -> int com as linhas desse valor
+
+    def codigo(self, valor):
+        codigo = self._codigo.get(valor)
+        if codigo is None:
+            codigo = self._codigo[valor] = len(self.valores)
+            self.valores.append(valor)
+            self.bitmaps.append(0)
+        return codigo
+
+    def mascara(self, filtro):
+        """Bitmap das linhas que atendem ao filtro: valor, coleção de valores ou função sobre o valor."""
+        if callable(filtro):
+            escolhidos = [c for c, valor in enumerate(self.valores) if valor is not None and filtro(valor)]
+        elif isinstance(filtro, (list, tuple, set, frozenset)):
+            escolhidos = [self._codigo[v] for v in filtro if v in self._codigo]
+        else:
+            codigo = self._codigo.get(filtro)
+            escolhidos = [] if codigo is None else [codigo]
+        mascara = 0
+        for codigo in escolhidos:
+            mascara |= self.bitmaps[codigo]
+        return mascara
+
+    def contagem(self):
+        return {valor: self.bitmaps[c].bit_count() for c, valor in enumerate(self.valores) if self.bitmaps[c]}
+
+
+class Selecao:
+    """Conjunto de câmeras do registro (um bitmap). Aceita & | - ^ e ~ (complemento nas câmeras ativas)."""
+
+    __slots__ = ("registro", "mascara")
+
+    def __init__(self, registro, mascara):
+        self.registro = registro
+        self.mascara = mascara
+
+    def __and__(self, outra):
+        return Selecao(self.registro, self.mascara & outra.mascara)
+
+    def __or__(self, outra):
+        return Selecao(self.registro, self.mascara | outra.mascara)
+
+    def __sub__(self, outra):
+        return Selecao(self.registro, self.mascara & ~outra.mascara)
+
+    def __xor__(self, outra):
+        return Selecao(self.registro, self.mascara ^ outra.mascara)
+
+    def __invert__(self):
+        return Selecao(self.registro, self.registro._ativas & ~self.mascara)
+
+    def __len__(self):
+        return self.mascara.bit_count()
+
+    def __bool__(self):
+        return self.mascara != 0
+
+    def linhas(self):
+        """Índices das linhas, em ordem; o laço em Python é só sobre os bytes não nulos do bitmap."""
+        if not self.mascara:
+            return []
+        dados = self.mascara.to_bytes((self.mascara.bit_length() + 7) // 8, "little")
+        linhas = []
+        for achado in _BYTE_NAO_NULO.finditer(dados):
+            base = achado.start() * 8
+            linhas.extend(base + bit for bit in _BITS_DO_BYTE[dados[achado.start()]])
+        return linhas
+
+    def __iter__(self):
+        ips = self.registro.camera_ips
+        return (ips[i] for i in self.linhas())
+
+    def camera_ips(self):
+        ips = self.registro.camera_ips
+        return [ips[i] for i in self.linhas()]
+
+    def cameras(self):
+        """Dicts com camera_ip, username e password (credenciais resolvidas agora), prontos para o FleetRunner."""
+        return [self.registro.camera(i) for i in self.linhas()]
+
+    def __repr__(self):
+        return f"<Selecao {len(self)} câmeras>"
+
+
+class Registro:
+    """Inventário em colunas. `atributos` são as colunas indexadas."""
+
+    def __init__(self, credenciais=None, atributos=ATRIBUTOS):
+        self.credenciais = credenciais or Credenciais()
+        self.camera_ips = []
+        self._linha = {}
+        self.colunas = {nome: Coluna(nome) for nome in atributos}
+        self.credencial = Coluna("credencial")
+        self.https = array("b")  # linha -> 1 se a câmera só responde em HTTPS (campo https do descoberta.py)
+        self._ativas = 0
+
+    @classmethod
+    def carregar(cls, caminho, credenciais=None, atributos=ATRIBUTOS):
+        """Lê um inventário JSON (lista de objetos) ou CSV com cabeçalho."""
+        with open(caminho, encoding="utf-8") as file:
+            if caminho.lower().endswith(".csv"):
+                linhas = list(csv.DictReader(file))
+            else:
+                linhas = json.load(file)
+        registro = cls(credenciais, atributos)
+        inline = 0
+        for camera in linhas:
+            # No CSV o validado vem como texto ("False")
+            if booleano(camera.get("validado")) is False:
+                continue  # achada pelo descoberta.py, mas sem credencial válida
+            inline += not camera.get("credencial") and "password" in camera
+            registro.adicionar(camera)
+        if inline:
+            evento("credencial_inline", logging.WARNING,
+                   "{cameras} câmeras de '{arquivo}' com senha no inventário; prefira a coluna credencial",
+                   arquivo=caminho, cameras=inline)
+        return registro
+
+    @staticmethod
+    def _valor(nome, valor):
+        if valor in ("", None):
+            return None
+        if nome == "canais":
+            return int(valor)
+        return valor
+
+    def adicionar(self, camera):
+        """Inclui (ou atualiza) uma câmera a partir de um dict do inventário."""
+        camera_ip = camera["camera_ip"]
+        if camera.get("credencial"):
+            ref = camera["credencial"]
+        elif "username" in camera and "password" in camera:
+            ref = self.credenciais.registrar_inline(camera["username"], camera["password"])
+        else:
+            raise ValueError(f"Câmera sem credencial no inventário: {camera_ip}")
+
+        linha = self._linha.get(camera_ip)
+        if linha is not None:
+            self.atualizar(camera_ip, credencial=ref, **{n: camera.get(n) for n in self.colunas if n in camera})
+            if "https" in camera:
+                self.https[linha] = bool(booleano(camera["https"]))
+            return linha
+
+        linha = self._linha[camera_ip] = len(self.camera_ips)
+        self.camera_ips.append(camera_ip)
+        bit = 1 << linha
+        for nome, coluna in self.colunas.items():
+            codigo = coluna.codigo(self._valor(nome, camera.get(nome)))
+            coluna.codigos.append(codigo)
+            coluna.bitmaps[codigo] |= bit
+        codigo = self.credencial.codigo(ref)
+        self.credencial.codigos.append(codigo)
+        self.credencial.bitmaps[codigo] |= bit
+        self.https.append(bool(booleano(camera.get("https"))))
+        self._ativas |= bit
+        return linha
+
+    def atualizar(self, camera_ip, **atributos):
+        """Troca atributos de uma câmera (ex.: saude="offline"), movendo o bit entre os bitmaps."""
+        linha = self._linha[camera_ip]
+        bit = 1 << linha
+        for nome, valor in atributos.items():
+            coluna = self.credencial if nome == "credencial" else self.colunas[nome]
+            antigo = coluna.codigos[linha]
+            novo = coluna.codigo(valor if nome == "credencial" else self._valor(nome, valor))
+            if novo != antigo:
+                coluna.bitmaps[antigo] &= ~bit
+                coluna.bitmaps[novo] |= bit
+                coluna.codigos[linha] = novo
+
+    def remover(self, camera_ip):
+        # A linha continua nas colunas (os índices das outras não mudam), só sai das seleções
+        linha = self._linha.pop(camera_ip)
+        bit = 1 << linha
+        self._ativas &= ~bit
+        for coluna in (*self.colunas.values(), self.credencial):
+            coluna.bitmaps[coluna.codigos[linha]] &= ~bit
+
+    def __len__(self):
+        return self._ativas.bit_count()
+
+    def __contains__(self, camera_ip):
+        return camera_ip in self._linha
+
+    def todos(self):
+        return Selecao(self, self._ativas)
+
+    def onde(self, **filtros):
+        """
+        Câmeras que atendem a todos os filtros. Cada filtro é um valor, uma coleção de valores (ou)
+        ou uma função sobre o valor: onde(site="norte", modelo={"A", "B"}, canais=lambda n: n >= 2).
+        """
+        mascara = self._ativas
+        for nome, filtro in filtros.items():
+            mascara &= (self.credencial if nome == "credencial" else self.colunas[nome]).mascara(filtro)
+            if not mascara:
+                break
+        return Selecao(self, mascara)
+
+    def atributos(self, camera_ip):
+        linha = self._linha[camera_ip]
+        return {nome: coluna.valores[coluna.codigos[linha]] for nome, coluna in self.colunas.items()}
+
+    def camera(self, linha):
+        """Dict da câmera da linha, com as credenciais resolvidas."""
+        username, password = self.credenciais.resolver(self.credencial.valores[self.credencial.codigos[linha]])
+        return {"camera_ip": self.camera_ips[linha], "username": username, "password": password,
+                "https": bool(self.https[linha])}
+
+    def contagem(self, atributo):
+        return self.colunas[atributo].contagem()
+
+    def executar(self, selecao, operacao, kwargs=None, ao_receber=None, **opcoes_runner):
+        """Roda `operacao` (função do requests_isapi) nas câmeras da seleção pelo FleetRunner."""
+        from fleet_runner import FleetRunner
+
+        return FleetRunner(operacao, kwargs, **opcoes_runner).executar(selecao.cameras(), ao_receber=ao_receber)
+
+
+def main(argv=None):
+    from fleet_runner import _parse_kwargs
+
+    parser = argparse.ArgumentParser(description="Seleciona câmeras do inventário e, opcionalmente, executa uma operação.")
+    parser.add_argument("inventario", help="Arquivo JSON ou CSV")
+    parser.add_argument("--credenciais", help="JSON {ref: {username, password}}")
+    for nome in ("site", "modelo", "firmware", "saude"):
+        parser.add_argument(f"--{nome}", nargs="+", help="Um ou mais valores (ou)")
+    parser.add_argument("--canais", type=int, nargs="+")
+    parser.add_argument("--canais-min", type=int)
+    parser.add_argument("--sem-saude", nargs="+", default=[], help="Exclui câmeras com essa saúde")
+    parser.add_argument("--operacao", help="Função do requests_isapi a executar nas câmeras selecionadas")
+    parser.add_argument("--kw", action="append")
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--saida", default="resultados.jsonl")
+    args = parser.parse_args(argv)
+
+    registro = Registro.carregar(args.inventario, Credenciais(args.credenciais))
+    filtros = {nome: set(getattr(args, nome)) for nome in ("site", "modelo", "firmware", "saude", "canais") if getattr(args, nome)}
+    selecao = registro.onde(**filtros)
+    if args.canais_min is not None:
+        selecao &= registro.onde(canais=lambda n: n >= args.canais_min)
+    if args.sem_saude:
+        selecao -= registro.onde(saude=set(args.sem_saude))
+
+    if not args.operacao:
+        for camera_ip in selecao.camera_ips():
+            print(camera_ip)
+        return 0
+
+    with open(args.saida, "w", encoding="utf-8") as saida:
+        resumo = registro.executar(selecao, args.operacao, _parse_kwargs(args.kw), processos=args.processos,
+                                   ao_receber=lambda r: saida.write(json.dumps(r, default=str, ensure_ascii=False) + "\n"))
+    print(json.dumps(resumo, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
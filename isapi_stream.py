@@ -0,0 +1,242 @@
+"""
+Acesso assíncrono (asyncio) aos endpoints ISAPI que ficam abertos transmitindo, como o
+/ISAPI/Event/notification/alertStream e o httpPreview, e que não cabem no modelo
+requisição/resposta do requests.
+
+A autenticação é a mesma Digest do requests_isapi (o HTTPDigestAuth em cache por câmera); aqui só
+trocamos o transporte por conexões asyncio, para manter centenas de streams num único processo.
+Todos os buffers têm limite: um cabeçalho, delimitador ou parte maior que o limite vira ErroStream
+em vez de crescer a memória sem controle.
+"""
+import asyncio
+import ssl
+
+from requests.utils import parse_dict_header
+
+from requests_isapi import _auth_digest
+
+LIMITE_BUFFER = 256 * 1024  # maior cabeçalho/parte sem Content-Length que aceitamos acumular
+
+
+class ErroStream(Exception):
+    """Falha no protocolo do stream (status inesperado, cabeçalho inválido, limite de buffer)."""
+
+    def __init__(self, mensagem, status_code=None):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+def _host_porta(camera_ip, https):
+    # Como no resto do módulo, camera_ip pode vir como "ip" ou "ip:porta"
+    host, _, porta = camera_ip.partition(":")
+    return host, int(porta) if porta else (443 if https else 80)
+
+
+def _cabecalho_digest(auth, metodo, url, www_authenticate):
+    """Monta o Authorization a partir do desafio recebido, reaproveitando o estado do HTTPDigestAuth."""
+    auth.init_per_thread_state()
+    auth._thread_local.chal = parse_dict_header(www_authenticate.split(" ", 1)[1])
+    return auth.build_digest_header(metodo, url)
+
+
+async def _ler_cabecalhos(reader):
+    try:
+        bloco = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError as e:
+        raise ErroStream("Cabeçalho HTTP maior que o limite do buffer.") from e
+    except asyncio.IncompleteReadError as e:
+        raise ErroStream("Conexão fechada antes do fim do cabeçalho HTTP.") from e
+
+    linhas = bloco.decode("latin-1").split("\r\n")
+    try:
+        status_code = int(linhas[0].split(" ", 2)[1])
+    except (IndexError, ValueError) as e:
+        raise ErroStream(f"Linha de status inválida: {linhas[0]!r}") from e
+
+    headers = {}
+    for linha in linhas[1:]:
+        if ":" in linha:
+            nome, valor = linha.split(":", 1)
+            headers[nome.strip().lower()] = valor.strip()
+    return status_code, headers
+
+
+class CorpoStream:
+    """
+    Leitor do corpo da resposta com a mesma interface mínima do asyncio.StreamReader
+    (readuntil/readexactly), desfazendo o Transfer-Encoding: chunked quando a câmera usa.
+    """
+
+    def __init__(self, reader, chunked, limite=LIMITE_BUFFER):
+        self._reader = reader
+        self._chunked = chunked
+        self._limite = limite
+        self._buffer = bytearray()
+        self._fim = False
+
+    async def _preencher(self):
+        if self._fim:
+            raise asyncio.IncompleteReadError(bytes(self._buffer), None)
+        linha = await self._reader.readuntil(b"\r\n")
+        try:
+            tamanho = int(linha.split(b";", 1)[0], 16)
+        except ValueError as e:
+            raise ErroStream(f"Tamanho de chunk inválido: {linha!r}") from e
+        if tamanho < 0:
+            raise ErroStream(f"Tamanho de chunk inválido: {linha!r}")
+        if tamanho == 0:
+            self._fim = True
+            raise asyncio.IncompleteReadError(bytes(self._buffer), None)
+        self._buffer += await self._reader.readexactly(tamanho)
+        await self._reader.readexactly(2)  # CRLF do fim do chunk
+
+    async def readuntil(self, separador):
+        if not self._chunked:
+            try:
+                return await self._reader.readuntil(separador)
+            except asyncio.LimitOverrunError as e:
+                raise ErroStream("Delimitador não encontrado dentro do limite do buffer.") from e
+
+        inicio = 0
+        while True:
+            pos = self._buffer.find(separador, inicio)
+            if pos != -1:
+                fim = pos + len(separador)
+                dados = bytes(self._buffer[:fim])
+                del self._buffer[:fim]
+                return dados
+            if len(self._buffer) > self._limite:
+                raise ErroStream("Delimitador não encontrado dentro do limite do buffer.")
+            inicio = max(0, len(self._buffer) - len(separador) + 1)
+            await self._preencher()
+
+    async def readexactly(self, n):
+        if not self._chunked:
+            return await self._reader.readexactly(n)
+        while len(self._buffer) < n:
+            await self._preencher()
+        dados = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return dados
+
+
+class RespostaStream:
+    """Resposta de um stream ISAPI já autenticado: status, headers (minúsculos) e o corpo."""
+
+    def __init__(self, status_code, headers, corpo, writer):
+        self.status_code = status_code
+        self.headers = headers
+        self.corpo = corpo
+        self._writer = writer
+
+    @property
+    def boundary(self):
+        """Boundary do Content-Type multipart, ou None se a resposta não for multipart."""
+        content_type = self.headers.get("content-type", "")
+        for parametro in content_type.split(";")[1:]:
+            nome, _, valor = parametro.strip().partition("=")
+            if nome.lower() == "boundary":
+                return valor.strip('"').encode("latin-1")
+        return None
+
+    async def fechar(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except (ConnectionError, ssl.SSLError):
+            pass
+
+
+async def _enviar_get(camera_ip, caminho, https, timeout, limite, authorization=None):
+    host, porta = _host_porta(camera_ip, https)
+    contexto_ssl = None
+    if https:
+        # Mesmo comportamento das funções com https=True e sem cert_path: as câmeras usam certificado próprio
+        contexto_ssl = ssl.create_default_context()
+        contexto_ssl.check_hostname = False
+        contexto_ssl.verify_mode = ssl.CERT_NONE
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, porta, ssl=contexto_ssl, limit=limite), timeout
+    )
+    requisicao = f"GET {caminho} HTTP/1.1\r\nHost: {camera_ip}\r\nAccept: */*\r\n"
+    if authorization:
+        requisicao += f"Authorization: {authorization}\r\n"
+    writer.write((requisicao + "\r\n").encode("latin-1"))
+    await writer.drain()
+
+    status_code, headers = await asyncio.wait_for(_ler_cabecalhos(reader), timeout)
+    return reader, writer, status_code, headers
+
+
+async def abrir_stream(camera_ip, username, password, caminho, https=False, timeout=10, limite=LIMITE_BUFFER):
+    """
+    Faz o GET com o handshake Digest e devolve a RespostaStream com o corpo ainda por ler.
+    Levanta ErroStream se a câmera não responder 200 (401 = login ou senha incorretos).
+    """
+    auth = _auth_digest(camera_ip, username, password)
+    protocolo = "https" if https else "http"
+    url = f"{protocolo}://{camera_ip}{caminho}"
+
+    authorization = auth.build_digest_header("GET", url) if auth._thread_local.__dict__.get("chal") else None
+    reader, writer, status_code, headers = await _enviar_get(camera_ip, caminho, https, timeout, limite, authorization)
+
+    if status_code == 401 and "digest" in headers.get("www-authenticate", "").lower():
+        # Nonce novo (ou primeira conexão): a câmera fecha ou mantém a conexão, reabrimos sempre
+        writer.close()
+        authorization = _cabecalho_digest(auth, "GET", url, headers["www-authenticate"])
+        reader, writer, status_code, headers = await _enviar_get(camera_ip, caminho, https, timeout, limite, authorization)
+
+    if status_code != 200:
+        writer.close()
+        if status_code == 401:
+            raise ErroStream(f"Conexão FALHOU para {camera_ip}: Login ou senha incorretos.", status_code)
+        raise ErroStream(f"Falha ao abrir {caminho} em {camera_ip}. Código de status: {status_code}", status_code)
+
+    chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+    return RespostaStream(status_code, headers, CorpoStream(reader, chunked, limite), writer)
+
+
+def _parse_cabecalhos_parte(bloco):
+    headers = {}
+    for linha in bloco.decode("latin-1").split("\r\n"):
+        if ":" in linha:
+            nome, valor = linha.split(":", 1)
+            headers[nome.strip().lower()] = valor.strip()
+    return headers
+
+
+async def partes_multipart(corpo, boundary, max_parte=8 * 1024 * 1024):
+    """
+    Gerador assíncrono de (headers, dados) para cada parte de um corpo multipart.
+
+    Partes com Content-Length (o normal nas câmeras Hikvision) são lidas de uma vez com
+    readexactly, direto para o objeto final, sem ir acumulando pedaços. Sem Content-Length,
+    a parte é delimitada pelo próximo boundary e fica sujeita ao limite do buffer.
+    """
+    delimitador = b"--" + boundary
+    await corpo.readuntil(delimitador)  # descarta o preâmbulo
+
+    while True:
+        resto_linha = await corpo.readuntil(b"\r\n")
+        if resto_linha.startswith(b"--"):
+            return  # boundary final "--boundary--"
+
+        headers = _parse_cabecalhos_parte(await corpo.readuntil(b"\r\n\r\n"))
+        tamanho = headers.get("content-length")
+
+        if tamanho is not None:
+            try:
+                tamanho = int(tamanho)
+            except ValueError as e:
+                raise ErroStream(f"Content-Length inválido na parte: {tamanho!r}") from e
+            if tamanho < 0:
+                raise ErroStream(f"Content-Length inválido na parte: {tamanho!r}")
+            if tamanho > max_parte:
+                raise ErroStream(f"Parte de {tamanho} bytes acima do limite de {max_parte}.")
+            dados = await corpo.readexactly(tamanho)
+            yield headers, dados
+            await corpo.readuntil(delimitador)
+        else:
+            dados = await corpo.readuntil(b"\r\n" + delimitador)
+            yield headers, dados[:-len(delimitador) - 2]
@@ -0,0 +1,348 @@
+"""
+Modelo tipado dos parâmetros de imagem (/ISAPI/Image/channels), com __slots__, para manter a
+configuração de milhares de câmeras em memória num serviço sem guardar árvores XML.
+
+Um único GET traz o ImageChannelList; cada ImageChannel guarda só o seu trecho do XML em bytes
+(sem os atributos version/xmlns repetidos em cada seção) e decodifica uma seção (WDR, Exposure,
+Shutter...) na primeira vez que ela é acessada. As seções conhecidas viram objetos com os campos
+tipados; as demais continuam disponíveis como XML bruto por secao_bruta().
+
+Cada seção anota os campos alterados e gera o PUT mínimo (só esses campos, como o set_color já
+faz), no mesmo recurso usado pelas funções do requests_isapi.
+
+Exemplo:
+    canais = buscar(camera_ip, username, password).conteudo
+    canal = canais[0]
+    canal.shutter.opcoes            # ['1/1', '1/3', ...] sem reler arquivo nem ET.parse
+    canal.gain.gain_level = 60
+    canal.ircut_filter.ircut_filter_type = "night"
+    canal.aplicar(camera_ip, username, password)  # um PUT em .../gain e outro em .../ircutFilter
+"""
+import os
+import re
+from functools import lru_cache
+
+import requests
+
+from eventos import evento
+import requests_isapi
+from requests_isapi import Resultado
+
+NAMESPACE = "http://www.hikvision.com/ver20/XMLSchema"
+
+_ATRIBUTOS_COMUNS = f' version="2.0" xmlns="{NAMESPACE}"'.encode()
+_ATRIBUTOS_SECAO = re.compile(rb'\s+(?:version|xmlns)="[^"]*"')
+_ID = re.compile(rb"<id>\s*(\d+)\s*</id>")
+_ENABLED = re.compile(rb"<enabled>\s*(\w+)\s*</enabled>")
+_OPT = re.compile(rb'\bopt="([^"]*)"')
+
+
+def _bloco(xml, tag):
+    """Trecho do primeiro elemento `tag` em xml (bytes), ou None."""
+    inicio = re.search(rb"<" + tag.encode() + rb"[\s>/]", xml)
+    if not inicio:
+        return None
+    fim = xml.find(b"</" + tag.encode() + b">", inicio.start())
+    return xml[inicio.start():fim + len(tag) + 3] if fim >= 0 else None
+
+
+def _folha(xml, caminho):
+    """(valor, opt) da folha no caminho "A/B/tag" dentro de xml; (None, None) se ausente."""
+    *pais, tag = caminho.split("/")
+    for pai in pais:
+        xml = _bloco(xml, pai)
+        if xml is None:
+            return None, None
+    encontrado = re.search(rb"<" + tag.encode() + rb"\b([^>]*)>([^<]*)</" + tag.encode() + rb">", xml)
+    if not encontrado:
+        return None, None
+    # opt pode vir em qualquer posição entre os atributos (ex.: <ShutterLevel min=".." opt="...">)
+    opt = _OPT.search(encontrado.group(1))
+    return encontrado.group(2).decode("utf-8").strip(), opt.group(1).decode("utf-8") if opt else None
+
+
+def _converter(texto, tipo):
+    if texto is None:
+        return None
+    if tipo is bool:
+        return texto.lower() == "true"
+    if tipo is int:
+        try:
+            return int(texto)
+        except ValueError:
+            return texto
+    return texto
+
+
+def _formatar(valor):
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return str(valor)
+
+
+class Secao:
+    """
+    Base das seções. CAMPOS é uma tupla (atributo, caminho no XML, tipo); `_alterados` é uma
+    máscara de bits dos campos alterados desde a leitura (ou o último aplicar).
+    """
+    TAG = None
+    RECURSO = None
+    CAMPOS = ()
+    __slots__ = ("_alterados",)
+
+    def __init__(self, xml=b""):
+        object.__setattr__(self, "_alterados", 0)
+        for nome, caminho, tipo in self.CAMPOS:
+            object.__setattr__(self, nome, _converter(_folha(xml, caminho)[0], tipo) if xml else None)
+
+    def __setattr__(self, nome, valor):
+        object.__setattr__(self, nome, valor)
+        for i, (campo, _, _) in enumerate(self.CAMPOS):
+            if campo == nome:
+                object.__setattr__(self, "_alterados", self._alterados | (1 << i))
+                return
+
+    @property
+    def alterada(self):
+        return bool(self._alterados)
+
+    def alterados(self):
+        return [nome for i, (nome, _, _) in enumerate(self.CAMPOS) if self._alterados >> i & 1]
+
+    def como_dict(self):
+        return {nome: getattr(self, nome) for nome, _, _ in self.CAMPOS}
+
+    def payload(self, todos=False):
+        """XML do PUT com os campos alterados (ou todos os conhecidos); None se não houver o que enviar."""
+        arvore = {}
+        for i, (nome, caminho, _) in enumerate(self.CAMPOS):
+            valor = getattr(self, nome)
+            if valor is None or not (todos or self._alterados >> i & 1):
+                continue
+            no = arvore
+            *pais, tag = caminho.split("/")
+            for pai in pais:
+                no = no.setdefault(pai, {})
+            no[tag] = _formatar(valor)
+        if not arvore:
+            return None
+
+        def montar(no):
+            return "".join(f"<{tag}>{montar(v) if isinstance(v, dict) else v}</{tag}>" for tag, v in no.items())
+
+        return (f'<?xml version="1.0" encoding="UTF-8"?><{self.TAG} xmlns="{NAMESPACE}" version="2.0">'
+                f"{montar(arvore)}</{self.TAG}>")
+
+    def limpar(self):
+        object.__setattr__(self, "_alterados", 0)
+
+    def __repr__(self):
+        campos = " ".join(f"{nome}={getattr(self, nome)!r}" for nome, _, _ in self.CAMPOS)
+        return f"<{type(self).__name__} {campos}>"
+
+
+class WDR(Secao):
+    TAG, RECURSO = "WDR", "WDR"
+    CAMPOS = (("mode", "mode", str), ("wdr_level", "WDRLevel", int))
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class Exposure(Secao):
+    TAG, RECURSO = "Exposure", "exposure"
+    CAMPOS = (("exposure_type", "ExposureType", str),
+              ("overexpose_suppress", "OverexposeSuppress/enabled", bool),
+              ("p_iris_type", "PIrisGeneral/pIrisType", str),
+              ("iris_level", "PIrisGeneral/irisLevel", int))
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class Shutter(Secao):
+    TAG, RECURSO = "Shutter", "shutter"
+    CAMPOS = (("shutter_level", "ShutterLevel", str),)
+    __slots__ = tuple(c[0] for c in CAMPOS) + ("opcoes",)
+
+    def __init__(self, xml=b""):
+        super().__init__(xml)
+        opt = _folha(xml, "ShutterLevel")[1] if xml else None
+        # Mesma lista que o get_shutter_time_levels_from_file devolve
+        object.__setattr__(self, "opcoes", opt.split(",") if opt else [])
+
+
+class Gain(Secao):
+    TAG, RECURSO = "Gain", "gain"
+    CAMPOS = (("gain_level", "GainLevel", int),)
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class WhiteBalance(Secao):
+    TAG, RECURSO = "WhiteBalance", "whiteBalance"
+    CAMPOS = (("white_balance_style", "WhiteBalanceStyle", str),
+              ("white_balance_red", "WhiteBalanceRed", int),
+              ("white_balance_blue", "WhiteBalanceBlue", int))
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class IrcutFilter(Secao):
+    TAG, RECURSO = "IrcutFilter", "ircutFilter"
+    CAMPOS = (("ircut_filter_type", "IrcutFilterType", str),
+              ("night_to_day_filter_level", "nightToDayFilterLevel", int),
+              ("night_to_day_filter_time", "nightToDayFilterTime", int))
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class Color(Secao):
+    TAG, RECURSO = "Color", "color"
+    CAMPOS = (("brightness_level", "brightnessLevel", int),
+              ("contrast_level", "contrastLevel", int),
+              ("saturation_level", "saturationLevel", int))
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+class Sharpness(Secao):
+    TAG, RECURSO = "Sharpness", "sharpness"
+    CAMPOS = (("sharpness_level", "SharpnessLevel", int),)
+    __slots__ = tuple(c[0] for c in CAMPOS)
+
+
+# atributo do ImageChannel -> classe da seção
+SECOES = {
+    "wdr": WDR,
+    "exposure": Exposure,
+    "shutter": Shutter,
+    "gain": Gain,
+    "white_balance": WhiteBalance,
+    "ircut_filter": IrcutFilter,
+    "color": Color,
+    "sharpness": Sharpness,
+}
+
+
+class ImageChannel:
+    """
+    Um canal do ImageChannelList. `_xml` é o trecho do canal; as seções ficam em slots privados
+    (_wdr, _exposure...) e são decodificadas no primeiro acesso ao atributo público.
+    """
+    __slots__ = ("id", "enabled", "_xml") + tuple("_" + nome for nome in SECOES)
+
+    def __init__(self, xml):
+        # Quase todas as seções repetem os mesmos atributos: replace (em C) e regex só se sobrar algum
+        xml = xml.replace(_ATRIBUTOS_COMUNS, b"")
+        self._xml = _ATRIBUTOS_SECAO.sub(b"", xml) if b"xmlns=" in xml or b"version=" in xml else xml
+        id_canal = _ID.search(self._xml)
+        self.id = int(id_canal.group(1)) if id_canal else 1
+        enabled = _ENABLED.search(self._xml)
+        self.enabled = enabled is not None and enabled.group(1) == b"true"
+        for nome in SECOES:
+            setattr(self, "_" + nome, None)
+
+    def secao_bruta(self, tag):
+        """XML (str) de qualquer seção do canal, decodificada ou não no modelo (Defog, BLC, EIS...)."""
+        trecho = _bloco(self._xml, tag)
+        return trecho.decode("utf-8") if trecho is not None else None
+
+    def secoes_carregadas(self):
+        return {nome: getattr(self, "_" + nome) for nome in SECOES if getattr(self, "_" + nome) is not None}
+
+    def payloads(self):
+        """[(caminho, XML)] dos PUTs mínimos das seções alteradas."""
+        saida = []
+        for secao in self.secoes_carregadas().values():
+            payload = secao.payload()
+            if payload is not None:
+                saida.append((f"/ISAPI/Image/channels/{self.id}/{secao.RECURSO}", payload))
+        return saida
+
+    def aplicar(self, camera_ip, username, password):
+        """Envia os PUTs das seções alteradas; as que a câmera aceitar (ResponseStatus OK) ficam limpas."""
+        ultimo = Resultado(True, conteudo=[])
+        enviados = []
+        for secao in self.secoes_carregadas().values():
+            payload = secao.payload()
+            if payload is None:
+                continue
+            operacao = f"ImageChannel.{secao.RECURSO}"
+            url = f"http://{camera_ip}/ISAPI/Image/channels/{self.id}/{secao.RECURSO}"
+            try:
+                response = requests_isapi.sessao.put(url, data=payload, headers={"Content-Type": "application/xml"},
+                                                     auth=requests_isapi._auth_digest(camera_ip, username, password), timeout=5)
+            except requests.exceptions.RequestException as e:
+                return requests_isapi._falha_conexao(operacao, camera_ip, e)
+            if response.status_code != 200:
+                return requests_isapi._falha_http(operacao, camera_ip, response)
+            if "<statusString>OK</statusString>" not in response.text:
+                return requests_isapi._resposta_inesperada(operacao, camera_ip, response.text)
+            evento("configuracao_aplicada", mensagem="{secao} do canal {canal} configurado com sucesso.",
+                   operacao="ImageChannel.aplicar", camera_ip=camera_ip, secao=secao.TAG, canal=self.id,
+                   campos=secao.alterados())
+            secao.limpar()
+            enviados.append(secao.TAG)
+            ultimo = Resultado(True, 200, enviados)
+        return ultimo
+
+    def __repr__(self):
+        return f"<ImageChannel id={self.id} enabled={self.enabled} {len(self._xml)} bytes>"
+
+
+def _propriedade(nome, classe):
+    privado = "_" + nome
+
+    def ler(self):
+        secao = getattr(self, privado)
+        if secao is None:
+            trecho = _bloco(self._xml, classe.TAG)
+            secao = classe(trecho) if trecho is not None else None
+            setattr(self, privado, secao)
+        return secao
+
+    ler.__doc__ = f"Seção {classe.TAG}, decodificada no primeiro acesso (None se o canal não tiver)."
+    return property(ler)
+
+
+for _nome, _classe in SECOES.items():
+    setattr(ImageChannel, _nome, _propriedade(_nome, _classe))
+
+
+def ler_image_channels(xml):
+    """Lista de ImageChannel de um ImageChannelList (bytes ou str) ou de um único ImageChannel."""
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    canais = []
+    inicio = xml.find(b"<ImageChannel")
+    while inicio >= 0:
+        if xml[inicio + 13:inicio + 14] in (b" ", b">", b"\n", b"\t", b"\r"):  # não confundir com <ImageChannellist>
+            fim = xml.find(b"</ImageChannel>", inicio)
+            if fim < 0:
+                break
+            canais.append(ImageChannel(xml[inicio:fim + 15]))
+            inicio = xml.find(b"<ImageChannel", fim)
+        else:
+            inicio = xml.find(b"<ImageChannel", inicio + 13)
+    return canais
+
+
+@lru_cache(maxsize=64)
+def _ler_arquivo(caminho, mtime_ns, tamanho):
+    with open(caminho, "rb") as file:
+        return ler_image_channels(file.read())
+
+
+def ler_arquivo(caminho):
+    """
+    ImageChannels de um XML salvo (ex.: pelo get_parametros_imagem), lido uma vez por versão do
+    arquivo: a lista fica em cache por (caminho, mtime, tamanho) e é compartilhada entre as chamadas,
+    então não altere os campos dela (para editar, use ler_image_channels).
+    """
+    estado = os.stat(caminho)
+    return _ler_arquivo(os.path.abspath(caminho), estado.st_mtime_ns, estado.st_size)
+
+
+def buscar(camera_ip, username, password):
+    """GET /ISAPI/Image/channels (sem salvar arquivo); Resultado.conteudo é a lista de ImageChannel."""
+    url = f"http://{camera_ip}/ISAPI/Image/channels"
+    try:
+        response = requests_isapi.sessao.get(url, auth=requests_isapi._auth_digest(camera_ip, username, password), timeout=5)
+    except requests.exceptions.RequestException as e:
+        return requests_isapi._falha_conexao("modelo_imagem.buscar", camera_ip, e)
+    if response.status_code != 200:
+        return requests_isapi._falha_http("modelo_imagem.buscar", camera_ip, response)
+    return Resultado(True, 200, ler_image_channels(response.content))
@@ -0,0 +1,195 @@
+"""
+Geração de previews (miniaturas JPEG) junto com a captura, em vez de um script separado que relê
+cada JPEG do disco.
+
+Os frames entram em memória (bytes do JPEG, pelo ao_frame do fps_captura_imagem, nos modos
+snapshot e stream, do salvar_imagem e do capturar_imagem, ou direto da CapturaStream com consumir())
+e vão em lotes para um pool de processos, que:
+- decodifica já em escala reduzida (Image.draft: o decoder JPEG aplica a redução de 1/2, 1/4 ou
+  1/8 na DCT, então um 2688x1520 vira ~336x190 sem decodificar os pixels em tamanho cheio);
+- redimensiona para o tamanho final e recodifica.
+Uma thread grava os previews prontos em lotes. O número de frames ainda sem preview gravado é
+limitado: enviar() bloqueia (ou devolve False, sem bloquear) quando o limite é atingido, e a
+captura desacelera ou descarta em vez de a memória crescer.
+
+Depende do Pillow (pip install Pillow), importado só nos processos do pool.
+
+Exemplo:
+    with PipelinePreviews("previews") as previews:
+        requests_isapi.fps_captura_imagem(camera_ip, username, password, n=500, ao_frame=previews.enviar)
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from queue import Empty, Queue
+
+from eventos import evento
+
+
+def gerar_preview(dados, tamanho=(320, 180), qualidade=70):
+    """Bytes do preview JPEG de um frame, sem passar pela resolução cheia."""
+    from PIL import Image
+
+    imagem = Image.open(BytesIO(dados))
+    imagem.draft("RGB", tamanho)
+    imagem.thumbnail(tamanho, Image.Resampling.BILINEAR)
+    saida = BytesIO()
+    imagem.save(saida, "JPEG", quality=qualidade)
+    return saida.getvalue()
+
+
+def _gerar_lote(frames, tamanho, qualidade, gerar):
+    # Um lote por tarefa: uma ida e volta de pickle para vários frames
+    prontos = []
+    for nome, dados in frames:
+        try:
+            prontos.append((nome, gerar(dados, tamanho, qualidade), None))
+        except Exception as e:
+            prontos.append((nome, None, f"{type(e).__name__}: {e}"))
+    return prontos
+
+
+class PipelinePreviews:
+    """
+    Pool de processos para os previews e thread de escrita. `gerar` é a função (de nível de módulo,
+    para ir ao pool) que recebe (dados, tamanho, qualidade) e devolve os bytes do preview.
+    """
+
+    def __init__(self, diretorio, tamanho=(320, 180), qualidade=70, processos=None, lote=16,
+                 max_pendentes=256, lote_escrita=64, gerar=gerar_preview):
+        self.diretorio = diretorio
+        self.tamanho = tuple(tamanho)
+        self.qualidade = qualidade
+        self.lote = lote
+        self.lote_escrita = lote_escrita
+        self.gerar = gerar
+        os.makedirs(diretorio, exist_ok=True)
+
+        self._pool = ProcessPoolExecutor(processos)
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._lock = threading.Lock()
+        self._atual = []
+        self._prontos = Queue()
+        self._em_voo = 0
+        self._ocioso = threading.Condition(self._lock)
+        self._escritor = threading.Thread(target=self._escrever_loop, name="previews-escrita", daemon=True)
+        self._escritor.start()
+
+        self.recebidos = 0
+        self.gravados = 0
+        self.falhas = 0
+        self.recusados = 0
+        self.espera_s = 0.0
+
+    def enviar(self, nome, dados, bloquear=True, timeout=None):
+        """
+        Entrega um frame (nome do arquivo do preview, bytes do JPEG). Com o limite de pendentes
+        atingido, espera (bloquear=True) ou devolve False para a captura descartar o frame.
+        """
+        inicio = time.perf_counter()
+        if not self._vagas.acquire(bloquear, timeout):
+            self.recusados += 1
+            return False
+        self.espera_s += time.perf_counter() - inicio
+        with self._lock:
+            self.recebidos += 1
+            self._em_voo += 1
+            self._atual.append((nome, dados))
+            if len(self._atual) >= self.lote:
+                self._submeter()
+        return True
+
+    async def consumir(self, captura, nome="{camera_ip}_{channel_id}_{numero}.jpg"):
+        """Consome uma CapturaStream; enquanto o pool estiver cheio a fila da captura descarta os antigos."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        async for frame in captura:
+            arquivo = nome.format(camera_ip=frame.camera_ip, channel_id=frame.channel_id, numero=frame.numero)
+            await loop.run_in_executor(None, self.enviar, arquivo, frame.dados)
+
+    def _submeter(self):
+        # Chamado com o lock
+        frames, self._atual = self._atual, []
+        futuro = self._pool.submit(_gerar_lote, frames, self.tamanho, self.qualidade, self.gerar)
+        futuro.add_done_callback(lambda f, frames=frames: self._prontos.put(
+            f.result() if not f.exception() else [(nome, None, repr(f.exception())) for nome, _ in frames]
+        ))
+
+    def _escrever_loop(self):
+        while True:
+            lotes = [self._prontos.get()]
+            if lotes[0] is None:
+                return
+            # Junta o que já estiver pronto (até lote_escrita frames) para gravar de uma vez
+            parar = False
+            while sum(map(len, lotes)) < self.lote_escrita:
+                try:
+                    lote = self._prontos.get_nowait()
+                except Empty:
+                    break
+                if lote is None:
+                    parar = True
+                    break
+                lotes.append(lote)
+            self._gravar([item for lote in lotes for item in lote])
+            if parar:
+                return
+
+    def _gravar(self, itens):
+        gravados = 0
+        try:
+            for nome, preview, erro in itens:
+                if preview is None:
+                    self.falhas += 1
+                    evento("preview_falhou", logging.WARNING, "Preview de {arquivo} falhou: {erro}", arquivo=nome, erro=erro)
+                    continue
+                try:
+                    with open(os.path.join(self.diretorio, nome), "wb") as file:
+                        file.write(preview)
+                except OSError as e:
+                    # Disco cheio, diretório removido...: conta como falha e segue com os outros
+                    self.falhas += 1
+                    evento("preview_falhou", logging.WARNING, "Preview de {arquivo} falhou: {erro}", arquivo=nome, erro=str(e))
+                    continue
+                gravados += 1
+        finally:
+            # As vagas voltam sempre: sem isso enviar() bloquearia a captura e esvaziar() não voltaria
+            self.gravados += gravados
+            with self._lock:
+                self._em_voo -= len(itens)
+                self._ocioso.notify_all()
+            for _ in itens:
+                self._vagas.release()
+        evento("previews_gravados", logging.DEBUG, gravados=gravados, diretorio=self.diretorio)
+
+    def esvaziar(self, timeout=None):
+        """Manda o lote parcial para o pool e espera todos os previews pendentes serem gravados."""
+        with self._lock:
+            if self._atual:
+                self._submeter()
+            return self._ocioso.wait_for(lambda: self._em_voo == 0, timeout)
+
+    def fechar(self):
+        self.esvaziar()
+        self._prontos.put(None)
+        self._escritor.join()
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def estatisticas(self):
+        return {
+            "recebidos": self.recebidos,
+            "gravados": self.gravados,
+            "falhas": self.falhas,
+            "recusados": self.recusados,
+            "pendentes": self._em_voo,
+            "espera_total_s": round(self.espera_s, 3),
+        }
@@ -1,97 +1,243 @@
 import os
+import logging
 import requests
 from requests.auth import HTTPDigestAuth
 from xml.dom.minidom import parseString
 import xml.etree.ElementTree as ET
 import time
-import base64 
+import hashlib
+from functools import lru_cache
+
+from eventos import evento
 
 """
 Sobre as requisições no geral
-- Se o valor fornecido for maior que o máximo permitido, será definido como o valor máximo.  
-- Se o valor fornecido for menor que o mínimo permitido, será definido como 0.  
-- Se um valor inválido for enviado (letras ou formato incorreto), a resposta retornará badreq.  
-- Se uma tag vazia for enviada, as configurações atuais serão mantidas.  
-- Não é necessário enviar todas as tags internas. Exemplo: ao enviar apenas `<brightnessLevel>0</brightnessLevel>`, 
-as demais configurações permanecerão inalteradas. 
+- Se o valor fornecido for maior que o máximo permitido, será definido como o valor máximo.
+- Se o valor fornecido for menor que o mínimo permitido, será definido como 0.
+- Se um valor inválido for enviado (letras ou formato incorreto), a resposta retornará badreq.
+- Se uma tag vazia for enviada, as configurações atuais serão mantidas.
+- Não é necessário enviar todas as tags internas. Exemplo: ao enviar apenas `<brightnessLevel>0</brightnessLevel>`,
+as demais configurações permanecerão inalteradas.
 - Tanto as tags quanto os payload são casesensitive
+
+Todas as funções devolvem um Resultado e informam o que aconteceu por eventos estruturados (módulo
+eventos, logger "isapi") em vez de print(); para ver as mensagens, chame eventos.configurar().
 """
 
+# Sessão compartilhada por todas as funções: reaproveita as conexões (keep-alive) e permite
+# montar adapters próprios, por exemplo as respostas gravadas usadas em benchmarks/
+sessao = requests.Session()
+
+@lru_cache(maxsize=None)
+def _auth_digest(camera_ip, username, password):
+    # Um HTTPDigestAuth por câmera: depois do primeiro 401 o nonce fica guardado e as próximas
+    # requisições já vão com o Authorization, sem a ida e volta extra do desafio
+    return HTTPDigestAuth(username, password)
+
+@lru_cache(maxsize=None)
+def _impressao_credencial(username, password):
+    return hashlib.sha256(f"{username}\0{password}".encode("utf-8")).hexdigest()
+
+def _credencial_da_requisicao(request):
+    """
+    Impressão (sha256 de usuário e senha) do HTTPDigestAuth aplicado ao PreparedRequest, ou None
+    sem Digest. O auth se registra nos hooks de resposta, que seguem nas cópias da segunda perna;
+    os adapters que reaproveitam respostas (cache_config, voo_unico) separam as entradas por ela,
+    para a resposta de uma senha nunca ser entregue a outra.
+    """
+    for gancho in request.hooks.get("response", ()):
+        auth = getattr(gancho, "__self__", None)
+        if isinstance(auth, HTTPDigestAuth):
+            return _impressao_credencial(auth.username, auth.password)
+    return None
+
+def _servido_localmente(url, auth):
+    """
+    True se algum adapter montado na sessão (direto ou envolvido por outro, pelo `internos`) já
+    tem a resposta do GET de url para essas credenciais, como a entrada válida do cache_config.
+    """
+    adapter = sessao.get_adapter(url)
+    prefixo = "https://" if url.startswith("https://") else "http://"
+    while adapter is not None:
+        em_cache = getattr(adapter, "em_cache", None)
+        if em_cache is not None and em_cache(url, auth):
+            return True
+        adapter = getattr(adapter, "internos", {}).get(prefixo)
+    return False
+
+class Resultado:
+    """
+    Retorno das funções do módulo. Vale como bool (ok), então `if not verificar_camera_conectada(...)`
+    continua funcionando.
+        ok (bool): se a operação deu certo.
+        status_code (int | None): código HTTP da última resposta, se houve resposta.
+        conteudo: o que a operação produziu (XML em texto, JSON convertido, caminho do arquivo...).
+        erro (str | None): descrição da falha.
+    """
+    __slots__ = ("ok", "status_code", "conteudo", "erro")
+
+    def __init__(self, ok, status_code=None, conteudo=None, erro=None):
+        self.ok = ok
+        self.status_code = status_code
+        self.conteudo = conteudo
+        self.erro = erro
+
+    def __bool__(self):
+        return self.ok
+
+    def como_dict(self):
+        return {"ok": self.ok, "status_code": self.status_code, "conteudo": self.conteudo, "erro": self.erro}
+
+    def __repr__(self):
+        return f"Resultado(ok={self.ok}, status_code={self.status_code}, erro={self.erro!r})"
+
+def _response_status_ok(response_xml, status_code="1"):
+    # ResponseStatus de sucesso: <statusCode>1</statusCode> e <statusString>OK</statusString>
+    return f"<statusCode>{status_code}</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml
+
+def _falha_http(operacao, camera_ip, response):
+    evento("requisicao_falhou", logging.WARNING, "{operacao}: falha em {camera_ip}. Código de status: {status_code}",
+           operacao=operacao, camera_ip=camera_ip, status_code=response.status_code)
+    return Resultado(False, response.status_code, response.text, erro=f"HTTP {response.status_code}")
+
+def _resposta_inesperada(operacao, camera_ip, response_xml):
+    evento("resposta_inesperada", logging.WARNING, "{operacao}: resposta inesperada de {camera_ip}",
+           operacao=operacao, camera_ip=camera_ip, conteudo=response_xml)
+    return Resultado(False, 200, response_xml, erro="ResponseStatus diferente de OK")
+
+def _falha_conexao(operacao, camera_ip, e):
+    if isinstance(e, requests.exceptions.Timeout):
+        evento("timeout", logging.WARNING, "{operacao}: tempo limite excedido ao tentar conectar à câmera {camera_ip}.",
+               operacao=operacao, camera_ip=camera_ip)
+        return Resultado(False, erro="timeout")
+    nome = "erro_ssl" if isinstance(e, requests.exceptions.SSLError) else "erro_conexao"
+    evento(nome, logging.WARNING, "{operacao}: erro de conexão com a câmera {camera_ip}: {erro}",
+           operacao=operacao, camera_ip=camera_ip, erro=str(e))
+    return Resultado(False, erro=str(e))
+
 def verificar_camera_conectada(camera_ip, username, password):
     url = f'http://{camera_ip}/ISAPI/Security/UserPermission/1'
-    
+
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5)
-        
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), timeout=5)
+
         if response.status_code == 200:
-            print(f'Conexão com a câmera {camera_ip} VALIDADA')
-            return True
+            evento("conexao_validada", mensagem="Conexão com a câmera {camera_ip} VALIDADA", camera_ip=camera_ip)
+            return Resultado(True, 200)
         elif response.status_code == 401:
-            print(f'Conexão FALHOU para {camera_ip}: Login ou senha incorretos.')
-            return False
+            evento("conexao_falhou", logging.WARNING, "Conexão FALHOU para {camera_ip}: Login ou senha incorretos.",
+                   camera_ip=camera_ip, status_code=401)
+            return Resultado(False, 401, erro="Login ou senha incorretos")
         else:
-            print(f'Conexão FALHOU para {camera_ip}: Erro desconhecido (Código de status: {response.status_code})')
-            return False
+            evento("conexao_falhou", logging.WARNING, "Conexão FALHOU para {camera_ip}: Erro desconhecido (Código de status: {status_code})",
+                   camera_ip=camera_ip, status_code=response.status_code)
+            return Resultado(False, response.status_code, erro=f"HTTP {response.status_code}")
 
-    except requests.exceptions.Timeout:
-        print(f'Conexão FALHOU para {camera_ip}: Tempo limite excedido ao tentar conectar à câmera.')
-        return False
     except requests.exceptions.RequestException as e:
-        print(f'Conexão FALHOU para {camera_ip}: Erro de conexão - {e}')
-        return False
+        return _falha_conexao("verificar_camera_conectada", camera_ip, e)
 
 def salvar_xml_conteudo(conteudo_xml, nome_arquivo):
     # Faz o parse do conteúdo XML para indentá-lo com menos quebras de linha
     xml_dom = parseString(conteudo_xml)
     xml_pretty_str = "\n".join([line for line in xml_dom.toprettyxml(indent="    ").splitlines() if line.strip()])
-    
+
     # Salva o XML formatado sem quebras de linha extras
     with open(nome_arquivo, "w", encoding="utf-8") as file:
         file.write(xml_pretty_str)
-    print(f"Conteúdo XML salvo com sucesso em '{nome_arquivo}' com indentação reduzida.")
-
-def salvar_imagem(camera_ip, username, password):
-    url = f"http://{camera_ip}/ISAPI/Streaming/channels/1/picture"
-    filename = f"{camera_ip}_imagem.jpg"
+    evento("xml_salvo", logging.DEBUG, "Conteúdo XML salvo com sucesso em '{arquivo}' com indentação reduzida.", arquivo=nome_arquivo)
+    return Resultado(True, conteudo=nome_arquivo)
+
+def _baixar_imagem(operacao, camera_ip, username, password, canal, largura, altura, tipo_imagem):
+    url = f"http://{camera_ip}/ISAPI/Streaming/channels/{canal}/picture"
+    params = {}
+    if largura and altura:
+        params["videoResolutionWidth"] = largura
+        params["videoResolutionHeight"] = altura
+    if tipo_imagem:
+        params["snapShotImageType"] = tipo_imagem
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), stream=True)
+        response = sessao.get(url, params=params or None, auth=_auth_digest(camera_ip, username, password), stream=True)
         if response.status_code == 200:
-            with open(filename, "wb") as file:
-                file.write(response.content)
-            print(f"Captura de imagem para {camera_ip} validada. Imagem salva como {filename}")
+            return Resultado(True, 200, response.content)
         else:
-            print(f"Captura de imagem falhou para {camera_ip}. Código de status: {response.status_code}")
+            return _falha_http(operacao, camera_ip, response)
     except requests.RequestException as e:
-        print(f"Captura de imagem falhou para {camera_ip}. Erro de conexão: {e}")
+        return _falha_conexao(operacao, camera_ip, e)
 
-def fps_captura_imagem(camera_ip, username, password, n=500):
+def capturar_imagem(camera_ip, username, password, canal=1, largura=None, altura=None, tipo_imagem=None, ao_frame=None):
+    """
+    Snapshot em memória (Resultado.conteudo são os bytes do JPEG), sem gravar arquivo.
+    largura/altura e tipo_imagem viram os parâmetros videoResolutionWidth, videoResolutionHeight e
+    snapShotImageType do .../picture; o firmware que não os suporta devolve a resolução do canal.
+    Para escolher a resolução pelas capacidades da câmera, ver snapshot.py.
+    ao_frame(nome, bytes), como no fps_captura_imagem, recebe o JPEG (nome: {camera_ip}_imagem.jpg).
+    """
+    resultado = _baixar_imagem("capturar_imagem", camera_ip, username, password, canal, largura, altura, tipo_imagem)
+    if resultado and ao_frame:
+        ao_frame(f"{camera_ip}_imagem.jpg", resultado.conteudo)
+    return resultado
+
+def salvar_imagem(camera_ip, username, password, canal=1, largura=None, altura=None, tipo_imagem=None, output_file=None, ao_frame=None):
+    filename = output_file or f"{camera_ip}_imagem.jpg"
+    resultado = _baixar_imagem("salvar_imagem", camera_ip, username, password, canal, largura, altura, tipo_imagem)
+    if not resultado:
+        return resultado
+    with open(filename, "wb") as file:
+        file.write(resultado.conteudo)
+    if ao_frame:
+        ao_frame(os.path.basename(filename), resultado.conteudo)
+    evento("imagem_salva", mensagem="Captura de imagem para {camera_ip} validada. Imagem salva como {arquivo}",
+           camera_ip=camera_ip, arquivo=filename, bytes=len(resultado.conteudo))
+    return Resultado(True, 200, filename)
+
+def fps_captura_imagem(camera_ip, username, password, n=500, modo="snapshot", channel_id=101, ao_frame=None):
+  # modo="snapshot": um GET em .../picture por imagem (channel_id não é usado)
+  # modo="stream": um único httpPreview MJPEG no channel_id (ver captura_stream), para comparar o throughput;
+  # mede os intervalos entre frames, então exige n >= 2 e não pode ser chamado de dentro de um event loop
+  # Resultado.conteudo traz os tempos (por imagem no snapshot, entre frames no stream)
+  # ao_frame(nome_arquivo, bytes) recebe cada imagem em memória (nos dois modos), por exemplo previews.PipelinePreviews.enviar
   url = f"http://{camera_ip}/ISAPI/Streaming/channels/1/picture"
   tempos = []
 
-  for i in range(n):
-    OUTPUT_FILE = f"{camera_ip}_{i}_snapshot.jpg"
-    start_time = time.perf_counter()
-    
-    try:
-      response = requests.get(url, auth=HTTPDigestAuth(username, password), stream=True)
-      tempos.append(time.perf_counter() - start_time)
-      if response.status_code == 200:
-        with open(OUTPUT_FILE, "wb") as file:
-          file.write(response.content)
-          print("Tudo certo!")
-              
-    except requests.RequestException:
-      print("Deu merda")
+  if modo == "stream":
+    from captura_stream import capturar_intervalos
+    tempos = capturar_intervalos(camera_ip, username, password, n=n, channel_id=channel_id, ao_frame=ao_frame)
+
+  elif modo == "snapshot":
+    for i in range(n):
+      OUTPUT_FILE = f"{camera_ip}_{i}_snapshot.jpg"
+      start_time = time.perf_counter()
+
+      try:
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), stream=True)
+        tempos.append(time.perf_counter() - start_time)
+        if response.status_code == 200:
+          with open(OUTPUT_FILE, "wb") as file:
+            file.write(response.content)
+          if ao_frame:
+            ao_frame(OUTPUT_FILE, response.content)
+          evento("frame_salvo", logging.DEBUG, camera_ip=camera_ip, frame=i)
+        else:
+          evento("frame_falhou", logging.WARNING, "Frame {frame} de {camera_ip} falhou. Código de status: {status_code}",
+                 camera_ip=camera_ip, frame=i, status_code=response.status_code)
+
+      except requests.RequestException as e:
+        evento("frame_falhou", logging.WARNING, "Frame {frame} de {camera_ip} falhou: {erro}", camera_ip=camera_ip, frame=i, erro=str(e))
+
+  else:
+    raise ValueError("Modo inválido. Escolha entre: snapshot, stream")
 
   if tempos:
     fps_min = 1 / max(tempos)
     fps_max = 1 / min(tempos)
     fps_medio = 1 / (sum(tempos) / len(tempos))
 
-    print(f"{fps_min:.4f} {fps_max:.4f} {fps_medio:.4f}")
+    evento("fps_medido", mensagem="{modo}: {fps_min:.4f} {fps_max:.4f} {fps_medio:.4f}",
+           camera_ip=camera_ip, modo=modo, frames=len(tempos), fps_min=fps_min, fps_max=fps_max, fps_medio=fps_medio)
+  return Resultado(bool(tempos), conteudo=tempos)
 
 def get_parametros_imagem(camera_ip, username, password, output_file="get_image_parameters_7a46_defaul_conf.xml"):
-    """ 
+    """
     Exemplo resposta, não tem as opções de input
     <ImageChannel>
         <id>1</id>
@@ -105,57 +251,63 @@ def get_parametros_imagem(camera_ip, username, password, output_file="get_image_
             <WDRLevel>67</WDRLevel>
         </WDR> ... brilho, contraste, todas as configs de display
     """
-    # Primeiro, verifica se a câmera está conectada
-    if not verificar_camera_conectada(camera_ip, username, password):
-        return
-    
     url = f'http://{camera_ip}/ISAPI/Image/channels'
-    
+    auth = _auth_digest(camera_ip, username, password)
+
+    # Primeiro, verifica se a câmera está conectada; com a leitura em cache (cache_config) para
+    # essas credenciais a verificação seria só uma ida à câmera a mais, e fica de fora
+    if not _servido_localmente(url, auth):
+        conexao = verificar_camera_conectada(camera_ip, username, password)
+        if not conexao:
+            return conexao
+
     try:
         # Envia a requisição GET com autenticação Digest
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.get(url, auth=auth, timeout=5)
 
         # Verifica se a requisição foi bem-sucedida
         if response.status_code == 200:
             # Salva o conteúdo XML usando a função salvar_xml_conteudo
-            print(response.text)
             salvar_xml_conteudo(response.content, output_file)
+            evento("consulta_concluida", mensagem="Parâmetros de imagem de {camera_ip} salvos em '{arquivo}'",
+                   operacao="get_parametros_imagem", camera_ip=camera_ip, arquivo=output_file)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao obter parâmetros de imagem. Código de status: {response.status_code}")
-            print("Conteúdo da resposta:", response.text)
+            return _falha_http("get_parametros_imagem", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("get_parametros_imagem", camera_ip, e)
 
 def get_system_capacities(camera_ip, username, password, output_file="get_system_capacities_4A24_defaul_conf.xml"):
-    """ 
+    """
     Exemplo resposta
     <DeviceCap>
         <isSupportROI>true</isSupportROI>
         <isSupportX>true</isSupportX>
     </DeviceCap>
+    Com output_file=None o XML não é salvo em arquivo (só vai em Resultado.conteudo), como no
+    índice de capacidades (capacidades.py).
     """
-   
+
     url = f'http://{camera_ip}/ISAPI/System/capabilities'
-    
+
     try:
         # Envia a requisição GET com autenticação Digest
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a requisição foi bem-sucedida
         if response.status_code == 200:
             # Salva o conteúdo XML usando a função salvar_xml_conteudo
-            salvar_xml_conteudo(response.content, output_file)
+            if output_file is not None:
+                salvar_xml_conteudo(response.content, output_file)
+            evento("consulta_concluida", mensagem="Capacidades do sistema de {camera_ip} salvas em '{arquivo}'",
+                   operacao="get_system_capacities", camera_ip=camera_ip, arquivo=output_file)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao obter parâmetros de imagem. Código de status: {response.status_code}")
-            print("Conteúdo da resposta:", response.text)
+            return _falha_http("get_system_capacities", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("get_system_capacities", camera_ip, e)
 
 def get_device_status_capacities(camera_ip, username, password, output_file="get_system_status_7a46_defaul_conf.xml"):
     """
@@ -171,31 +323,30 @@ def get_device_status_capacities(camera_ip, username, password, output_file="get
         </MemoryList>
     </DeviceStatus>
     """
-   
+
     url = f'http://{camera_ip}/ISAPI/System/status'
-    
+
     try:
         # Envia a requisição GET com autenticação Digest
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a requisição foi bem-sucedida
         if response.status_code == 200:
             # Salva o conteúdo XML usando a função salvar_xml_conteudo
-            print(response.text)
             salvar_xml_conteudo(response.content, output_file)
+            evento("consulta_concluida", mensagem="Status de {camera_ip} salvo em '{arquivo}'",
+                   operacao="get_device_status_capacities", camera_ip=camera_ip, arquivo=output_file)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao obter parâmetros de status. Código de status: {response.status_code}")
-            print("Conteúdo da resposta:", response.text)
+            return _falha_http("get_device_status_capacities", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("get_device_status_capacities", camera_ip, e)
 
 def set_parametros_imagem(camera_ip, username, password, xml_file="put_display_settings.xml"):
-    
+
     url = f'http://{camera_ip}/ISAPI/Image/channels'
-    
+
     # Lê o conteúdo do arquivo XML
     with open(xml_file, "rb") as file:
         xml_data = file.read()
@@ -207,34 +358,28 @@ def set_parametros_imagem(camera_ip, username, password, xml_file="put_display_s
 
     try:
         # Envia a requisição PUT com o XML e autenticação Digest
-        response = requests.put(url, data=xml_data, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
-        
+        response = sessao.put(url, data=xml_data, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
+
         # Verifica se a requisição foi bem-sucedida
         if response.status_code == 200:
             # Parse da resposta para verificar o status de retorno
             response_xml = response.content.decode("utf-8")
-            if "<statusCode>0</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml:
-                print("Parâmetros de imagem configurados com sucesso.")
-                return 0
+            if _response_status_ok(response_xml, status_code="0"):
+                evento("configuracao_aplicada", mensagem="Parâmetros de imagem configurados com sucesso.",
+                       operacao="set_parametros_imagem", camera_ip=camera_ip)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar os parâmetros de imagem: resposta inesperada.")
-                print("Conteúdo da resposta:", response_xml)
-                return -1
+                return _resposta_inesperada("set_parametros_imagem", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar parâmetros de imagem. Código de status HTTP: {response.status_code}")
-            return -1
+            return _falha_http("set_parametros_imagem", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
-        return -1
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return -1
+        return _falha_conexao("set_parametros_imagem", camera_ip, e)
 
 def set_image_adjustment(camera_ip, username, password, channel_id=1):
     color_url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/color'
     sharpness_url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/sharpness'
-    
+
     # XML com brilho, contraste e saturação
     color_xml = '''<?xml version="1.0" encoding="UTF-8"?><Color>
     <brightnessLevel>35</brightnessLevel>
@@ -250,46 +395,73 @@ def set_image_adjustment(camera_ip, username, password, channel_id=1):
     }
 
     try:
-        color_response = requests.put(color_url, data=color_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
-        
+        color_response = sessao.put(color_url, data=color_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
+
         # Verifica se a configuração de cor foi bem-sucedida
         if color_response.status_code == 200:
             color_response_xml = color_response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in color_response_xml and "<statusString>OK</statusString>" in color_response_xml:
-                print("Parâmetros de cor configurados com sucesso.")
-                print("Conteúdo da resposta:", color_response_xml)
+            if _response_status_ok(color_response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetros de cor configurados com sucesso.",
+                       operacao="set_image_adjustment", camera_ip=camera_ip, parametro="color")
             else:
-                print("Falha ao configurar os parâmetros de cor: resposta inesperada.")
-                print("Conteúdo da resposta:", color_response_xml)
-                return -1
+                return _resposta_inesperada("set_image_adjustment", camera_ip, color_response_xml)
         else:
-            print(f"Erro ao configurar parâmetros de cor. Código de status HTTP: {color_response.status_code}")
-            return -1
+            return _falha_http("set_image_adjustment", camera_ip, color_response)
 
         # Envia a requisição PUT para configuração de nitidez
-        sharpness_response = requests.put(sharpness_url, data=sharpness_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        sharpness_response = sessao.put(sharpness_url, data=sharpness_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a configuração de nitidez foi bem-sucedida
         if sharpness_response.status_code == 200:
             sharpness_response_xml = sharpness_response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in sharpness_response_xml and "<statusString>OK</statusString>" in sharpness_response_xml:
-                print("Parâmetros de nitidez configurados com sucesso.")
-                print("Conteúdo da resposta:", sharpness_response_xml)
-                return 0
+            if _response_status_ok(sharpness_response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetros de nitidez configurados com sucesso.",
+                       operacao="set_image_adjustment", camera_ip=camera_ip, parametro="sharpness")
+                return Resultado(True, 200, sharpness_response_xml)
+            else:
+                return _resposta_inesperada("set_image_adjustment", camera_ip, sharpness_response_xml)
+        else:
+            return _falha_http("set_image_adjustment", camera_ip, sharpness_response)
+
+    except requests.exceptions.RequestException as e:
+        return _falha_conexao("set_image_adjustment", camera_ip, e)
+
+def set_color(camera_ip, username, password, channel_id=1, brightness=None, contrast=None, saturation=None):
+    """
+    Ajusta só os níveis de cor informados (os que ficarem None não vão no XML e a câmera mantém o valor atual).
+    Usado pelo canal_comandos para mandar apenas o que o operador mexeu.
+    """
+    url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/color'
+
+    tags = ""
+    if brightness is not None:
+        tags += f"<brightnessLevel>{brightness}</brightnessLevel>"
+    if contrast is not None:
+        tags += f"<contrastLevel>{contrast}</contrastLevel>"
+    if saturation is not None:
+        tags += f"<saturationLevel>{saturation}</saturationLevel>"
+    if not tags:
+        raise ValueError("Informe ao menos um entre brightness, contrast e saturation.")
+
+    color_xml = f'<?xml version="1.0" encoding="UTF-8"?><Color>{tags}</Color>'
+    headers = {'Content-Type': 'application/xml'}
+
+    try:
+        response = sessao.put(url, data=color_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
+
+        if response.status_code == 200:
+            response_xml = response.content.decode("utf-8")
+            if _response_status_ok(response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetros de cor configurados com sucesso.",
+                       operacao="set_color", camera_ip=camera_ip)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar os parâmetros de nitidez: resposta inesperada.")
-                print("Conteúdo da resposta:", sharpness_response_xml)
-                return -1
+                return _resposta_inesperada("set_color", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar parâmetros de nitidez. Código de status HTTP: {sharpness_response.status_code}")
-            return -1
+            return _falha_http("set_color", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
-        return -1
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return -1
+        return _falha_conexao("set_color", camera_ip, e)
 
 def get_exposure_mode(camera_ip, username, password, channel_id=1, parameter_type="exposureMode"):
     # URL para obter o modo de exposição de um canal específico
@@ -297,59 +469,52 @@ def get_exposure_mode(camera_ip, username, password, channel_id=1, parameter_typ
 
     try:
         # Envia a requisição GET para obter o modo de exposição
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
-        # Verifica se a requisição foi bem-sucedida e exibe a resposta
+        # Verifica se a requisição foi bem-sucedida e devolve a resposta XML
         if response.status_code == 200:
-            print("Modo de exposição obtido com sucesso.")
-            print("Resposta XML:")
-            print(response.text)  # Imprime a resposta XML
+            evento("consulta_concluida", mensagem="Modo de exposição obtido com sucesso.",
+                   operacao="get_exposure_mode", camera_ip=camera_ip)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Erro ao obter o modo de exposição. Código de status HTTP: {response.status_code}")
-            print("Conteúdo da resposta:", response.text)
+            return _falha_http("get_exposure_mode", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("get_exposure_mode", camera_ip, e)
 
 def get_shutter_time_levels_from_file(camera_ip, username, password, file_path="get_image_parameters.xml"):
     # Verifica se o arquivo XML existe na raiz do projeto
+    # Resultado.conteudo é a lista de níveis de obturador (vazia em caso de falha)
     if not os.path.exists(file_path):
-        print(f"Arquivo '{file_path}' não encontrado. Obtendo da câmera...")
+        evento("arquivo_ausente", mensagem="Arquivo '{arquivo}' não encontrado. Obtendo da câmera...", camera_ip=camera_ip, arquivo=file_path)
         get_parametros_imagem(camera_ip, username, password, output_file=file_path)
 
+    from modelo_imagem import ler_arquivo
+
     try:
-        # Carrega e parseia o arquivo XML
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        # Busca pelo elemento ShutterLevel e obtém o atributo 'opt' com as opções
-        shutter_level = root.find(".//{http://www.hikvision.com/ver20/XMLSchema}ShutterLevel")
-        
-        if shutter_level is not None:
-            shutter_options = shutter_level.get("opt")
-            if shutter_options:
-                shutter_levels = shutter_options.split(",")
-                return shutter_levels
+        # Pega as opções do ShutterLevel pelo modelo (só a seção Shutter é decodificada); o arquivo
+        # só é lido de novo quando muda. Como o antigo find(".//ShutterLevel"), vale o primeiro
+        # canal que tiver ShutterLevel
+        shutter = next((canal.shutter for canal in ler_arquivo(file_path)
+                        if canal.shutter is not None and canal.shutter.shutter_level is not None), None)
+        if shutter is not None:
+            if shutter.opcoes:
+                return Resultado(True, conteudo=shutter.opcoes)
             else:
-                print("Nenhuma opção de ShutterLevel encontrada.")
-                return []
+                erro = "Nenhuma opção de ShutterLevel encontrada."
         else:
-            print("Elemento ShutterLevel não encontrado no XML.")
-            return []
+            erro = "Elemento ShutterLevel não encontrado no XML."
 
-    except ET.ParseError:
-        print("Erro ao parsear o XML.")
-        return []
     except FileNotFoundError:
-        print("Arquivo de parâmetros de imagem não encontrado.")
-        return []
+        erro = "Arquivo de parâmetros de imagem não encontrado."
+
+    evento("shutter_indisponivel", logging.WARNING, "{erro}", camera_ip=camera_ip, arquivo=file_path, erro=erro)
+    return Resultado(False, conteudo=[], erro=erro)
 
 def set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40):
     # Define a URL do endpoint para configurar o nível de ganho
     url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/gain'
-    
+
     # XML para configuração do nível de ganho
     gain_xml = f'''<?xml version="1.0" encoding="UTF-8"?><Gain xmlns="http://www.hikvision.com/ver20/XMLSchema" version="2.0">
     <GainLevel>{gain_level}</GainLevel></Gain>'''
@@ -361,35 +526,29 @@ def set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40):
 
     try:
         # Envia a requisição PUT para configurar o nível de ganho
-        response = requests.put(url, data=gain_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=gain_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a configuração de ganho foi bem-sucedida
         if response.status_code == 200:
             response_xml = response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml:
-                print("Parâmetro de ganho configurado com sucesso.")
-                return "SUCCESS"
+            if _response_status_ok(response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetro de ganho configurado com sucesso.",
+                       operacao="set_gain_level", camera_ip=camera_ip, valor=gain_level)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar o ganho: resposta inesperada.")
-                print("Conteúdo da resposta:", response_xml)
-                return "ERROR"
+                return _resposta_inesperada("set_gain_level", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar o ganho. Código de status HTTP: {response.status_code}")
-            return "ERROR"
+            return _falha_http("set_gain_level", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
-        return "ERROR"
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return "ERROR"
+        return _falha_conexao("set_gain_level", camera_ip, e)
 
 def set_white_balance(camera_ip, username, password, channel_id=1, white_balance_style="auto1", white_balance_red=None, white_balance_blue=None):
     #o modo manual só funciona para cameras com esse suporte, por exemplo a de 4MP usada
     #a opção tem que ser escrita certinha, por exemplo o daylightLamp tem o L maiusculo, eles não tratam outros casos
     # Define a URL do endpoint para configurar o balanço de branco
     url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/whiteBalance'
-    
+
     # Monta o XML para configuração do balanço de branco
     # Inclui WhiteBalanceRed e WhiteBalanceBlue somente se o estilo for "manual"
     if white_balance_style == "manual" and white_balance_red is not None and white_balance_blue is not None:
@@ -408,34 +567,28 @@ def set_white_balance(camera_ip, username, password, channel_id=1, white_balance
 
     try:
         # Envia a requisição PUT para configurar o balanço de branco
-        response = requests.put(url, data=white_balance_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=white_balance_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a configuração de balanço de branco foi bem-sucedida
         if response.status_code == 200:
             response_xml = response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml:
-                print("Parâmetro de balanço de branco configurado com sucesso.")
-                return "SUCCESS"
+            if _response_status_ok(response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetro de balanço de branco configurado com sucesso.",
+                       operacao="set_white_balance", camera_ip=camera_ip, valor=white_balance_style)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar o balanço de branco: resposta inesperada.")
-                print("Conteúdo da resposta:", response_xml)
-                return "ERROR"
+                return _resposta_inesperada("set_white_balance", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar o balanço de branco. Código de status HTTP: {response.status_code}")
-            return "ERROR"
+            return _falha_http("set_white_balance", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
-        return "ERROR"
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return "ERROR"
+        return _falha_conexao("set_white_balance", camera_ip, e)
 
 def set_shutter(camera_ip, username, password, channel_id=1, shutter_level="1/1"):
     #Se é colocado algum valor de shutter fora da lista de opções temos err 400 sempre pegar a lista de valores possíveis antes
     # URL para configurar o obturador do canal especificado
     url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/shutter'
-    
+
     # XML para configuração do nível de obturador
     shutter_xml = f'''<?xml version="1.0" encoding="UTF-8"?><Shutter xmlns="http://www.isapi.org/ver20/XMLSchema" version="2.0">
     <ShutterLevel>{shutter_level}</ShutterLevel></Shutter>'''
@@ -447,28 +600,22 @@ def set_shutter(camera_ip, username, password, channel_id=1, shutter_level="1/1"
 
     try:
         # Envia a requisição PUT para configuração do obturador
-        response = requests.put(url, data=shutter_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=shutter_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a configuração de obturador foi bem-sucedida
         if response.status_code == 200:
             response_xml = response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml:
-                print("Parâmetro de obturador configurado com sucesso.")
-                return 0
+            if _response_status_ok(response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetro de obturador configurado com sucesso.",
+                       operacao="set_shutter", camera_ip=camera_ip, valor=shutter_level)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar o obturador: resposta inesperada.")
-                print("Conteúdo da resposta:", response_xml)
-                return -1
+                return _resposta_inesperada("set_shutter", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar o obturador. Código de status HTTP: {response.status_code}")
-            return -1
+            return _falha_http("set_shutter", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
-        return -1
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return -1
+        return _falha_conexao("set_shutter", camera_ip, e)
 
 def set_ircut(camera_ip, username, password, channel_id=1, ircut_filter_type="day"):
     # URL para configurar o IrcutFilter do canal especificado
@@ -485,28 +632,22 @@ def set_ircut(camera_ip, username, password, channel_id=1, ircut_filter_type="da
 
     try:
         # Envia a requisição PUT para configuração do IrcutFilter
-        response = requests.put(url, data=ircut_xml, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=ircut_xml, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         # Verifica se a configuração foi bem-sucedida
         if response.status_code == 200:
             response_xml = response.content.decode("utf-8")
-            if "<statusCode>1</statusCode>" in response_xml and "<statusString>OK</statusString>" in response_xml:
-                print("Parâmetro IR-cut configurado com sucesso.")
-                return 0
+            if _response_status_ok(response_xml):
+                evento("configuracao_aplicada", mensagem="Parâmetro IR-cut configurado com sucesso.",
+                       operacao="set_ircut", camera_ip=camera_ip, valor=ircut_filter_type)
+                return Resultado(True, 200, response_xml)
             else:
-                print("Falha ao configurar IR-cut: resposta inesperada.")
-                print("Conteúdo da resposta:", response_xml)
-                return -1
+                return _resposta_inesperada("set_ircut", camera_ip, response_xml)
         else:
-            print(f"Erro ao configurar IR-cut. Código de status HTTP: {response.status_code}")
-            return -1
+            return _falha_http("set_ircut", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar cosnectar à câmera {camera_ip}.")
-        return -1
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-        return -1
+        return _falha_conexao("set_ircut", camera_ip, e)
 
 def get_image_capabilities(camera_ip, username, password, output_file="get_image_capabilities.xml", ca_cert_path="/etc/ssl/certs/hikvision_2048_cert.pem"):
     url = f'https://{camera_ip}/ISAPI/Image/channels/1/capabilities'  # Note o https
@@ -515,20 +656,17 @@ def get_image_capabilities(camera_ip, username, password, output_file="get_image
     verify_ssl = ca_cert_path if ca_cert_path else True
 
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(username, password), timeout=5, verify=false)
+        response = sessao.get(url, auth=_auth_digest(camera_ip, username, password), timeout=5, verify=False)
 
         if response.status_code == 200:
             salvar_xml_conteudo(response.content, output_file)
-            print(f"Capabilities salvas em {output_file}")
+            evento("consulta_concluida", mensagem="Capabilities salvas em {arquivo}",
+                   operacao="get_image_capabilities", camera_ip=camera_ip, arquivo=output_file)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao obter capabilities. Status: {response.status_code}")
-            print(response.text)
-    except requests.exceptions.SSLError as ssl_err:
-        print(f"Erro de SSL: {ssl_err}")
-    except requests.exceptions.Timeout:
-        print(f"Timeout ao conectar com {camera_ip}")
+            return _falha_http("get_image_capabilities", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão: {e}")
+        return _falha_conexao("get_image_capabilities", camera_ip, e)
 
 def set_distorcao_lente(camera_ip, username, password, enabled=True):
     """
@@ -544,20 +682,17 @@ def set_distorcao_lente(camera_ip, username, password, enabled=True):
     """.strip()
 
     try:
-        response = requests.put(url, data=payload, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=payload, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         if response.status_code == 200:
-            print(f"Distorção de lente {'habilitada' if enabled else 'desabilitada'} com sucesso!")
-            return 0
+            evento("configuracao_aplicada", mensagem="Distorção de lente {estado} com sucesso!",
+                   operacao="set_distorcao_lente", camera_ip=camera_ip, estado="habilitada" if enabled else "desabilitada")
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao ajustar distorção de lente. Código de status: {response.status_code}")
-            print(f"Resposta: {response.text}")
+            return _falha_http("set_distorcao_lente", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
-    return -1
+        return _falha_conexao("set_distorcao_lente", camera_ip, e)
 
 def set_eis(camera_ip, username, password, enabled=True):
     """
@@ -573,20 +708,19 @@ def set_eis(camera_ip, username, password, enabled=True):
     """.strip()
 
     try:
-        response = requests.put(url, data=payload, headers=headers, auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=payload, headers=headers, auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         if response.status_code == 200:
-            print(f"EIS {'ativado' if enabled else 'desativado'} com sucesso!")
+            evento("configuracao_aplicada", mensagem="EIS {estado} com sucesso!",
+                   operacao="set_eis", camera_ip=camera_ip, estado="ativado" if enabled else "desativado")
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao configurar EIS. Código de status: {response.status_code}")
-            print("Resposta:", response.text)
+            return _falha_http("set_eis", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("set_eis", camera_ip, e)
 
-def set_exposure_by_modes(camera_ip, username, password, modo, iris_level=None):
+def set_exposure_by_modes(camera_ip, username, password, modo, iris_level=None, channel_id=1):
     """
     Ajusta a exposição da câmera Hikvision via ISAPI, com 3 modos definidos:
     - "manual"
@@ -594,7 +728,7 @@ def set_exposure_by_modes(camera_ip, username, password, modo, iris_level=None):
     - "p-iris-manual" (com iris_level opcional, padrão 40)
     """
 
-    url = f'http://{camera_ip}/ISAPI/Image/channels/1/exposure'
+    url = f'http://{camera_ip}/ISAPI/Image/channels/{channel_id}/exposure'
     headers = {'Content-Type': 'application/xml'}
 
     # Valida o modo
@@ -631,21 +765,18 @@ def set_exposure_by_modes(camera_ip, username, password, modo, iris_level=None):
     payload = ET.tostring(exposure, encoding='unicode')
 
     try:
-        response = requests.put(url, data=payload, headers=headers,
-            auth=HTTPDigestAuth(username, password), timeout=5)
+        response = sessao.put(url, data=payload, headers=headers,
+            auth=_auth_digest(camera_ip, username, password), timeout=5)
 
         if response.status_code == 200:
-            print(f"Exposição ajustada com sucesso para o modo '{modo}'.")
-            if modo == "p-iris-manual":
-                print(f"Iris Level ajustado para {iris_level}")
+            evento("configuracao_aplicada", mensagem="Exposição ajustada com sucesso para o modo '{modo}'.",
+                   operacao="set_exposure_by_modes", camera_ip=camera_ip, modo=modo, iris_level=iris_level)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao ajustar exposição. Código de status: {response.status_code}")
-            print(response.text)
+            return _falha_http("set_exposure_by_modes", camera_ip, response)
 
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão: {e}")
+        return _falha_conexao("set_exposure_by_modes", camera_ip, e)
 
 def get_color_config(camera_ip, username, password, https=False, cert_path="/etc/ssl/mobit.crt"):
     """
@@ -656,78 +787,76 @@ def get_color_config(camera_ip, username, password, https=False, cert_path="/etc
         password (str): Senha.
         https (bool): Se True, usa HTTPS com verificação SSL; caso contrário, usa HTTP.
         cert_path (str): Caminho para o certificado SSL confiável (usado apenas se https=True).
-    
+
     Return:
-        str: Resposta XML das configurações de cor, ou None em caso de falha.
+        Resultado: conteudo com a resposta XML das configurações de cor.
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Image/channels/1/color"
     headers = {'Content-Type': 'application/xml'}
 
     try:
-        response = requests.get(
+        response = sessao.get(
             url,
             headers=headers,
-            auth=HTTPDigestAuth(username, password),
+            auth=_auth_digest(camera_ip, username, password),
             verify=cert_path if https else False,
             timeout=5
         )
 
         if response.status_code == 200:
-            print("Configurações de cor obtidas com sucesso!")
-            print(response.text)
-            return response.text
+            evento("consulta_concluida", mensagem="Configurações de cor obtidas com sucesso!",
+                   operacao="get_color_config", camera_ip=camera_ip)
+            return Resultado(True, 200, response.text)
         else:
-            print(f"Falha ao obter configurações de cor. Código de status: {response.status_code}")
-            print(response.text)
+            return _falha_http("get_color_config", camera_ip, response)
 
-    except requests.exceptions.SSLError as ssl_err:
-        print(f"Erro de verificação SSL: {ssl_err}")
-    except requests.exceptions.Timeout:
-        print(f"Erro: Tempo limite excedido ao tentar conectar à câmera {camera_ip}.")
     except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com a câmera {camera_ip}: {e}")
+        return _falha_conexao("get_color_config", camera_ip, e)
 
 ##################### security function #########################
 
+def _json_ou_texto(response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
 def get_security_capabilities(camera_ip, username, password, https=True, cert_path=None):
     """
-    Requisição GET para /ISAPI/Security/capabilities de câmeras Hikvision. Printa os "isSupportX"
+    Requisição GET para /ISAPI/Security/capabilities de câmeras Hikvision. Traz os "isSupportX"
     Args:
         https (bool): Se True, usa HTTPS. Se False, usa HTTP.
         cert_path (str, optional): Caminho para o certificado (apenas se HTTPS for usado).
     Returns:
-        dict | str: Resposta em JSON (se possível)
+        Resultado: conteudo com a resposta em JSON (se possível) ou texto
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Security/capabilities"
 
     try:
         if https and cert_path:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=5
             )
         else:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=5
             )
-        
-        response.raise_for_status()
 
-        try:
-            return response.json()
-        except ValueError:
-            return response.text
+        response.raise_for_status()
+        return Resultado(True, response.status_code, _json_ou_texto(response))
 
+    except requests.exceptions.HTTPError:
+        return _falha_http("get_security_capabilities", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar {url}: {e}")
-        return None
+        return _falha_conexao("get_security_capabilities", camera_ip, e)
 
 def get_certificate_select_capabilities(camera_ip, username, password, https=True, cert_path=None):
     """
@@ -740,37 +869,34 @@ def get_certificate_select_capabilities(camera_ip, username, password, https=Tru
         https (bool): Se True, usa HTTPS. Se False, usa HTTP.
         cert_path (str, optional): Caminho do certificado (usado se HTTPS for True).
     Returns:
-        dict | str: Resposta JSON (se possível)
+        Resultado: conteudo com a resposta JSON (se possível)
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Security/certificate/select/capabilities?format=json"
 
     try:
         if https and cert_path:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=5
             )
         else:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=5
             )
 
         response.raise_for_status()
+        return Resultado(True, response.status_code, _json_ou_texto(response))
 
-        try:
-            return response.json()
-        except ValueError:
-            return response.text
-
+    except requests.exceptions.HTTPError:
+        return _falha_http("get_certificate_select_capabilities", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar {url}: {e}")
-        return None
+        return _falha_conexao("get_certificate_select_capabilities", camera_ip, e)
 
 def get_device_certificate_capabilities(camera_ip, username, password, https=True, cert_path=None):
     """
@@ -780,7 +906,7 @@ def get_device_certificate_capabilities(camera_ip, username, password, https=Tru
         https: Se True, usa HTTPS. Se False, usa HTTP.
         cert_path: Caminho do certificado (usado se HTTPS for True).
     Returns:
-        dict | str: Resposta JSON (se possível) ou texto puro.
+        Resultado: conteudo com a resposta JSON (se possível) ou texto puro.
     Exemple:
         {'CertificateRevocationCap': {'customID': {'@min': 1, '@max': 64}, 'status': {'@opt': ['normal', 'expired', 'exceptional']}}},)
     """
@@ -789,30 +915,27 @@ def get_device_certificate_capabilities(camera_ip, username, password, https=Tru
 
     try:
         if https and cert_path:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=5
             )
         else:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=5
             )
 
         response.raise_for_status()
+        return Resultado(True, response.status_code, _json_ou_texto(response))
 
-        try:
-            return response.json()
-        except ValueError:
-            return response.text
-
+    except requests.exceptions.HTTPError:
+        return _falha_http("get_device_certificate_capabilities", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar {url}: {e}")
-        return None
+        return _falha_conexao("get_device_certificate_capabilities", camera_ip, e)
 
 def get_certificate_revocation_config(camera_ip, username, password, https=True, cert_path=None):
     """
@@ -822,37 +945,34 @@ def get_certificate_revocation_config(camera_ip, username, password, https=True,
         https: Se True, usa HTTPS. Se False, usa HTTP.
         cert_path: Caminho do certificado confiável (usado se HTTPS for True).
     Returns:
-        dict | str: Resposta JSON (se possível) ou texto puro.
+        Resultado: conteudo com a resposta JSON (se possível) ou texto puro.
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Security/deviceCertificate/certificateRevocation?format=json"
 
     try:
         if https and cert_path:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=10
             )
         else:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=10
             )
 
         response.raise_for_status()
+        return Resultado(True, response.status_code, _json_ou_texto(response))
 
-        try:
-            return response.json()
-        except ValueError:
-            return response.text
-
+    except requests.exceptions.HTTPError:
+        return _falha_http("get_certificate_revocation_config", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar {url}: {e}")
-        return None
+        return _falha_conexao("get_certificate_revocation_config", camera_ip, e)
 
 def get_server_certificates(camera_ip, username, password, https=False, cert_path=None):
     """
@@ -862,7 +982,7 @@ def get_server_certificates(camera_ip, username, password, https=False, cert_pat
         https: Se True, usa HTTPS. Se False, usa HTTP.
         cert_path: Caminho do certificado confiável (usado se HTTPS for True).
     Returns:
-        dict | str: Resposta JSON ou texto.
+        Resultado: conteudo com a resposta JSON ou texto.
     Exemple:
         'CertificateInfo': [
         {
@@ -880,30 +1000,27 @@ def get_server_certificates(camera_ip, username, password, https=False, cert_pat
 
     try:
         if https and cert_path:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=10
             )
         else:
-            response = requests.get(
+            response = sessao.get(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=10
             )
 
         response.raise_for_status()
+        return Resultado(True, response.status_code, _json_ou_texto(response))
 
-        try:
-            return response.json()
-        except ValueError:
-            return response.text
-
+    except requests.exceptions.HTTPError:
+        return _falha_http("get_server_certificates", camera_ip, response)
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao acessar {url}: {e}")
-        return None
+        return _falha_conexao("get_server_certificates", camera_ip, e)
 
 def delete_server_certificate(camera_ip, username, password, custom_id, https=False, cert_path=None):
     """
@@ -918,33 +1035,35 @@ def delete_server_certificate(camera_ip, username, password, custom_id, https=Fa
         cert_path (str, optional): Caminho para o certificado confiável (opcional se HTTPS).
 
     Returns:
-        bool: True se a exclusão foi bem-sucedida, False caso contrário.
+        Resultado: ok=True se a exclusão foi bem-sucedida.
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Security/serverCertificate/certificates/{custom_id}?format=json"
 
     try:
         if https and cert_path:
-            response = requests.delete(
+            response = sessao.delete(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=cert_path,
                 timeout=10
             )
         else:
-            response = requests.delete(
+            response = sessao.delete(
                 url,
-                auth=HTTPDigestAuth(username, password),
+                auth=_auth_digest(camera_ip, username, password),
                 verify=https,
                 timeout=10
             )
 
-        print(f"Status code: {response.status_code}")
-        return response.status_code == 200
+        if response.status_code == 200:
+            evento("certificado_removido", mensagem="Certificado {custom_id} removido de {camera_ip}",
+                   camera_ip=camera_ip, custom_id=custom_id)
+            return Resultado(True, 200, response.text)
+        return _falha_http("delete_server_certificate", camera_ip, response)
 
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao deletar certificado: {e}")
-        return False
+        return _falha_conexao("delete_server_certificate", camera_ip, e)
 
 def upload_server_certificate_with_iv(camera_ip, username, password, cert_file_path, custom_id, iv, https=False, cert_path=None):
     """
@@ -960,7 +1079,7 @@ def upload_server_certificate_with_iv(camera_ip, username, password, cert_file_p
         https (bool): Se True, usa HTTPS.
         cert_path (str, optional): Caminho para o certificado confiável (em modo HTTPS).
     Returns:
-        bool: True se o upload foi bem-sucedido, False caso contrário.
+        Resultado: ok=True se o upload foi bem-sucedido.
     """
     protocol = "https" if https else "http"
     url = (
@@ -976,22 +1095,26 @@ def upload_server_certificate_with_iv(camera_ip, username, password, cert_file_p
         with open(cert_file_path, 'rb') as file:
             cert_data = file.read()
 
-        response = requests.post(
+        response = sessao.post(
             url,
             data=cert_data,
             headers=headers,
-            auth=HTTPDigestAuth(username, password),
+            auth=_auth_digest(camera_ip, username, password),
             verify=cert_path if https and cert_path else https,
             timeout=15
         )
 
-        print(f"Status code: {response.status_code}")
-        print(f"Resposta: {response.text}")
-        return response.status_code == 200
+        if response.status_code == 200:
+            evento("certificado_enviado", mensagem="Certificado {custom_id} enviado para {camera_ip}",
+                   camera_ip=camera_ip, custom_id=custom_id)
+            return Resultado(True, 200, response.text)
+        return _falha_http("upload_server_certificate_with_iv", camera_ip, response)
 
+    except requests.exceptions.RequestException as e:
+        return _falha_conexao("upload_server_certificate_with_iv", camera_ip, e)
     except Exception as e:
-        print(f"Erro ao enviar certificado: {e}")
-        return False
+        evento("certificado_falhou", logging.ERROR, "Erro ao enviar certificado para {camera_ip}: {erro}", camera_ip=camera_ip, erro=str(e))
+        return Resultado(False, erro=str(e))
 
 def upload_pfx_certificate_pkcs12(camera_ip, username, password, cert_file_path, custom_id, pfx_password, https=False, cert_path=None):
     """
@@ -1005,16 +1128,11 @@ def upload_pfx_certificate_pkcs12(camera_ip, username, password, cert_file_path,
         cert_path: Caminho para CA confiável (se https for True).
 
     Returns:
-        True se sucesso, False caso contrário.
+        Resultado: ok=True se sucesso.
     """
     protocol = "https" if https else "http"
     url = f"{protocol}://{camera_ip}/ISAPI/Security/serverCertificate/certificate?customID={custom_id}"
 
-    # Codifica a senha do .pfx em base64
-    encoded_password = base64.b64encode(pfx_password.encode('utf-8')).decode('utf-8')
-
-    print(f"\nencoded_password: {encoded_password}\n")
-
     # Monta o cabeçalho XML que deve vir antes do conteúdo binário
     xml_header = f"""<?xml version="1.0" encoding="UTF-8"?>
     <CertificateReq version="1.0" xmlns="http://www.isapi.org/ver20/XMLSchema">
@@ -1036,69 +1154,77 @@ def upload_pfx_certificate_pkcs12(camera_ip, username, password, cert_file_path,
             "Content-Type": "application/xml"
         }
 
-        response = requests.post(
+        response = sessao.post(
             url,
             data=full_payload,
             headers=headers,
-            auth=HTTPDigestAuth(username, password),
+            auth=_auth_digest(camera_ip, username, password),
             verify=cert_path if https and cert_path else https,
             timeout=20
         )
 
-        print(f"Status code: {response.status_code}")
-        print(f"Resposta: {response.text}")
-        return response.status_code == 200
+        if response.status_code == 200:
+            evento("certificado_enviado", mensagem="Certificado {custom_id} enviado para {camera_ip}",
+                   camera_ip=camera_ip, custom_id=custom_id)
+            return Resultado(True, 200, response.text)
+        return _falha_http("upload_pfx_certificate_pkcs12", camera_ip, response)
 
+    except requests.exceptions.RequestException as e:
+        return _falha_conexao("upload_pfx_certificate_pkcs12", camera_ip, e)
     except Exception as e:
-        print(f"Erro ao enviar certificado: {e}")
-        return False
-
-camera_ip   = "" 
-username    = ""
-password    = ""
-
-#shutter_levels = get_shutter_time_levels_from_file(camera_ip, username, password)
-#if shutter_levels:
-    #print("Lista de níveis de obturador disponíveis:", shutter_levels)
-
-#get_exposure_mode(camera_ip, username, password, channel_id=1, parameter_type="exposureMode")
-#get_shutter_options(camera_ip, username, password, channel_id=1)
-#set_shutter(camera_ip, username, password, shutter_level="1/120")
-#set_ircut(camera_ip, username, password, ircut_filter_type="day");
-#set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40)
-#get_parametros_imagem(camera_ip, username, password)
-#set_white_balance(camera_ip, username, password, channel_id=1, white_balance_style="daylightLamp") 
-#set_white_balance(camera_ip, username, password, channel_id=1, white_balance_style="manual", white_balance_red=60, white_balance_blue=70)
-#get_device_status_capacities(camera_ip, username, password, "7a26_get_device_status_capacities")
-#get_parametros_imagem(camera_ip, username, password, "7a26_get_parametros_imagem")
-#get_system_capacities(camera_ip, username, password, "7a26_get_system_capacities") #é os isSuported
-#get_image_capabilities(camera_ip, username, password, "1027_get_image_capacities") 
-#set_distorcao_lente(camera_ip, username, password, enabled=False) #OK
-#set_eis(camera_ip, username, password, enabled=True)
-#set_exposure_by_modes(camera_ip, username, password, modo="manual") #modo manual
-#set_exposure_by_modes(camera_ip, username, pa#OKssword, modo="p-iris-auto") #p-iris-auto
-#set_exposure_by_modes(camera_ip, username, password, modo="p-iris-manual", iris_level=20) #p-iris-manual
-#get_image_capabilities(camera_ip, username, password, "1027_get_image_capacities") 
-#status = get_color_config(camera_ip, username, password, https=True, cert_path="/etc/ssl/hikvision_with_san.pem") #OK teste com certificado
-
-########## NEW SECURITY FUNCTIONS OK #################
-
-#get_security_capabilities(camera_ip, username, password, https=False)              #OK
-#get_certificate_select_capabilities(camera_ip, username, password, https=False)    #OK ruim sem muita informacao
-#get_server_certificates(camera_ip, username, password, https=False)                #OK As infors do propriedades do certificado
-#delete_server_certificate(camera_ip, username, password, custom_id="cul", https=False) #OK apaga com o CustomID que dá pra ver pelo get_server_certificates
-#get_device_certificate_capabilities(camera_ip, username, password, https=False, cert_path=None) #OK Pega só os campos que existem como status id os opt
-########## THIS DONT WORK (yet) ###############
-
-status = upload_pfx_certificate_pkcs12(
-    camera_ip,
-    username,
-    password,
-    cert_file_path="",
-    custom_id="",
-    pfx_password="",  # senha usada na geração do .pfx
-    https=True,
-    cert_path=""
-)
-print (status)
-
+        evento("certificado_falhou", logging.ERROR, "Erro ao enviar certificado para {camera_ip}: {erro}", camera_ip=camera_ip, erro=str(e))
+        return Resultado(False, erro=str(e))
+
+if __name__ == "__main__":
+    import eventos
+    eventos.configurar(nivel=logging.INFO, formato="texto")
+
+    camera_ip   = ""
+    username    = ""
+    password    = ""
+
+    #shutter_levels = get_shutter_time_levels_from_file(camera_ip, username, password)
+    #if shutter_levels:
+        #print("Lista de níveis de obturador disponíveis:", shutter_levels.conteudo)
+
+    #get_exposure_mode(camera_ip, username, password, channel_id=1, parameter_type="exposureMode")
+    #get_shutter_options(camera_ip, username, password, channel_id=1)
+    #set_shutter(camera_ip, username, password, shutter_level="1/120")
+    #set_ircut(camera_ip, username, password, ircut_filter_type="day");
+    #set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40)
+    #get_parametros_imagem(camera_ip, username, password)
+    #set_white_balance(camera_ip, username, password, channel_id=1, white_balance_style="daylightLamp")
+    #set_white_balance(camera_ip, username, password, channel_id=1, white_balance_style="manual", white_balance_red=60, white_balance_blue=70)
+    #get_device_status_capacities(camera_ip, username, password, "7a26_get_device_status_capacities")
+    #get_parametros_imagem(camera_ip, username, password, "7a26_get_parametros_imagem")
+    #get_system_capacities(camera_ip, username, password, "7a26_get_system_capacities") #é os isSuported
+    #get_image_capabilities(camera_ip, username, password, "1027_get_image_capacities")
+    #set_distorcao_lente(camera_ip, username, password, enabled=False) #OK
+    #set_eis(camera_ip, username, password, enabled=True)
+    #set_exposure_by_modes(camera_ip, username, password, modo="manual") #modo manual
+    #set_exposure_by_modes(camera_ip, username, pa#OKssword, modo="p-iris-auto") #p-iris-auto
+    #set_exposure_by_modes(camera_ip, username, password, modo="p-iris-manual", iris_level=20) #p-iris-manual
+    #get_image_capabilities(camera_ip, username, password, "1027_get_image_capacities")
+    #status = get_color_config(camera_ip, username, password, https=True, cert_path="/etc/ssl/hikvision_with_san.pem") #OK teste com certificado
+
+    ########## NEW SECURITY FUNCTIONS OK #################
+
+    #get_security_capabilities(camera_ip, username, password, https=False)              #OK
+    #get_certificate_select_capabilities(camera_ip, username, password, https=False)    #OK ruim sem muita informacao
+    #get_server_certificates(camera_ip, username, password, https=False)                #OK As infors do propriedades do certificado
+    #delete_server_certificate(camera_ip, username, password, custom_id="cul", https=False) #OK apaga com o CustomID que dá pra ver pelo get_server_certificates
+    #get_device_certificate_capabilities(camera_ip, username, password, https=False, cert_path=None) #OK Pega só os campos que existem como status id os opt
+    ########## THIS DONT WORK (yet) ###############
+
+    status = upload_pfx_certificate_pkcs12(
+        camera_ip,
+        username,
+        password,
+        cert_file_path="",
+        custom_id="",
+        pfx_password="",  # senha usada na geração do .pfx
+        https=True,
+        cert_path=""
+    )
+    print (status)
+    eventos.parar()
@@ -0,0 +1,222 @@
+"""
+Snapshots na menor resolução que atende ao tamanho pedido, para mosaicos e analíticos que
+reduzem a imagem de qualquer forma. O link com os sites remotos é o gargalo: um JPEG 640x360
+tem uma fração dos bytes de um 2688x1520.
+
+Para cada câmera:
+1. as resoluções do canal principal vêm do /ISAPI/Streaming/channels/101/capabilities (opções de
+   videoResolutionWidth/Height, guardadas em cache) e a menor que cobre largura x altura é pedida
+   no .../picture com videoResolutionWidth, videoResolutionHeight e snapShotImageType;
+2. se o firmware recusar os parâmetros (400/403 de parâmetro inválido ou não suportado) ou
+   ignorá-los (o JPEG volta maior, o que se vê no cabeçalho SOF sem decodificar a imagem), a câmera
+   passa a usar o sub-stream (102) quando a resolução atual dele cobre o tamanho pedido; senão, o
+   canal principal sem parâmetros. 401, 5xx e timeouts não dizem nada sobre os parâmetros.
+
+Cada captura informa os bytes economizados em relação à captura em resolução cheia: medidos, se
+já houve uma captura cheia dessa câmera, ou estimados pela proporção de pixels.
+
+Uso:
+    python snapshot.py 10.0.0.5 admin senha --largura 640 --altura 360 --saida mosaico.jpg
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+
+import requests_isapi
+from eventos import evento
+from requests_isapi import Resultado
+
+_LARGURA = re.compile(rb'<videoResolutionWidth\b([^>]*)>\s*(\d+)\s*</videoResolutionWidth>')
+_ALTURA = re.compile(rb'<videoResolutionHeight\b([^>]*)>\s*(\d+)\s*</videoResolutionHeight>')
+_OPT = re.compile(rb'\bopt="([^"]*)"')
+
+# Respostas de parâmetro inválido/não suportado no ResponseStatus (subStatusCode e statusString)
+_RECUSA_PARAMETROS = ("badparameters", "invalidparameter", "invalid content", "notsupport", "invalid operation")
+
+# Marcadores SOF com as dimensões do quadro (C4, C8 e CC são outros segmentos)
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def dimensoes_jpeg(dados):
+    """(largura, altura) lidas do cabeçalho SOF do JPEG, ou None se não encontrar."""
+    i = 2
+    while i + 9 < len(dados):
+        if dados[i] != 0xFF:
+            return None
+        marcador = dados[i + 1]
+        if marcador == 0xFF:
+            i += 1
+            continue
+        tamanho = int.from_bytes(dados[i + 2:i + 4], "big")
+        if marcador in _SOF:
+            return int.from_bytes(dados[i + 7:i + 9], "big"), int.from_bytes(dados[i + 5:i + 7], "big")
+        i += 2 + tamanho
+    return None
+
+
+def ler_resolucoes(xml):
+    """(opções [(largura, altura)], atual (largura, altura)) do XML de um StreamingChannel."""
+    largura, altura = _LARGURA.search(xml), _ALTURA.search(xml)
+    if not largura or not altura:
+        return [], None
+    atual = (int(largura.group(2)), int(altura.group(2)))
+    opt_largura, opt_altura = _OPT.search(largura.group(1)), _OPT.search(altura.group(1))
+    if opt_largura and opt_altura:
+        # As listas de opções vêm pareadas pela posição
+        opcoes = list(zip(map(int, opt_largura.group(1).split(b",")), map(int, opt_altura.group(1).split(b","))))
+    else:
+        opcoes = [atual]
+    return opcoes, atual
+
+
+def _pixels(resolucao):
+    return resolucao[0] * resolucao[1]
+
+
+def _recusou_parametros(resultado):
+    """A câmera respondeu que não aceita os parâmetros de resolução (e não uma falha passageira)."""
+    if resultado.status_code not in (400, 403):
+        return False
+    corpo = (resultado.conteudo or "").lower()
+    return any(marcador in corpo for marcador in _RECUSA_PARAMETROS)
+
+
+def escolher_resolucao(opcoes, largura, altura):
+    """Menor opção com pelo menos largura x altura; a maior, se nenhuma cobrir."""
+    if not opcoes:
+        return None
+    cobrem = [r for r in opcoes if r[0] >= largura and r[1] >= altura]
+    return min(cobrem, key=_pixels) if cobrem else max(opcoes, key=_pixels)
+
+
+class Snapshots:
+    """Negociação de resolução por câmera, com cache das capacidades e contagem de bytes."""
+
+    def __init__(self, canal_principal=101, canal_secundario=102, tipo_imagem="JPEG"):
+        self.canal_principal = canal_principal
+        self.canal_secundario = canal_secundario
+        self.tipo_imagem = tipo_imagem
+        self._resolucoes = {}  # (camera_ip, canal) -> (opções, atual)
+        self._referencia = {}  # camera_ip -> bytes da última captura em resolução cheia
+        self._sem_parametros = set()  # câmeras cujo firmware ignora ou recusa a resolução no picture
+
+        self.capturas = 0
+        self.bytes_recebidos = 0
+        self.bytes_economizados = 0
+
+    def resolucoes(self, camera_ip, username, password, canal):
+        chave = (camera_ip, canal)
+        if chave not in self._resolucoes:
+            try:
+                response = requests_isapi.sessao.get(
+                    f"http://{camera_ip}/ISAPI/Streaming/channels/{canal}/capabilities",
+                    auth=requests_isapi._auth_digest(camera_ip, username, password), timeout=5,
+                )
+                ok = response.status_code == 200
+            except requests_isapi.requests.RequestException:
+                ok = False
+            if not ok:
+                # Não guarda a falha: a próxima captura tenta de novo
+                return [], None
+            self._resolucoes[chave] = ler_resolucoes(response.content)
+        return self._resolucoes[chave]
+
+    def _plano(self, camera_ip, username, password, largura, altura):
+        """(canal, resolução pedida ou None, resolução cheia) da próxima captura."""
+        opcoes, atual = self.resolucoes(camera_ip, username, password, self.canal_principal)
+        cheia = max(opcoes, key=_pixels) if opcoes else atual
+        if not largura or not altura or cheia is None:
+            return self.canal_principal, None, cheia
+
+        alvo = escolher_resolucao(opcoes, largura, altura)
+        if camera_ip not in self._sem_parametros:
+            return self.canal_principal, (alvo if alvo != cheia else None), cheia
+
+        _, sub = self.resolucoes(camera_ip, username, password, self.canal_secundario)
+        if sub and sub[0] >= largura and sub[1] >= altura:
+            return self.canal_secundario, None, cheia
+        return self.canal_principal, None, cheia
+
+    def capturar(self, camera_ip, username, password, largura=None, altura=None, output_file=None):
+        """
+        Snapshot na menor resolução que cobre largura x altura. Resultado.conteudo são os bytes do
+        JPEG, ou o caminho gravado se output_file for informado.
+        """
+        canal, pedida, cheia = self._plano(camera_ip, username, password, largura, altura)
+        resultado = requests_isapi.capturar_imagem(camera_ip, username, password, canal,
+                                                   *(pedida or (None, None)), self.tipo_imagem if pedida else None)
+        ignorou = pedida and resultado and _pixels(dimensoes_jpeg(resultado.conteudo) or pedida) > _pixels(pedida)
+        if pedida and (ignorou or _recusou_parametros(resultado)):
+            # Parâmetros recusados ou ignorados: daqui em diante usa o sub-stream (ou a resolução cheia).
+            # Se a imagem veio mesmo assim (maior), ela já está paga e é devolvida
+            self._sem_parametros.add(camera_ip)
+            proximo = self._plano(camera_ip, username, password, largura, altura)[0]
+            evento("snapshot_sem_resolucao", mensagem="{camera_ip} não aceita resolução no snapshot; usando o canal {canal}",
+                   camera_ip=camera_ip, canal=proximo)
+            if not resultado:
+                canal = proximo
+                resultado = requests_isapi.capturar_imagem(camera_ip, username, password, canal)
+        if not resultado:
+            return resultado
+        return self._concluir(camera_ip, canal, resultado.conteudo, cheia, output_file)
+
+    def _concluir(self, camera_ip, canal, dados, cheia, output_file):
+        dimensoes = dimensoes_jpeg(dados)
+        if dimensoes and cheia and _pixels(dimensoes) >= _pixels(cheia):
+            self._referencia[camera_ip] = len(dados)
+        referencia = self._referencia.get(camera_ip)
+        estimada = referencia is None
+        if estimada:
+            # Sem captura cheia ainda: bytes proporcionais aos pixels (aproximação de JPEG)
+            proporcao = _pixels(cheia) / _pixels(dimensoes) if dimensoes and cheia else 1.0
+            referencia = int(len(dados) * proporcao)
+        economizados = max(0, referencia - len(dados))
+
+        self.capturas += 1
+        self.bytes_recebidos += len(dados)
+        self.bytes_economizados += economizados
+        evento("snapshot_capturado", logging.DEBUG,
+               "{camera_ip}: {bytes} bytes em {largura}x{altura} (canal {canal}), {bytes_economizados} bytes economizados",
+               camera_ip=camera_ip, canal=canal, largura=dimensoes[0] if dimensoes else None,
+               altura=dimensoes[1] if dimensoes else None, bytes=len(dados),
+               bytes_referencia=referencia, bytes_economizados=economizados, referencia_estimada=estimada)
+
+        conteudo = dados
+        if output_file:
+            with open(output_file, "wb") as file:
+                file.write(dados)
+            conteudo = output_file
+        return Resultado(True, 200, conteudo)
+
+    def estatisticas(self):
+        total = self.bytes_recebidos + self.bytes_economizados
+        return {
+            "capturas": self.capturas,
+            "bytes_recebidos": self.bytes_recebidos,
+            "bytes_economizados": self.bytes_economizados,
+            "economia": round(self.bytes_economizados / total, 3) if total else 0.0,
+            "cameras_sem_parametros": sorted(self._sem_parametros),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot na menor resolução que atende ao tamanho pedido.")
+    parser.add_argument("camera_ip")
+    parser.add_argument("username")
+    parser.add_argument("password")
+    parser.add_argument("--largura", type=int)
+    parser.add_argument("--altura", type=int)
+    parser.add_argument("--saida", default=None)
+    args = parser.parse_args(argv)
+
+    snapshots = Snapshots()
+    resultado = snapshots.capturar(args.camera_ip, args.username, args.password, args.largura, args.altura,
+                                   output_file=args.saida or f"{args.camera_ip}_imagem.jpg")
+    print(json.dumps({**resultado.como_dict(), **snapshots.estatisticas()}, indent=4, default=str))
+    return 0 if resultado else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Fixtures dos testes: uma câmera offline (as respostas gravadas de benchmarks/) que confere a senha
+do Digest como a câmera de verdade, montada numa sessão nova do requests_isapi.
+"""
+import asyncio
+import contextlib
+import hashlib
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "benchmarks"))
+
+import requests_isapi  # noqa: E402
+from bench_isapi import CAMERA_IP, DESAFIO_DIGEST, PASSWORD, USERNAME, RespostasGravadasAdapter, carregar_rotas  # noqa: E402
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x04ab" + b"j" * 2000 + b"\xff\xd9"
+
+_CAMPO = re.compile(r'(\w+)="?([^",]*)"?')
+
+
+def _md5(texto):
+    return hashlib.md5(texto.encode("utf-8")).hexdigest()
+
+
+class CameraDigest(RespostasGravadasAdapter):
+    """
+    RespostasGravadasAdapter que valida o response do Digest com a senha da câmera (o original
+    aceita qualquer Authorization) e guarda (método, caminho) das requisições que chegaram até ela.
+    Uma rota também pode ser uma função (request) -> (status, content-type, corpo).
+    """
+
+    def __init__(self, rotas, senha=PASSWORD, atraso=0.0):
+        super().__init__(rotas)
+        self.senha = senha
+        self.atraso = atraso
+        self.recebidas = 0
+        self.pedidas = []
+        self.em_voo = 0
+        self.max_em_voo = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.recebidas += 1
+            self.pedidas.append((request.method, urlsplit(request.url).path))
+            self.em_voo += 1
+            self.max_em_voo = max(self.max_em_voo, self.em_voo)
+        if self.atraso:
+            time.sleep(self.atraso)
+        with self._lock:
+            self.em_voo -= 1
+        authorization = request.headers.get("Authorization")
+        if authorization and not self._senha_confere(request.method, authorization):
+            return self._resposta(request, 401, "text/html", b"", {"WWW-Authenticate": DESAFIO_DIGEST})
+        rota = self.rotas.get((request.method, urlsplit(request.url).path))
+        if callable(rota) and authorization:
+            # Rota dinâmica: função (request) -> (status, content-type, corpo)
+            return self._resposta(request, *rota(request))
+        return super().send(request, **kwargs)
+
+    def _senha_confere(self, metodo, authorization):
+        campos = dict(_CAMPO.findall(authorization))
+        ha1 = _md5(f"{campos['username']}:{campos['realm']}:{self.senha}")
+        ha2 = _md5(f"{metodo}:{campos['uri']}")
+        esperado = _md5(f"{ha1}:{campos['nonce']}:{campos['nc']}:{campos['cnonce']}:{campos['qop']}:{ha2}")
+        return campos.get("response") == esperado
+
+
+def _montar(monkeypatch, **kwargs):
+    rotas = carregar_rotas()
+    rotas[("GET", "/ISAPI/Streaming/channels/1/picture")] = (200, "image/jpeg", JPEG)
+    camera = CameraDigest(rotas, **kwargs)
+    # HTTPDigestAuth novo por teste: a primeira requisição sempre passa pelo desafio 401
+    requests_isapi._auth_digest.cache_clear()
+    sessao = requests.Session()
+    sessao.mount("http://", camera)
+    sessao.mount("https://", camera)
+    monkeypatch.setattr(requests_isapi, "sessao", sessao)
+    return camera
+
+
+@pytest.fixture
+def camera(monkeypatch):
+    """Câmera offline com Digest montada em requests_isapi.sessao (restaurada no fim do teste)."""
+    return _montar(monkeypatch)
+
+
+@pytest.fixture
+def camera_lenta(monkeypatch):
+    """Como `camera`, mas cada resposta demora 0,2 s (para haver requisições em voo ao mesmo tempo)."""
+    return _montar(monkeypatch, atraso=0.2)
+
+
+@contextlib.asynccontextmanager
+async def servidor_stream(respostas):
+    """
+    Servidor HTTP local para os streams: a n-ésima conexão lê o GET e recebe respostas[n] (bytes; a
+    última se repete) e fica aberta até o cliente fechar. Devolve (camera_ip, requisicoes).
+    """
+    requisicoes = []
+    escritores = []
+
+    async def atender(reader, writer):
+        escritores.append(writer)
+        try:
+            requisicoes.append(await reader.readuntil(b"\r\n\r\n"))
+            writer.write(respostas[min(len(requisicoes), len(respostas)) - 1])
+            await writer.drain()
+            await reader.read()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    servidor = await asyncio.start_server(atender, "127.0.0.1", 0)
+    try:
+        yield f"127.0.0.1:{servidor.sockets[0].getsockname()[1]}", requisicoes
+    finally:
+        servidor.close()
+        for writer in escritores:
+            writer.close()
+        await servidor.wait_closed()
+
+
+@contextlib.contextmanager
+def servidor_stream_em_thread(respostas):
+    """servidor_stream num event loop próprio, para testar as funções síncronas."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    gerente = servidor_stream(respostas)
+    try:
+        yield asyncio.run_coroutine_threadsafe(gerente.__aenter__(), loop).result(5)
+    finally:
+        asyncio.run_coroutine_threadsafe(gerente.__aexit__(None, None, None), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
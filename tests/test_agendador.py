@@ -0,0 +1,104 @@
+"""
+Invariantes da RodaTempo e do Agendador: cada ação vence uma vez só, no tick do seu horário
+(nem antes, nem depois), em ordem de tick, inclusive nos níveis altos e nos excedentes.
+"""
+import datetime
+import random
+
+import pytest
+
+from agendador import POSICOES, Acao, Agendador, RodaTempo, proximo_diario
+
+CAMERA = {"camera_ip": "192.0.2.10", "username": "admin", "password": "senha"}
+
+
+def _acao(i, alvo):
+    return Acao(i, CAMERA, "set_ircut", {}, alvo, 0)
+
+
+@pytest.mark.parametrize("tick, niveis", [(1.0, 2), (0.5, 3)])
+def test_roda_vence_cada_acao_no_seu_tick(tick, niveis):
+    aleatorio = random.Random(niveis)
+    inicio = 1_000_000 * tick + 13 * tick  # fora do alinhamento das posições
+    roda = RodaTempo(tick, niveis=niveis, agora=inicio)
+    alcance = POSICOES ** niveis * 3 * tick  # passa do último nível: excedentes
+    acoes = [_acao(i, inicio + aleatorio.uniform(-5 * tick, alcance)) for i in range(3000)]
+    for acao in acoes:
+        roda.inserir(acao)
+    assert roda.tamanho == len(acoes)
+
+    vencidas = {}
+    agora = inicio
+    while agora < inicio + alcance + tick:
+        agora += aleatorio.uniform(0, 200 * tick)
+        lote = roda.avancar(agora)
+        ticks = [acao._tick for acao in lote]
+        assert ticks == sorted(ticks)
+        for acao in lote:
+            assert acao.id not in vencidas
+            # Nunca antes do horário; atrasada só se já estava vencida ao entrar
+            assert acao.alvo <= roda.atual * tick + 1e-9
+            vencidas[acao.id] = roda.atual
+    assert len(vencidas) == len(acoes)
+    assert roda.tamanho == 0
+
+
+def test_roda_nao_atrasa_alem_de_um_tick():
+    roda = RodaTempo(1.0, niveis=2, agora=0)
+    acoes = [_acao(i, alvo) for i, alvo in enumerate([0.5, 1, 63.2, 64, 65, 4095.9, 4096, 4097, 9000.1])]
+    for acao in acoes:
+        roda.inserir(acao)
+    for segundo in range(1, 9002):
+        for acao in roda.avancar(segundo):
+            assert segundo - 1 < acao.alvo <= segundo
+    assert roda.tamanho == 0
+
+
+def test_roda_insere_depois_de_avancar():
+    roda = RodaTempo(1.0, niveis=2, agora=0)
+    roda.avancar(5000)
+    atrasada, futura = _acao(1, 10), _acao(2, 5100.5)
+    roda.inserir(atrasada)
+    roda.inserir(futura)
+    assert roda.avancar(5000) == [atrasada]
+    assert roda.avancar(5100) == []
+    assert roda.avancar(5101) == [futura]
+
+
+def test_cancelar_tira_dos_pendentes():
+    agendador = Agendador(concorrencia=1, espalhamento_s=0)
+    try:
+        futuro = datetime.datetime.now().timestamp() + 3600
+        ids = [agendador.agendar(CAMERA, "set_ircut", quando=futuro + i) for i in range(3)]
+        assert agendador.pendentes() == 3
+        agendador.cancelar(ids[1])
+        agendador.cancelar(ids[1])
+        assert agendador.pendentes() == 2
+        vencidas = agendador._roda.avancar(futuro + 10)
+        assert [acao.id for acao in vencidas if not acao.cancelada] == [ids[0], ids[2]]
+    finally:
+        agendador.parar()
+
+
+def test_espalhamento_fica_na_janela():
+    agendador = Agendador(concorrencia=1, espalhamento_s=60)
+    try:
+        futuro = datetime.datetime.now().timestamp() + 3600
+        for _ in range(200):
+            agendador.agendar(CAMERA, "set_ircut", quando=futuro)
+        alvos = [acao.alvo - acao.nominal for acao in agendador._acoes.values()]
+        assert all(0 <= desvio <= 60 for desvio in alvos)
+        assert max(alvos) - min(alvos) > 30
+    finally:
+        agendador.parar()
+
+
+def test_proximo_diario_sempre_depois():
+    proximo = proximo_diario(18, 30)
+    base = datetime.datetime(2026, 3, 1, 12, 0).timestamp()
+    for passo in range(0, 3 * 86400, 977):
+        apos = base + passo
+        quando = proximo(apos)
+        assert apos < quando <= apos + 86400
+        horario = datetime.datetime.fromtimestamp(quando)
+        assert (horario.hour, horario.minute, horario.second) == (18, 30, 0)
@@ -0,0 +1,54 @@
+"""
+ConsumidorAlertas contra um servidor local: publica os eventos, descarta os reenviados na
+reconexão e reconecta depois de dados malformados em vez de encerrar a tarefa.
+"""
+import asyncio
+
+from alert_stream import ConsumidorAlertas, HubEventos
+from conftest import servidor_stream
+
+CABECALHO = b"HTTP/1.1 200 OK\r\nContent-Type: multipart/mixed; boundary=limite\r\n\r\n"
+
+
+def _alerta(tipo, data_hora, contagem=1):
+    xml = (b"<EventNotificationAlert><eventType>%s</eventType><eventState>active</eventState>"
+           b"<channelID>1</channelID><dateTime>%s</dateTime><activePostCount>%d</activePostCount>"
+           b"</EventNotificationAlert>" % (tipo, data_hora, contagem))
+    return b"--limite\r\nContent-Type: application/xml\r\nContent-Length: %d\r\n\r\n%s\r\n" % (len(xml), xml)
+
+
+async def _consumir(respostas, esperados):
+    async with servidor_stream(respostas) as (camera_ip, requisicoes):
+        hub = HubEventos()
+        inscricao = hub.inscrever()
+        consumidor = ConsumidorAlertas(camera_ip, "admin", "senha", hub, backoff_max=1)
+        tarefa = asyncio.create_task(consumidor.executar())
+        try:
+            eventos = [await inscricao.proximo(timeout=5) for _ in range(esperados)]
+        finally:
+            consumidor.parando = True
+            tarefa.cancel()
+            await asyncio.gather(tarefa, return_exceptions=True)
+        return consumidor, eventos, requisicoes
+
+
+def test_publica_eventos_e_descarta_reenvio():
+    alertas = _alerta(b"VMD", b"2026-01-01T10:00:00") + _alerta(b"linedetection", b"2026-01-01T10:00:01")
+    # A segunda conexão reenvia o primeiro alerta (já visto) antes de um novo
+    respostas = [CABECALHO + alertas + b"--limite--\r\n",
+                 CABECALHO + _alerta(b"VMD", b"2026-01-01T10:00:00") + _alerta(b"VMD", b"2026-01-01T10:00:02")]
+    consumidor, eventos, _ = asyncio.run(_consumir(respostas, 3))
+    assert [(e.tipo, e.data_hora) for e in eventos] == [
+        ("VMD", "2026-01-01T10:00:00"), ("linedetection", "2026-01-01T10:00:01"), ("VMD", "2026-01-01T10:00:02"),
+    ]
+    assert consumidor.duplicados == 1
+    assert consumidor.conexoes == 2
+
+
+def test_reconecta_depois_de_content_length_invalido():
+    quebrada = CABECALHO + b"--limite\r\nContent-Type: application/xml\r\nContent-Length: 1x\r\n\r\n<a/>\r\n"
+    respostas = [quebrada, CABECALHO + _alerta(b"VMD", b"2026-01-01T10:00:00")]
+    consumidor, eventos, requisicoes = asyncio.run(_consumir(respostas, 1))
+    assert eventos[0].tipo == "VMD"
+    assert len(requisicoes) == 2
+    assert "ErroStream" in consumidor.ultimo_erro
@@ -0,0 +1,69 @@
+"""
+BandaSites: classes de tráfego, ritmo do orçamento do site, o interativo passando na frente dos
+pedaços de bulk na fila e o corpo pago também quando o adapter interno não tem raw (respostas em
+memória).
+"""
+import threading
+import time
+
+import requests_isapi
+from banda_sites import BandaSites, Site, classificar
+from conftest import CAMERA_IP, JPEG, PASSWORD, USERNAME
+
+
+def test_classificar():
+    assert classificar("GET", "/ISAPI/Streaming/channels/1/picture") == "snapshot"
+    assert classificar("PUT", "/ISAPI/Security/serverCertificate/upload") == "bulk"
+    assert classificar("GET", "/ISAPI/Security/serverCertificate/certificate") == "interativo"
+    assert classificar("PUT", "/ISAPI/Image/channels/1/color", 100) == "interativo"
+    assert classificar("PUT", "/ISAPI/Image/channels/1/color", 100 * 1024) == "bulk"
+
+
+def test_ritmo_e_interativo_na_frente_do_bulk():
+    taxa, pedaco = 1_000_000, 16 * 1024
+    site = Site("remoto", taxa)
+
+    def bulk():
+        for _ in range(4):
+            site.transmitir("bulk", pedaco)
+
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=bulk) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)  # fila cheia de pedaços de bulk
+
+    chegada = time.monotonic()
+    site.transmitir("interativo", 1000)
+    espera_interativo = time.monotonic() - chegada
+    for thread in threads:
+        thread.join()
+    decorrido = time.monotonic() - inicio
+
+    total = 8 * 4 * pedaco + 1000
+    # Balde de fichas: não passa da taxa (descontada a rajada inicial)
+    assert decorrido >= (total - site.rajada) / taxa * 0.9
+    # Em FIFO o interativo esperaria os ~7 pedaços de bulk na fila (~115 ms); no WFQ, no máximo
+    # o pedaço que já estava saindo
+    assert espera_interativo < 0.07
+    estatisticas = site.estatisticas()
+    assert estatisticas["classes"]["bulk"]["pedacos"] == 32
+    assert estatisticas["classes"]["interativo"]["bytes"] == 1000
+    assert estatisticas["na_fila"] == 0
+
+
+def test_resposta_em_memoria_paga_no_orcamento(camera):
+    banda = BandaSites.instalar(orcamentos={"remoto": 1_000_000}, sites={CAMERA_IP: "remoto"}, pedaco=512)
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD).conteudo == JPEG
+
+    classes = banda.site("remoto").estatisticas()["classes"]
+    assert classes["snapshot"]["bytes"] == len(JPEG)
+    assert classes["snapshot"]["pedacos"] == -(-len(JPEG) // 512)
+
+
+def test_camera_sem_site_passa_direto(camera):
+    banda = BandaSites.instalar(orcamentos={"remoto": 1_000}, sites={"10.8.0.21": "remoto"})
+    inicio = time.monotonic()
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD).conteudo == JPEG
+    assert time.monotonic() - inicio < 1  # a 1 KB/s o JPEG levaria 2 s
+    assert sum(c["bytes"] for c in banda.site("remoto").estatisticas()["classes"].values()) == 0
@@ -0,0 +1,93 @@
+"""
+Regressões do CacheConfiguracao: leituras em cache só para quem tem a credencial que a câmera
+aceitou, uma falha por leitura (não uma por perna do Digest), escrita direta dos PUTs e o
+get_parametros_imagem sem a verificação de conexão quando a leitura está em cache.
+"""
+import modelo_imagem
+import requests_isapi
+from cache_config import CacheConfiguracao, aplicar_put
+from conftest import CAMERA_IP, PASSWORD, USERNAME
+
+
+def test_cache_nao_serve_senha_errada(camera):
+    cache = CacheConfiguracao.instalar(ttl=300)
+
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert cache.acertos == 1
+
+    recebidas = camera.recebidas
+    errada = modelo_imagem.buscar(CAMERA_IP, USERNAME, "senha-errada")
+    assert not errada
+    assert errada.status_code == 401
+    assert camera.recebidas > recebidas  # foi à câmera em vez de sair do cache
+    assert cache.acertos == 1
+
+
+def test_cache_conta_uma_falha_por_leitura(camera):
+    cache = CacheConfiguracao.instalar(ttl=300)
+
+    # Leitura fria: primeira perna do Digest (401) + perna autenticada, uma falha só
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert camera.recebidas == 2
+    assert cache.estatisticas()["falhas"] == 1
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert cache.estatisticas()["acertos"] == 1
+    assert cache.estatisticas()["taxa_acerto"] == 0.5
+
+
+def test_get_parametros_imagem_em_cache_nao_verifica_conexao(camera, tmp_path):
+    CacheConfiguracao.instalar(ttl=300)
+    arquivo = str(tmp_path / "parametros.xml")
+
+    assert requests_isapi.get_parametros_imagem(CAMERA_IP, USERNAME, PASSWORD, output_file=arquivo)
+    assert ("GET", "/ISAPI/Security/UserPermission/1") in camera.pedidas
+
+    pedidas = len(camera.pedidas)
+    assert requests_isapi.get_parametros_imagem(CAMERA_IP, USERNAME, PASSWORD, output_file=arquivo)
+    assert len(camera.pedidas) == pedidas  # nem o GET nem a verificação foram à câmera
+
+    # Senha errada não tem entrada: verifica a conexão e recebe o 401 da câmera
+    errada = requests_isapi.get_parametros_imagem(CAMERA_IP, USERNAME, "senha-errada", output_file=arquivo)
+    assert errada.status_code == 401
+    assert camera.pedidas[pedidas][1] == "/ISAPI/Security/UserPermission/1"
+
+
+def test_put_ok_atualiza_entradas_do_recurso_e_do_documento(camera):
+    cache = CacheConfiguracao.instalar(ttl=300)
+    camera.rotas[("GET", "/ISAPI/Image/channels/1/color")] = (
+        200, "application/xml", b"<Color><brightnessLevel>50</brightnessLevel><contrastLevel>50</contrastLevel></Color>")
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert requests_isapi.get_color_config(CAMERA_IP, USERNAME, PASSWORD)
+
+    assert requests_isapi.set_color(CAMERA_IP, USERNAME, PASSWORD, brightness=63)
+    pedidas = len(camera.pedidas)
+
+    cor = requests_isapi.get_color_config(CAMERA_IP, USERNAME, PASSWORD)
+    assert "<brightnessLevel>63</brightnessLevel>" in cor.conteudo
+    canais = modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD).conteudo
+    assert canais[0].color.brightness_level == 63
+    assert len(camera.pedidas) == pedidas
+    assert cache.escritas == 2
+
+
+def test_put_com_falha_descarta_as_entradas(camera):
+    cache = CacheConfiguracao.instalar(ttl=300)
+    camera.rotas[("PUT", "/ISAPI/Image/channels/1/color")] = lambda request: (500, "application/xml", b"<erro/>")
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+
+    assert not requests_isapi.set_color(CAMERA_IP, USERNAME, PASSWORD, brightness=63)
+    assert cache.estatisticas()["entradas"] == 0
+    assert cache.descartes == 1
+
+    pedidas = len(camera.pedidas)
+    assert modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD)
+    assert ("GET", "/ISAPI/Image/channels") in camera.pedidas[pedidas:]
+
+
+def test_aplicar_put_ambiguo_devolve_none():
+    cacheado = "<Color><brightnessLevel>50</brightnessLevel></Color>"
+    assert aplicar_put(cacheado, "<Color><brightnessLevel>70</brightnessLevel></Color>") == \
+        "<Color><brightnessLevel>70</brightnessLevel></Color>"
+    assert aplicar_put(cacheado, "<Color><contrastLevel>70</contrastLevel></Color>") is None
+    assert aplicar_put(cacheado, "<Gain><gainLevel>1</gainLevel></Gain>") is None
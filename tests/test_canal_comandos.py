@@ -0,0 +1,84 @@
+"""
+CanalComandos: último valor vence, o canal de vídeo do canal vale para todos os parâmetros e uma
+exceção no setter ou no callback não derruba a thread da câmera.
+"""
+import threading
+
+import requests_isapi
+from bench_isapi import carregar_rotas
+from canal_comandos import CanalComandos
+from conftest import CAMERA_IP, PASSWORD, USERNAME
+
+
+def _fechar(canal):
+    assert canal.aguardar(timeout=5)
+    canal.fechar()
+    assert not canal._thread.is_alive()
+
+
+def test_iris_vai_para_o_canal_do_canal(camera):
+    camera.rotas[("PUT", "/ISAPI/Image/channels/2/exposure")] = carregar_rotas()[("PUT", "/ISAPI/Image/channels/1/exposure")]
+    canal = CanalComandos(CAMERA_IP, USERNAME, PASSWORD, channel_id=2)
+    canal.enviar("iris", 30)
+    _fechar(canal)
+    assert ("PUT", "/ISAPI/Image/channels/2/exposure") in camera.pedidas
+    assert ("PUT", "/ISAPI/Image/channels/1/exposure") not in camera.pedidas
+    assert canal.estatisticas()["enviados"] == 1
+
+
+def test_ultimo_valor_vence(monkeypatch):
+    liberar = threading.Event()
+    aplicados = []
+
+    def set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40):
+        liberar.wait(5)
+        aplicados.append(gain_level)
+        return requests_isapi.Resultado(True, 200)
+
+    monkeypatch.setattr(requests_isapi, "set_gain_level", set_gain_level)
+    canal = CanalComandos(CAMERA_IP, USERNAME, PASSWORD)
+    for valor in range(50):
+        canal.enviar("gain", valor)
+    liberar.set()
+    _fechar(canal)
+    assert aplicados[-1] == 49
+    assert len(aplicados) <= 2
+    estatisticas = canal.estatisticas()
+    assert estatisticas["pedidos"] == 50
+    assert estatisticas["coalescidos"] == 50 - len(aplicados)
+
+
+def test_excecao_do_setter_conta_falha_e_segue(monkeypatch):
+    chamadas = []
+
+    def set_gain_level(camera_ip, username, password, channel_id=1, gain_level=40):
+        chamadas.append(gain_level)
+        if len(chamadas) == 1:
+            raise RuntimeError("firmware")
+        return requests_isapi.Resultado(True, 200)
+
+    monkeypatch.setattr(requests_isapi, "set_gain_level", set_gain_level)
+    retornos = []
+    canal = CanalComandos(CAMERA_IP, USERNAME, PASSWORD, ao_aplicar=lambda *args: retornos.append(args[:3]))
+    canal.enviar("gain", 10)
+    assert canal.aguardar(timeout=5)
+    canal.enviar("gain", 20)
+    _fechar(canal)
+    assert chamadas == [10, 20]
+    assert retornos == [("gain", 10, False), ("gain", 20, True)]
+    assert canal.estatisticas()["falhas"] == 1
+    assert canal.estatisticas()["enviados"] == 1
+
+
+def test_excecao_do_callback_nao_derruba_a_thread(monkeypatch):
+    monkeypatch.setattr(requests_isapi, "set_gain_level", lambda *args, **kwargs: requests_isapi.Resultado(True, 200))
+
+    def ao_aplicar(parametro, valor, ok, latencia_s):
+        raise ValueError("painel fechado")
+
+    canal = CanalComandos(CAMERA_IP, USERNAME, PASSWORD, ao_aplicar=ao_aplicar)
+    canal.enviar("gain", 10)
+    assert canal.aguardar(timeout=5)
+    canal.enviar("gain", 20)
+    _fechar(canal)
+    assert canal.estatisticas()["enviados"] == 2
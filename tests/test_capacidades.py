@@ -0,0 +1,95 @@
+"""
+Invariantes do IndiceCapacidades: as consultas por lanes (SWAR) dão o mesmo que filtrar câmera a
+câmera, inclusive depois de alargar a linha, remover câmeras e ir e voltar do arquivo.
+"""
+import random
+
+import pytest
+
+from capacidades import IndiceCapacidades, ler_flags
+
+FLAGS = [f"isSupportFlag{i}" for i in range(80)]  # mais de 64: força o _alargar
+
+
+def _aleatorio(semente, n_cameras=300, flags=FLAGS):
+    aleatorio = random.Random(semente)
+    indice = IndiceCapacidades()
+    esperado = {}
+    for i in range(n_cameras):
+        camera_ip = f"10.0.{i // 256}.{i % 256}"
+        informadas = aleatorio.sample(flags, aleatorio.randint(0, len(flags)))
+        esperado[camera_ip] = {flag: aleatorio.random() < 0.5 for flag in informadas}
+        indice.atualizar(camera_ip, esperado[camera_ip])
+    return indice, esperado
+
+
+def _conferir(indice, esperado, semente):
+    aleatorio = random.Random(semente)
+    ordem = list(esperado)
+    for _ in range(200):
+        exigidas = aleatorio.sample(FLAGS, aleatorio.randint(1, 3))
+        proibidas = aleatorio.sample(FLAGS, aleatorio.randint(0, 2))
+        assert indice.consultar(*exigidas, sem=proibidas) == [
+            c for c in ordem
+            if all(esperado[c].get(f) for f in exigidas) and not any(esperado[c].get(f) for f in proibidas)
+        ]
+        assert indice.qualquer(*exigidas) == [c for c in ordem if any(esperado[c].get(f) for f in exigidas)]
+    for camera_ip in aleatorio.sample(ordem, min(20, len(ordem))):
+        assert set(indice.flags_da_camera(camera_ip)) == {f for f, v in esperado[camera_ip].items() if v}
+    assert indice.contagem() == {f: sum(bool(esperado[c].get(f)) for c in ordem) for f in indice.flags}
+
+
+@pytest.mark.parametrize("semente", [1, 2, 3])
+def test_consultas_iguais_ao_filtro(semente):
+    indice, esperado = _aleatorio(semente)
+    assert indice.palavras == 2
+    _conferir(indice, esperado, semente)
+
+
+def test_alargar_preserva_linhas():
+    indice, esperado = _aleatorio(4, flags=FLAGS[:60])
+    assert indice.palavras == 1
+    antes = {c: indice.flags_da_camera(c) for c in esperado}
+    indice.atualizar("10.9.9.9", {flag: True for flag in FLAGS})
+    esperado["10.9.9.9"] = {flag: True for flag in FLAGS}
+    assert indice.palavras == 2
+    assert all(indice.flags_da_camera(c) == flags for c, flags in antes.items())
+    _conferir(indice, esperado, 4)
+
+
+def test_atualizar_e_remover():
+    indice, esperado = _aleatorio(5)
+    _conferir(indice, esperado, 5)  # enche o cache das máscaras repetidas antes de mudar as linhas
+    for camera_ip in list(esperado)[::7]:
+        indice.remover(camera_ip)
+        del esperado[camera_ip]
+    camera_ip = next(iter(esperado))
+    esperado[camera_ip] = {FLAGS[0]: True}
+    indice.atualizar(camera_ip, esperado[camera_ip])
+    _conferir(indice, esperado, 6)
+
+
+def test_salvar_e_carregar(tmp_path):
+    indice, esperado = _aleatorio(7)
+    caminho = str(tmp_path / "capacidades.idx")
+    indice.salvar(caminho)
+    carregado = IndiceCapacidades.carregar(caminho)
+    assert carregado.flags == indice.flags
+    assert carregado.cameras == indice.cameras
+    assert carregado.linhas == indice.linhas
+    _conferir(carregado, esperado, 7)
+
+
+def test_carregar_recusa_arquivo_truncado(tmp_path):
+    indice, _ = _aleatorio(8, n_cameras=10)
+    caminho = tmp_path / "capacidades.idx"
+    indice.salvar(str(caminho))
+    caminho.write_bytes(caminho.read_bytes()[:-8])
+    with pytest.raises(ValueError):
+        IndiceCapacidades.carregar(str(caminho))
+
+
+def test_ler_flags():
+    xml = b"<DeviceCap><isSupportA>true</isSupportA><Sub><isSupportB>false</isSupportB></Sub></DeviceCap>"
+    assert ler_flags(xml) == {"isSupportA": True, "isSupportB": False}
+    assert ler_flags(xml.decode()) == ler_flags(xml)
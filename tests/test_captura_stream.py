@@ -0,0 +1,66 @@
+"""
+CapturaStream e capturar_intervalos contra um servidor MJPEG local: frames inteiros, descarte dos
+não-JPEG e n - 1 intervalos a partir do primeiro frame.
+"""
+import asyncio
+
+import pytest
+
+import requests_isapi
+from captura_stream import CapturaStream, capturar_intervalos
+from conftest import JPEG, servidor_stream, servidor_stream_em_thread
+
+CABECALHO = b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n\r\n"
+
+
+def _parte(dados):
+    return b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%s\r\n" % (len(dados), dados)
+
+
+def _mjpeg(n, extra=b""):
+    return CABECALHO + extra + b"".join(_parte(JPEG[:-1] + bytes([i])) for i in range(n))
+
+
+def test_capturar_intervalos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    recebidos = []
+    with servidor_stream_em_thread([_mjpeg(5)]) as (camera_ip, requisicoes):
+        tempos = capturar_intervalos(camera_ip, "admin", "senha", n=5, ao_frame=lambda nome, dados: recebidos.append(nome))
+    assert len(tempos) == 4
+    assert recebidos == [f"{camera_ip}_{i}_snapshot.jpg" for i in range(5)]
+    assert (tmp_path / f"{camera_ip}_4_snapshot.jpg").read_bytes() == JPEG[:-1] + bytes([4])
+    assert b"/ISAPI/Streaming/channels/101/httpPreview" in requisicoes[0]
+
+
+def test_capturar_intervalos_exige_dois_frames():
+    with pytest.raises(ValueError):
+        capturar_intervalos("192.0.2.10", "admin", "senha", n=1)
+    with pytest.raises(ValueError):
+        requests_isapi.fps_captura_imagem("192.0.2.10", "admin", "senha", n=1, modo="stream")
+
+
+def test_capturar_intervalos_recusa_event_loop_rodando():
+    async def principal():
+        capturar_intervalos("192.0.2.10", "admin", "senha", n=5)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(principal())
+
+
+def test_captura_descarta_nao_jpeg_e_antigos():
+    async def principal():
+        async with servidor_stream([_mjpeg(6, extra=_parte(b"nao-e-jpeg"))]) as (camera_ip, _):
+            captura = CapturaStream(camera_ip, "admin", "senha", tamanho_fila=2)
+            captura.iniciar()
+            try:
+                while captura.frames < 6:
+                    await asyncio.sleep(0.01)
+                frames = [await captura.proximo_frame(1) for _ in range(2)]
+            finally:
+                await captura.parar()
+            return captura, frames
+
+    captura, frames = asyncio.run(asyncio.wait_for(principal(), 10))
+    assert [frame.numero for frame in frames] == [5, 6]
+    assert captura.invalidos == 1
+    assert captura.descartados == 4
@@ -0,0 +1,115 @@
+"""
+ControleCarga: nunca mais requisições em voo que o limite da câmera, vaga presa até o corpo ser
+lido (também com stream=True), AIMD do limite e carga lida do /ISAPI/System/status.
+"""
+import io
+import threading
+import time
+
+import pytest
+import requests
+from requests import Response
+from requests.adapters import BaseAdapter
+from urllib3 import HTTPResponse
+
+import requests_isapi
+from bench_isapi import DIR_RESPOSTAS
+from conftest import CAMERA_IP, PASSWORD, USERNAME
+from controle_carga import ControleCarga, LimitadorCamera, LimiteEsgotado, ler_carga
+
+
+def test_ler_carga():
+    cpu, memoria = ler_carga((DIR_RESPOSTAS / "device_status.xml").read_bytes())
+    assert cpu == 38
+    assert memoria == pytest.approx(100 * 212.984375 / (212.984375 + 298.515625))
+    assert ler_carga(b"<DeviceStatus/>") == (None, None)
+
+
+def test_limite_por_camera(camera_lenta):
+    controle = ControleCarga.instalar(limite_inicial=2, limite_max=2)
+    threads = [threading.Thread(target=requests_isapi.verificar_camera_conectada, args=(CAMERA_IP, USERNAME, PASSWORD))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert camera_lenta.max_em_voo == 2
+    limitador = controle.limitador(CAMERA_IP)
+    assert limitador.em_voo == 0
+    assert limitador.esperas > 0
+
+
+def test_status_registra_carga(camera):
+    controle = ControleCarga.instalar()
+    requests_isapi.sessao.get(f"http://{CAMERA_IP}/ISAPI/System/status",
+                              auth=requests_isapi._auth_digest(CAMERA_IP, USERNAME, PASSWORD))
+    assert controle.limitador(CAMERA_IP).cpu == 38
+
+
+class _CorpoLento(io.BytesIO):
+    def read(self, *args, **kwargs):
+        time.sleep(0.2)
+        return super().read(*args, **kwargs)
+
+
+class _AdapterStream(BaseAdapter):
+    """Devolve o corpo ainda por ler (como o HTTPAdapter com stream=True)."""
+
+    def send(self, request, **kwargs):
+        resposta = Response()
+        resposta.status_code = 200
+        resposta.raw = HTTPResponse(body=_CorpoLento(b"\xff\xd8jpeg\xff\xd9"), preload_content=False)
+        resposta.url = request.url
+        resposta.request = request
+        return resposta
+
+    def close(self):
+        pass
+
+
+def test_vaga_presa_ate_ler_o_corpo():
+    sessao = requests.Session()
+    sessao.mount("http://", _AdapterStream())
+    controle = ControleCarga.instalar(sessao)
+    resposta = sessao.get(f"http://{CAMERA_IP}/ISAPI/Streaming/channels/1/picture", stream=True)
+    limitador = controle.limitador(CAMERA_IP)
+    assert limitador.em_voo == 0
+    assert resposta.content == b"\xff\xd8jpeg\xff\xd9"
+    # A latência medida inclui a leitura do corpo
+    assert limitador.latencia_base(("GET", "/ISAPI/Streaming/channels/1/picture", 200)) >= 0.2
+
+
+def test_aimd():
+    limitador = LimitadorCamera(CAMERA_IP, limite_inicial=2, limite_max=4, fator_reducao=0.5)
+    rota = ("GET", "/ISAPI/System/status", 200)
+    for _ in range(20):
+        limitador.adquirir()
+        limitador.adquirir()
+        limitador.liberar(0.01, rota=rota)
+        limitador.liberar(0.01, rota=rota)
+    assert limitador.limite > 2
+
+    antes = limitador.limite
+    limitador.adquirir()
+    limitador.liberar(0.01, falhou=True, rota=rota)
+    assert limitador.limite == pytest.approx(antes * 0.5)
+
+    limitador.registrar_carga(95, 10)
+    limitador.registrar_carga(95, 10)
+    assert limitador.limite == limitador.limite_min
+
+
+def test_carga_alta_congela_o_limite():
+    limitador = LimitadorCamera(CAMERA_IP, limite_inicial=1)
+    limitador.registrar_carga(80, 10)
+    for _ in range(10):
+        limitador.adquirir()
+        limitador.liberar(0.01, rota=("GET", "/", 200))
+    assert limitador.limite == 1
+
+
+def test_limite_esgotado():
+    limitador = LimitadorCamera(CAMERA_IP, limite_inicial=1)
+    limitador.adquirir()
+    with pytest.raises(LimiteEsgotado):
+        limitador.adquirir(espera_max=0.05)
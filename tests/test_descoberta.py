@@ -0,0 +1,79 @@
+"""
+Descoberta: faixas sem endereços repetidos, câmera ISAPI achada e validada num servidor local,
+falta de descritores que não derruba a varredura e o merge do inventário.
+"""
+import asyncio
+import errno
+import ipaddress
+import json
+
+import pytest
+
+import descoberta
+from conftest import servidor_stream
+from descoberta import Descoberta, _enderecos, salvar_inventario
+
+DESAFIO = (b'HTTP/1.1 401 Unauthorized\r\nWWW-Authenticate: Digest qop="auth", realm="IP Camera", '
+           b'nonce="abc", stale="FALSE"\r\nContent-Length: 0\r\n\r\n')
+OK = b"HTTP/1.1 200 OK\r\nContent-Type: application/xml\r\nContent-Length: 0\r\n\r\n"
+
+
+def test_enderecos_sem_repeticao():
+    enderecos = list(_enderecos(["10.0.0.0/30", "10.0.0.0/31", "10.0.0.2/32", "10.0.0.8/32"], [80, 8080, 80]))
+    assert len(enderecos) == len(set(enderecos))
+    assert {str(ip) for ip, _ in enderecos} == {"10.0.0.1", "10.0.0.2", "10.0.0.8"}
+    assert [porta for ip, porta in enderecos if ip == ipaddress.ip_address("10.0.0.8")] == [80, 8080]
+
+
+def test_concorrencia_limitada_pelos_descritores(monkeypatch):
+    monkeypatch.setattr(descoberta, "_limite_descritores", lambda margem=64: 10)
+    assert Descoberta([], concorrencia=1024).concorrencia == 10
+    assert Descoberta([], concorrencia=4).concorrencia == 4
+
+
+def test_acha_e_valida_camera_local():
+    async def principal():
+        async with servidor_stream([DESAFIO, DESAFIO, OK]) as (camera_ip, requisicoes):
+            porta = int(camera_ip.split(":")[1])
+            busca = Descoberta([("admin", "senha")], portas=[porta], concorrencia=4)
+            return porta, await busca.varrer(["127.0.0.1/32"]), busca, requisicoes
+
+    porta, cameras, busca, requisicoes = asyncio.run(asyncio.wait_for(principal(), 10))
+    assert len(cameras) == 1
+    camera = cameras[0]
+    assert (camera["camera_ip"], camera["porta"], camera["https"]) == (f"127.0.0.1:{porta}", porta, False)
+    assert camera["validado"] and camera["username"] == "admin"
+    assert b"/ISAPI/System/deviceInfo" in requisicoes[0]
+    assert b"Authorization: Digest" in requisicoes[2]
+    assert busca.estatisticas() == {"sondados": 1, "abertos": 1, "isapi": 1, "validados": 1, "nao_sondados": 0}
+
+
+def test_sem_descritores_nao_interrompe_a_varredura(monkeypatch):
+    async def open_connection(host, porta, **kwargs):
+        if host == "10.0.0.2":
+            raise OSError(errno.EMFILE, "Too many open files")
+        raise ConnectionRefusedError(errno.ECONNREFUSED, "Connection refused")
+
+    monkeypatch.setattr(asyncio, "open_connection", open_connection)
+    busca = Descoberta([], concorrencia=2)
+    assert asyncio.run(busca.varrer(["10.0.0.0/29"])) == []
+    assert busca.nao_sondados == [("10.0.0.2", 80)]
+    assert busca.sondados == 6
+
+
+def test_salvar_inventario_mantem_credencial_validada(tmp_path):
+    caminho = str(tmp_path / "inventario.json")
+    salvar_inventario([{"camera_ip": "10.0.0.9", "validado": True, "username": "admin", "password": "a"},
+                       {"camera_ip": "10.0.0.10", "validado": False}], caminho)
+    inventario = salvar_inventario([{"camera_ip": "10.0.0.9", "validado": False, "erro": "timeout"},
+                                    {"camera_ip": "10.0.0.10", "validado": True, "username": "admin", "password": "b"}],
+                                   caminho)
+    assert [c["camera_ip"] for c in inventario] == ["10.0.0.9", "10.0.0.10"]
+    assert all(c["validado"] for c in inventario)
+    with open(caminho, encoding="utf-8") as file:
+        assert json.load(file) == inventario
+
+
+def test_credencial_sem_separador_e_erro_de_uso():
+    with pytest.raises(SystemExit):
+        descoberta.main(["10.0.0.0/30", "--credencial", "admin"])
@@ -0,0 +1,111 @@
+"""
+FilaJobs: uma tentativa por câmera por execução, retomada só do que falta, checkpoint do que já
+voltou mesmo se a execução for interrompida e tentativas esgotadas.
+"""
+import pytest
+
+import fleet_runner
+from fila_jobs import FilaJobs
+
+CAMERAS = [{"camera_ip": f"10.0.0.{i}", "username": "admin", "password": "senha"} for i in range(1, 7)]
+
+
+@pytest.fixture
+def fila(tmp_path):
+    fila = FilaJobs(str(tmp_path / "jobs.sqlite"))
+    yield fila
+    fila.fechar()
+
+
+class _RunnerFalso:
+    """No lugar do FleetRunner: falha as câmeras de `falhar`, repete resultados e pode parar no meio."""
+
+    falhar = set()
+    parar_depois = None
+    rodadas = []
+
+    def __init__(self, operacao, kwargs=None, **opcoes):
+        self.operacao = operacao
+
+    def executar(self, cameras, ao_receber=None):
+        _RunnerFalso.rodadas.append([camera["camera_ip"] for camera in cameras])
+        for i, camera in enumerate(cameras):
+            if self.parar_depois is not None and i == self.parar_depois:
+                raise KeyboardInterrupt
+            resultado = {"camera_ip": camera["camera_ip"], "ok": camera["camera_ip"] not in self.falhar,
+                         "status_code": 200, "duracao_s": 0.01}
+            ao_receber(resultado)
+            ao_receber(dict(resultado))  # o mesmo resultado de novo (worker declarado morto)
+        return {"tempo_s": 0.1}
+
+
+@pytest.fixture
+def runner_falso(monkeypatch):
+    monkeypatch.setattr(fleet_runner, "FleetRunner", _RunnerFalso)
+    _RunnerFalso.falhar = set()
+    _RunnerFalso.parar_depois = None
+    _RunnerFalso.rodadas = []
+    return _RunnerFalso
+
+
+def _tentativas(fila, job_id):
+    return dict(fila.conexao.execute("SELECT camera_ip, tentativas FROM tarefas WHERE job_id = ?", (job_id,)))
+
+
+def test_retoma_so_o_que_falhou(fila, runner_falso):
+    job_id = fila.criar("set_ircut", CAMERAS, {"ircut_filter_type": "night"}, max_tentativas=2)
+    runner_falso.falhar = {"10.0.0.2"}
+
+    resumo = fila.executar(job_id, CAMERAS, lote_commit=2)
+    assert (resumo["ok"], resumo["falhas"], resumo["pendentes"]) == (5, 1, 0)
+    assert set(_tentativas(fila, job_id).values()) == {1}
+
+    resumo = fila.executar(job_id, CAMERAS)
+    assert runner_falso.rodadas[-1] == ["10.0.0.2"]
+    assert resumo["falhas_esgotadas"] == 1
+    assert _tentativas(fila, job_id)["10.0.0.2"] == 2
+
+    assert fila.executar(job_id, CAMERAS)["executadas"] == 0
+    assert fila.job(job_id)["execucoes"] == 3
+
+
+def test_interrompido_grava_o_que_voltou(fila, runner_falso):
+    job_id = fila.criar("set_ircut", CAMERAS)
+    runner_falso.parar_depois = 4
+    with pytest.raises(KeyboardInterrupt):
+        fila.executar(job_id, CAMERAS, lote_commit=1000, intervalo_commit=1000)
+    assert fila.resumo(job_id)["ok"] == 4
+
+    runner_falso.parar_depois = None
+    fila.executar(job_id, CAMERAS)
+    assert runner_falso.rodadas[-1] == ["10.0.0.5", "10.0.0.6"]
+    assert fila.resumo(job_id)["ok"] == 6
+
+
+def test_camera_fora_do_inventario_fica_pendente(fila, runner_falso):
+    job_id = fila.criar("set_ircut", CAMERAS)
+    resumo = fila.executar(job_id, CAMERAS[:4])
+    assert (resumo["sem_credencial"], resumo["pendentes"], resumo["ok"]) == (2, 2, 4)
+
+
+def test_conteudo_so_quando_pedido(fila):
+    job_id = fila.criar("get_server_certificates", CAMERAS[:2])
+    fila.registrar(job_id, [{"camera_ip": "10.0.0.1", "ok": True, "conteudo": {"certificados": 2}}])
+    fila.registrar(job_id, [{"camera_ip": "10.0.0.2", "ok": True, "conteudo": {"certificados": 3}}], guardar_conteudo=True)
+    resultados = dict(fila.conexao.execute("SELECT camera_ip, resultado FROM tarefas WHERE job_id = ?", (job_id,)))
+    assert resultados == {"10.0.0.1": None, "10.0.0.2": '{"certificados": 3}'}
+
+
+def test_fleet_runner_de_verdade(fila):
+    # Porta fechada no loopback: falha rápida em cada câmera, uma tentativa por execução
+    cameras = [{"camera_ip": f"127.0.0.{i}:1", "username": "admin", "password": "senha"} for i in range(1, 4)]
+    job_id = fila.criar("verificar_camera_conectada", cameras, max_tentativas=3)
+    resumo = fila.executar(job_id, cameras, processos=1)
+    assert resumo["falhas"] == 3
+    assert set(_tentativas(fila, job_id).values()) == {1}
+    assert all(falha["erro"] for falha in fila.falhas(job_id))
+
+
+def test_job_inexistente(fila):
+    with pytest.raises(KeyError):
+        fila.job(42)
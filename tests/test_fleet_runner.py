@@ -0,0 +1,123 @@
+"""
+FleetRunner e inventário: uma linha de resultado por câmera, câmeras em paralelo dentro do worker
+(não limitadas pelo executor padrão do asyncio) e o https do inventário repassado às funções.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from fleet_runner import FleetRunner, _executar_camera, _parse_kwargs, booleano, carregar_cameras
+
+
+class _CameraLenta(BaseHTTPRequestHandler):
+    atraso = 0.5
+
+    def do_GET(self):
+        time.sleep(self.atraso)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def porta_lenta():
+    ThreadingHTTPServer.request_queue_size = 256
+    servidor = ThreadingHTTPServer(("", 0), _CameraLenta)
+    servidor.daemon_threads = True
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor.server_address[1]
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _cameras(n, porta):
+    # 127.0.0.0/8 inteiro é loopback: IPs distintos, mesmo servidor
+    return [{"camera_ip": f"127.0.0.{i}:{porta}", "username": "admin", "password": "senha"} for i in range(1, n + 1)]
+
+
+def test_frota_em_paralelo_e_sem_repetir(porta_lenta):
+    cameras = _cameras(96, porta_lenta)
+    resultados, chegadas = [], []
+
+    def ao_receber(resultado):
+        resultados.append(resultado)
+        chegadas.append(time.perf_counter())
+
+    runner = FleetRunner("verificar_camera_conectada", processos=1, concorrencia=96, tamanho_lote=96)
+    resumo = runner.executar(cameras + cameras[:4], ao_receber=ao_receber)
+
+    assert sorted(r["camera_ip"] for r in resultados) == sorted(c["camera_ip"] for c in cameras)
+    assert all(r["ok"] for r in resultados)
+    estatisticas = resumo["workers"][0]
+    assert estatisticas["cameras"] == 96
+    # 96 câmeras de 0,5 s com concorrência 96 terminam juntas; com as no máximo 32 threads do
+    # executor padrão do asyncio sairiam em levas de 0,5 s
+    assert max(chegadas) - min(chegadas) < 0.45
+
+
+def test_frota_dividida_entre_processos(porta_lenta):
+    cameras = _cameras(40, porta_lenta)
+    resultados = []
+    FleetRunner("verificar_camera_conectada", processos=2, concorrencia=8, tamanho_lote=4).executar(
+        cameras, ao_receber=resultados.append)
+    assert len(resultados) == 40
+    assert len({r["pid"] for r in resultados}) == 2
+
+
+def test_particionar_e_roubar():
+    runner = FleetRunner("verificar_camera_conectada", processos=2, tamanho_lote=2)
+    shards = runner._particionar([{"camera_ip": str(i)} for i in range(10)])
+    assert [len(shard) for shard in shards] == [3, 2]
+    shards[1].clear()
+    lote, roubado = runner._proximo_lote(1, shards)
+    assert roubado and [c["camera_ip"] for c in lote] == ["8", "9"]
+    assert runner._proximo_lote(0, shards) == ([{"camera_ip": "0"}, {"camera_ip": "1"}], False)
+
+
+def test_carregar_cameras_csv(tmp_path):
+    caminho = tmp_path / "inventario.csv"
+    caminho.write_text("camera_ip,username,password,validado,https\n"
+                       "10.0.0.1,admin,a,True,false\n10.0.0.2,admin,b,False,\n10.0.0.1,admin,c,,\n10.0.0.3,admin,d,,1\n",
+                       encoding="utf-8")
+    cameras = carregar_cameras(str(caminho))
+    assert [c["camera_ip"] for c in cameras] == ["10.0.0.1", "10.0.0.3"]
+    assert cameras[0]["password"] == "a"
+
+
+def test_carregar_cameras_exige_credenciais(tmp_path):
+    caminho = tmp_path / "inventario.json"
+    caminho.write_text(json.dumps([{"camera_ip": "10.0.0.1", "username": "admin"}]), encoding="utf-8")
+    with pytest.raises(ValueError):
+        carregar_cameras(str(caminho))
+
+
+def test_booleano():
+    assert [booleano(v) for v in (True, "TRUE", " 1", "sim", False, "False", "0", "não", None, "", "talvez")] == \
+        [True, True, True, True, False, False, False, False, None, None, None]
+
+
+def test_https_do_inventario():
+    def com_https(camera_ip, username, password, https=False):
+        return https
+
+    def so_http(camera_ip, username, password):
+        return True
+
+    camera = {"camera_ip": "10.0.0.1", "username": "admin", "password": "a", "https": "true"}
+    assert _executar_camera(com_https, camera, {})["retorno"] is True
+    assert _executar_camera(com_https, camera, {"https": False})["retorno"] is False
+    falha = _executar_camera(so_http, camera, {})
+    assert not falha["ok"] and "HTTPS" in falha["erro"]
+    assert _executar_camera(so_http, {**camera, "https": "false"}, {})["ok"]
+
+
+def test_parse_kwargs():
+    assert _parse_kwargs(["https=false", 'modo="night"', "nivel=40", "texto=sem aspas"]) == \
+        {"https": False, "modo": "night", "nivel": 40, "texto": "sem aspas"}
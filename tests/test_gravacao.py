@@ -0,0 +1,97 @@
+"""
+Gravador e Reprodutor: a reprodução devolve as mesmas respostas sem a câmera, corpos sensíveis
+não vão para o arquivo e as exceções gravadas voltam como a mesma exceção do requests.
+"""
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+import requests_isapi
+from conftest import CAMERA_IP, JPEG, PASSWORD, USERNAME
+from gravacao import Gravador, Reprodutor, ler_arquivo, resumo
+
+
+class _SemResposta(BaseAdapter):
+    def send(self, request, **kwargs):
+        raise requests.exceptions.ConnectTimeout(f"{request.url} não respondeu", request=request)
+
+    def close(self):
+        pass
+
+
+def _reprodutor(monkeypatch, caminho, **kwargs):
+    sessao = requests.Session()
+    monkeypatch.setattr(requests_isapi, "sessao", sessao)
+    requests_isapi._auth_digest.cache_clear()
+    return Reprodutor.instalar(caminho, **kwargs)
+
+
+def test_reproduz_o_que_foi_gravado(camera, monkeypatch, tmp_path):
+    caminho = str(tmp_path / "camera.isapirec")
+    gravador = Gravador.instalar(caminho)
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD).conteudo == JPEG
+    assert requests_isapi.set_color(CAMERA_IP, USERNAME, PASSWORD, brightness=60)
+    gravador.fechar()
+    assert gravador.trocas == 3  # o desafio 401 só na primeira: o set_color já vai com o nonce
+
+    reprodutor = _reprodutor(monkeypatch, caminho, velocidade=0)
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD).conteudo == JPEG
+    assert requests_isapi.set_color(CAMERA_IP, USERNAME, PASSWORD, brightness=60)
+    assert reprodutor.estatisticas()["nao_gravadas"] == 0
+    assert set(resumo(caminho)["rotas"]) == {
+        "GET /ISAPI/Streaming/channels/1/picture 200", "GET /ISAPI/Streaming/channels/1/picture 401",
+        "PUT /ISAPI/Image/channels/1/color 200",
+    }
+
+
+def test_corpo_de_escrita_em_security_nao_e_gravado(camera, tmp_path):
+    caminho = str(tmp_path / "camera.isapirec")
+    gravador = Gravador.instalar(caminho)
+    requests_isapi.sessao.put(f"http://{CAMERA_IP}/ISAPI/Security/users/1", data=b"<password>segredo</password>",
+                              auth=requests_isapi._auth_digest(CAMERA_IP, USERNAME, PASSWORD), timeout=5)
+    requests_isapi.sessao.put(f"http://{CAMERA_IP}/ISAPI/Image/channels/1/color", data=b"<Color>publico</Color>",
+                              auth=requests_isapi._auth_digest(CAMERA_IP, USERNAME, PASSWORD), timeout=5)
+    gravador.fechar()
+
+    trocas, corpos = ler_arquivo(caminho)
+    assert all(t["corpo_requisicao"] is None for t in trocas if t["caminho"].startswith("/ISAPI/Security/"))
+    assert not any(b"segredo" in corpo for corpo in corpos.values())
+    assert b"<Color>publico</Color>" in corpos.values()
+    assert all("Authorization" not in t["cabecalhos_requisicao"] for t in trocas)
+
+
+def test_sem_repetir_cada_troca_sai_uma_vez(camera, monkeypatch, tmp_path):
+    caminho = str(tmp_path / "camera.isapirec")
+    gravador = Gravador.instalar(caminho)
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD)
+    gravador.fechar()
+
+    reprodutor = _reprodutor(monkeypatch, caminho, velocidade=0, repetir=False)
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD)
+    segunda = requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD)
+    assert segunda.status_code == 404
+    assert reprodutor.nao_gravadas == 1
+
+
+def test_excecao_gravada_e_reproduzida(monkeypatch, tmp_path):
+    caminho = str(tmp_path / "falha.isapirec")
+    sessao = requests.Session()
+    sessao.mount("http://", _SemResposta())
+    gravador = Gravador.instalar(caminho, sessao=sessao)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        sessao.get(f"http://{CAMERA_IP}/ISAPI/System/status", timeout=1)
+    gravador.fechar()
+
+    trocas, _ = ler_arquivo(caminho)
+    assert trocas[0]["status"] is None
+    assert trocas[0]["erro"]["tipo"] == "ConnectTimeout"
+    assert trocas[0]["latencia_s"] >= 0
+    assert "GET /ISAPI/System/status ConnectTimeout" in resumo(caminho)["rotas"]
+
+    _reprodutor(monkeypatch, caminho, velocidade=0)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        requests_isapi.sessao.get(f"http://{CAMERA_IP}/ISAPI/System/status", timeout=1)
+    # As funções do módulo tratam como na produção: Resultado com a falha de conexão
+    resultado = requests_isapi.get_device_status_capacities(CAMERA_IP, USERNAME, PASSWORD, output_file=None)
+    assert not resultado
+    assert resultado.status_code is None
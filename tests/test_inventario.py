@@ -0,0 +1,90 @@
+"""
+Registro do inventário: consultas por bitmap, credenciais inline sem senha no registro e os
+tempos de seleção e carga com frotas grandes.
+"""
+import json
+import time
+
+import pytest
+
+from inventario import Credenciais, Registro
+
+
+def _camera(i, **extras):
+    return {"camera_ip": f"10.{i >> 16}.{i >> 8 & 255}.{i & 255}", "site": f"site-{i % 800}",
+            "modelo": "A" if i % 3 else "B", "firmware": "5.7", "canais": 1 + i % 4,
+            "saude": "ok" if i % 10 else "offline", "credencial": "padrao", **extras}
+
+
+@pytest.fixture(scope="module")
+def frota():
+    registro = Registro()
+    for i in range(100_000):
+        registro.adicionar(_camera(i))
+    return registro
+
+
+def test_consultas_e_algebra():
+    registro = Registro()
+    for i in range(40):
+        registro.adicionar(_camera(i))
+    norte = registro.onde(site={"site-1", "site-2"})
+    assert norte.camera_ips() == ["10.0.0.1", "10.0.0.2"]
+    assert len(registro.onde(canais=lambda n: n >= 3)) == 20
+    assert len(~registro.onde(saude="ok")) == 4
+    assert len(registro.todos() - registro.onde(modelo="B")) == 26
+
+    registro.atualizar("10.0.0.1", saude="offline")
+    assert (norte & registro.onde(saude="ok")).camera_ips() == ["10.0.0.2"]
+    registro.remover("10.0.0.2")
+    assert registro.onde(site="site-2").camera_ips() == []
+    assert len(registro) == 39
+
+
+def test_linhas_em_ordem_nos_limites_dos_bytes():
+    registro = Registro()
+    for i in range(64):
+        registro.adicionar(_camera(i))
+    escolhidas = {0, 7, 8, 15, 16, 63}
+    selecao = registro.todos()
+    selecao.mascara = sum(1 << i for i in escolhidas)
+    assert selecao.linhas() == sorted(escolhidas)
+
+
+def test_senha_inline_fica_so_no_resolvedor(tmp_path):
+    caminho = tmp_path / "inventario.json"
+    caminho.write_text(json.dumps([
+        {"camera_ip": "10.0.0.1", "site": "norte", "username": "admin", "password": "s1"},
+        {"camera_ip": "10.0.0.2", "site": "norte", "username": "admin", "password": "s1"},
+        {"camera_ip": "10.0.0.3", "site": "norte", "username": "admin", "password": "s2"},
+        {"camera_ip": "10.0.0.4", "site": "norte", "credencial": "cofre"},
+    ]), encoding="utf-8")
+    credenciais = Credenciais(ambiente=False)
+    credenciais._arquivo = {"cofre": {"username": "op", "password": "s3"}}
+    registro = Registro.carregar(str(caminho), credenciais)
+
+    assert "s1" not in repr(registro.credencial.valores)
+    assert len(registro.credencial.valores) == 3  # o par repetido usa a mesma referência
+    assert [(c["username"], c["password"]) for c in registro.todos().cameras()] == \
+        [("admin", "s1"), ("admin", "s1"), ("admin", "s2"), ("op", "s3")]
+
+
+def test_senhas_inline_distintas_carregam_em_tempo_linear():
+    credenciais = Credenciais(ambiente=False)
+    inicio = time.perf_counter()
+    refs = [credenciais.registrar_inline("admin", f"senha-{i}") for i in range(20_000)]
+    assert time.perf_counter() - inicio < 0.5
+    assert len(set(refs)) == 20_000
+    assert credenciais.registrar_inline("admin", "senha-123") == refs[123]
+
+
+def test_selecao_em_100k_cameras_abaixo_de_1_ms(frota):
+    # 125 câmeras de um site com saúde ok: o custo acompanha a seleção, não a frota
+    tempos = []
+    for _ in range(7):
+        inicio = time.perf_counter()
+        ips = frota.onde(site="site-7", saude="ok").camera_ips()
+        tempos.append(time.perf_counter() - inicio)
+    assert len(ips) == 125
+    assert ips[0] == "10.0.0.7"
+    assert min(tempos) < 0.001
@@ -0,0 +1,79 @@
+"""
+Leitura incremental dos streams ISAPI: chunked, multipart com e sem Content-Length, e dados
+malformados virando ErroStream (que os consumidores tratam reconectando).
+"""
+import asyncio
+
+import pytest
+
+from isapi_stream import CorpoStream, ErroStream, RespostaStream, partes_multipart
+
+
+def _leitor(dados):
+    reader = asyncio.StreamReader()
+    reader.feed_data(dados)
+    reader.feed_eof()
+    return reader
+
+
+def _chunked(dados, tamanho=7):
+    pedacos = [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+    return b"".join(b"%x\r\n%s\r\n" % (len(p), p) for p in pedacos) + b"0\r\n\r\n"
+
+
+MULTIPART = (
+    b"preambulo\r\n--limite\r\n"
+    b"Content-Type: application/xml\r\nContent-Length: 9\r\n\r\n<a>1</a>\n\r\n--limite\r\n"
+    b"Content-Type: image/jpeg\r\n\r\nJPEG\r\n--limite--\r\n"
+)
+
+
+async def _todas(corpo, boundary=b"limite", **kwargs):
+    return [parte async for parte in partes_multipart(corpo, boundary, **kwargs)]
+
+
+def _rodar(ler, dados, chunked, **kwargs):
+    # O StreamReader precisa ser criado dentro do event loop
+    async def principal():
+        return await ler(CorpoStream(_leitor(dados), chunked, **kwargs))
+    return asyncio.run(principal())
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_partes_multipart(chunked):
+    dados = _chunked(MULTIPART) if chunked else MULTIPART
+    partes = _rodar(_todas, dados, chunked)
+    assert partes == [
+        ({"content-type": "application/xml", "content-length": "9"}, b"<a>1</a>\n"),
+        ({"content-type": "image/jpeg"}, b"JPEG"),
+    ]
+
+
+@pytest.mark.parametrize("tamanho", [b"zz", b"-5"])
+def test_tamanho_de_chunk_invalido_vira_erro_stream(tamanho):
+    dados = tamanho + b"\r\nabc\r\n0\r\n\r\n"
+    with pytest.raises(ErroStream):
+        _rodar(lambda corpo: corpo.readexactly(3), dados, True)
+
+
+@pytest.mark.parametrize("tamanho", [b"abc", b"-1"])
+def test_content_length_invalido_vira_erro_stream(tamanho):
+    dados = b"--limite\r\nContent-Length: " + tamanho + b"\r\n\r\nxyz\r\n--limite--\r\n"
+    with pytest.raises(ErroStream):
+        _rodar(_todas, dados, False)
+
+
+def test_parte_acima_do_limite():
+    dados = b"--limite\r\nContent-Length: 100\r\n\r\n" + b"x" * 100 + b"\r\n--limite--\r\n"
+    with pytest.raises(ErroStream):
+        _rodar(lambda corpo: _todas(corpo, max_parte=50), dados, False)
+
+
+def test_delimitador_acima_do_limite_do_buffer():
+    with pytest.raises(ErroStream):
+        _rodar(lambda corpo: corpo.readuntil(b"--limite"), _chunked(b"x" * 4096, 512), True, limite=1024)
+
+
+def test_boundary():
+    assert RespostaStream(200, {"content-type": 'multipart/mixed; boundary="limite"'}, None, None).boundary == b"limite"
+    assert RespostaStream(200, {"content-type": "application/xml"}, None, None).boundary is None
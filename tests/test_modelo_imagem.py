@@ -0,0 +1,86 @@
+"""
+Modelo do ImageChannelList: seções decodificadas só no primeiro acesso, PUT mínimo dos campos
+alterados, opt em qualquer posição dos atributos e o XML salvo lido uma vez por versão.
+"""
+import os
+
+import modelo_imagem
+import requests_isapi
+from conftest import CAMERA_IP, PASSWORD, USERNAME
+
+DOIS_CANAIS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ImageChannellist version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<ImageChannel version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<id>1</id><enabled>true</enabled>
+<Gain version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema"><GainLevel>40</GainLevel></Gain>
+</ImageChannel>
+<ImageChannel version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<id>2</id><enabled>false</enabled>
+<Shutter version="2.0" xmlns="http://www.hikvision.com/ver20/XMLSchema">
+<ShutterLevel min="1/1" opt="1/25,1/50,1/100" max="1/100">1/50</ShutterLevel>
+</Shutter>
+</ImageChannel>
+</ImageChannellist>"""
+
+
+def test_secoes_decodificadas_no_primeiro_acesso():
+    canal_1, canal_2 = modelo_imagem.ler_image_channels(DOIS_CANAIS)
+    assert (canal_1.id, canal_1.enabled, canal_2.id, canal_2.enabled) == (1, True, 2, False)
+    assert b"xmlns=" not in canal_1._xml
+    assert canal_1.secoes_carregadas() == {}
+
+    assert canal_1.gain.gain_level == 40
+    assert list(canal_1.secoes_carregadas()) == ["gain"]
+    assert canal_1.shutter is None
+    assert canal_1.gain is canal_1.gain  # decodificada uma vez só
+
+
+def test_opt_fora_da_primeira_posicao():
+    shutter = modelo_imagem.ler_image_channels(DOIS_CANAIS)[1].shutter
+    assert shutter.shutter_level == "1/50"
+    assert shutter.opcoes == ["1/25", "1/50", "1/100"]
+
+
+def test_payload_so_com_os_campos_alterados():
+    canal = modelo_imagem.ler_image_channels(DOIS_CANAIS)[0]
+    assert canal.payloads() == []
+    canal.gain.gain_level = 60
+    (caminho, xml), = canal.payloads()
+    assert caminho == "/ISAPI/Image/channels/1/gain"
+    assert xml.endswith("<GainLevel>60</GainLevel></Gain>")
+    canal.gain.limpar()
+    assert canal.gain.payload() is None
+
+
+def test_aplicar_limpa_as_secoes_aceitas(camera):
+    canal = modelo_imagem.buscar(CAMERA_IP, USERNAME, PASSWORD).conteudo[0]
+    canal.gain.gain_level = 60
+    canal.color.brightness_level = 70
+    resultado = canal.aplicar(CAMERA_IP, USERNAME, PASSWORD)
+    assert resultado
+    assert sorted(resultado.conteudo) == ["Color", "Gain"]
+    assert not canal.gain.alterada and not canal.color.alterada
+    assert ("PUT", "/ISAPI/Image/channels/1/gain") in camera.pedidas
+
+
+def test_ler_arquivo_relido_quando_muda(tmp_path):
+    caminho = tmp_path / "parametros.xml"
+    caminho.write_bytes(DOIS_CANAIS)
+    primeira = modelo_imagem.ler_arquivo(str(caminho))
+    assert modelo_imagem.ler_arquivo(str(caminho)) is primeira
+
+    caminho.write_bytes(DOIS_CANAIS.replace(b"<GainLevel>40<", b"<GainLevel>45<"))
+    estado = os.stat(caminho)
+    os.utime(caminho, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+    segunda = modelo_imagem.ler_arquivo(str(caminho))
+    assert segunda is not primeira
+    assert segunda[0].gain.gain_level == 45
+
+
+def test_shutter_do_primeiro_canal_que_tiver(tmp_path):
+    # O canal 1 não tem Shutter: vale o do canal 2, como o antigo find(".//ShutterLevel")
+    caminho = tmp_path / "parametros.xml"
+    caminho.write_bytes(DOIS_CANAIS)
+    resultado = requests_isapi.get_shutter_time_levels_from_file(CAMERA_IP, USERNAME, PASSWORD, file_path=str(caminho))
+    assert resultado
+    assert resultado.conteudo == ["1/25", "1/50", "1/100"]
@@ -0,0 +1,75 @@
+"""
+PipelinePreviews: previews gravados em lote a partir do ao_frame da captura, limite de pendentes e
+falhas (do gerador ou da escrita) que não travam a captura.
+"""
+import os
+
+import pytest
+
+import requests_isapi
+from conftest import CAMERA_IP, JPEG, PASSWORD, USERNAME
+from previews import PipelinePreviews
+
+
+def reduzir(dados, tamanho, qualidade):
+    # Gerador de nível de módulo (vai ao pool de processos) que não depende do Pillow
+    return dados[:tamanho[0]]
+
+
+def falhar_se_vazio(dados, tamanho, qualidade):
+    if not dados:
+        raise ValueError("frame vazio")
+    return dados
+
+
+def test_previews_do_ao_frame(camera, tmp_path):
+    with PipelinePreviews(str(tmp_path), tamanho=(8, 8), lote=2, gerar=reduzir) as previews:
+        for _ in range(3):
+            assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD, ao_frame=previews.enviar)
+    assert (tmp_path / f"{CAMERA_IP}_imagem.jpg").read_bytes() == JPEG[:8]
+    assert previews.estatisticas()["recebidos"] == 3
+    assert previews.estatisticas()["gravados"] == 3
+    assert previews.estatisticas()["pendentes"] == 0
+
+
+def test_falha_do_gerador_conta_e_segue(tmp_path):
+    with PipelinePreviews(str(tmp_path), lote=4, gerar=falhar_se_vazio) as previews:
+        for i in range(8):
+            previews.enviar(f"{i}.jpg", b"" if i % 2 else b"jpeg")
+    assert previews.falhas == 4
+    assert sorted(os.listdir(tmp_path)) == ["0.jpg", "2.jpg", "4.jpg", "6.jpg"]
+
+
+def test_falha_de_escrita_libera_as_vagas(tmp_path):
+    with PipelinePreviews(str(tmp_path), lote=1, max_pendentes=2, gerar=reduzir) as previews:
+        # Diretório inexistente: open() falha na thread de escrita
+        for i in range(6):
+            assert previews.enviar(f"sumiu/{i}.jpg", b"jpeg", timeout=5)
+        assert previews.esvaziar(timeout=5)
+        assert previews._escritor.is_alive()
+        assert previews.enviar("ok.jpg", b"jpeg", timeout=5)
+    assert previews.falhas == 6
+    assert previews.gravados == 1
+
+
+def test_limite_de_pendentes(tmp_path):
+    previews = PipelinePreviews(str(tmp_path), lote=16, max_pendentes=1, gerar=reduzir)
+    try:
+        assert previews.enviar("a.jpg", b"jpeg")
+        assert previews.enviar("b.jpg", b"jpeg", bloquear=False) is False
+        assert previews.recusados == 1
+    finally:
+        previews.fechar()
+    assert os.listdir(tmp_path) == ["a.jpg"]
+
+
+def test_gerar_preview_reduz_sem_decodificar_cheio(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    from io import BytesIO
+
+    from previews import gerar_preview
+
+    entrada = BytesIO()
+    Image.new("RGB", (2688, 1520), "gray").save(entrada, "JPEG")
+    preview = Image.open(BytesIO(gerar_preview(entrada.getvalue(), (320, 180))))
+    assert preview.size[0] <= 320 and preview.size[1] <= 180
@@ -0,0 +1,103 @@
+"""
+Snapshots negociados: menor resolução que cobre o pedido, sub-stream para o firmware que ignora ou
+recusa os parâmetros, e falhas passageiras que não marcam a câmera.
+"""
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from conftest import CAMERA_IP, PASSWORD, USERNAME
+from snapshot import Snapshots, dimensoes_jpeg, escolher_resolucao, ler_resolucoes
+
+CAPACIDADES = (b'<StreamingChannel><Video>'
+               b'<videoResolutionWidth min="640" max="2688" opt="640,1280,2688">2688</videoResolutionWidth>'
+               b'<videoResolutionHeight min="360" max="1520" opt="360,720,1520">1520</videoResolutionHeight>'
+               b'</Video></StreamingChannel>')
+SUB = (b"<StreamingChannel><Video><videoResolutionWidth>640</videoResolutionWidth>"
+       b"<videoResolutionHeight>360</videoResolutionHeight></Video></StreamingChannel>")
+RECUSA = (b"<ResponseStatus><statusCode>4</statusCode><statusString>Invalid Operation</statusString>"
+          b"<subStatusCode>badParameters</subStatusCode></ResponseStatus>")
+
+
+def jpeg(largura, altura):
+    sof = b"\xff\xc0\x00\x11\x08" + altura.to_bytes(2, "big") + largura.to_bytes(2, "big") + b"\x03" + bytes(9)
+    return b"\xff\xd8" + sof + b"x" * (largura * altura // 100) + b"\xff\xd9"
+
+
+def _picture(comportamento):
+    """Rota do .../picture do canal principal: 'aceita', 'ignora', 'recusa' ou 'indisponivel'."""
+    def responder(request):
+        parametros = parse_qs(urlsplit(request.url).query)
+        if comportamento == "indisponivel":
+            return 503, "text/plain", b"Service Unavailable"
+        if "videoResolutionWidth" in parametros:
+            if comportamento == "recusa":
+                return 400, "application/xml", RECUSA
+            if comportamento == "aceita":
+                return 200, "image/jpeg", jpeg(int(parametros["videoResolutionWidth"][0]), int(parametros["videoResolutionHeight"][0]))
+        return 200, "image/jpeg", jpeg(2688, 1520)
+    return responder
+
+
+@pytest.fixture
+def camera_snapshot(camera):
+    camera.rotas[("GET", "/ISAPI/Streaming/channels/101/capabilities")] = (200, "application/xml", CAPACIDADES)
+    camera.rotas[("GET", "/ISAPI/Streaming/channels/102/capabilities")] = (200, "application/xml", SUB)
+    camera.rotas[("GET", "/ISAPI/Streaming/channels/102/picture")] = (200, "image/jpeg", jpeg(640, 360))
+    return camera
+
+
+def _pictures(camera):
+    return [caminho for metodo, caminho in camera.pedidas if caminho.endswith("/picture")]
+
+
+def test_pede_a_menor_resolucao_que_cobre(camera_snapshot):
+    camera_snapshot.rotas[("GET", "/ISAPI/Streaming/channels/101/picture")] = _picture("aceita")
+    snapshots = Snapshots()
+    resultado = snapshots.capturar(CAMERA_IP, USERNAME, PASSWORD, 1000, 500)
+    assert dimensoes_jpeg(resultado.conteudo) == (1280, 720)
+    assert snapshots.bytes_economizados > 0
+    assert snapshots.estatisticas()["cameras_sem_parametros"] == []
+
+
+def test_firmware_que_ignora_passa_ao_sub_stream(camera_snapshot):
+    camera_snapshot.rotas[("GET", "/ISAPI/Streaming/channels/101/picture")] = _picture("ignora")
+    snapshots = Snapshots()
+    assert dimensoes_jpeg(snapshots.capturar(CAMERA_IP, USERNAME, PASSWORD, 640, 360).conteudo) == (2688, 1520)
+    assert dimensoes_jpeg(snapshots.capturar(CAMERA_IP, USERNAME, PASSWORD, 640, 360).conteudo) == (640, 360)
+    assert _pictures(camera_snapshot)[-1] == "/ISAPI/Streaming/channels/102/picture"
+    assert snapshots.estatisticas()["cameras_sem_parametros"] == [CAMERA_IP]
+
+
+def test_firmware_que_recusa_tenta_o_sub_stream_na_hora(camera_snapshot):
+    camera_snapshot.rotas[("GET", "/ISAPI/Streaming/channels/101/picture")] = _picture("recusa")
+    snapshots = Snapshots()
+    resultado = snapshots.capturar(CAMERA_IP, USERNAME, PASSWORD, 640, 360)
+    assert resultado and dimensoes_jpeg(resultado.conteudo) == (640, 360)
+    assert CAMERA_IP in snapshots.estatisticas()["cameras_sem_parametros"]
+
+
+def test_falha_passageira_nao_marca_a_camera(camera_snapshot):
+    camera_snapshot.rotas[("GET", "/ISAPI/Streaming/channels/101/picture")] = _picture("indisponivel")
+    snapshots = Snapshots()
+    resultado = snapshots.capturar(CAMERA_IP, USERNAME, PASSWORD, 640, 360)
+    assert not resultado and resultado.status_code == 503
+    assert snapshots.estatisticas()["cameras_sem_parametros"] == []
+
+
+def test_ler_resolucoes_com_opt_em_qualquer_atributo():
+    assert ler_resolucoes(CAPACIDADES) == ([(640, 360), (1280, 720), (2688, 1520)], (2688, 1520))
+    assert ler_resolucoes(SUB) == ([(640, 360)], (640, 360))
+    assert ler_resolucoes(b"<StreamingChannel/>") == ([], None)
+
+
+def test_escolher_resolucao():
+    opcoes = [(640, 360), (1280, 720), (2688, 1520)]
+    assert escolher_resolucao(opcoes, 641, 100) == (1280, 720)
+    assert escolher_resolucao(opcoes, 4000, 3000) == (2688, 1520)
+    assert escolher_resolucao([], 640, 360) is None
+
+
+def test_dimensoes_jpeg():
+    assert dimensoes_jpeg(jpeg(320, 240)) == (320, 240)
+    assert dimensoes_jpeg(b"nao e jpeg") is None
@@ -0,0 +1,58 @@
+"""
+Regressões do VooUnico: quem tem a senha errada nunca recebe a resposta que a câmera deu a quem tem
+a certa, nem em voo nem na janela.
+"""
+import threading
+import time
+
+import requests_isapi
+from conftest import CAMERA_IP, JPEG, PASSWORD, USERNAME
+from voo_unico import VooUnico
+
+
+def _em_paralelo(*chamadas):
+    resultados = [None] * len(chamadas)
+
+    def rodar(i, funcao, args):
+        resultados[i] = funcao(*args)
+
+    threads = []
+    for i, (funcao, args) in enumerate(chamadas):
+        thread = threading.Thread(target=rodar, args=(i, funcao, args))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)  # os seguintes chegam com o primeiro ainda em voo
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+def test_voo_unico_nao_junta_senha_errada(camera_lenta):
+    VooUnico.instalar()
+
+    certa, errada = _em_paralelo(
+        (requests_isapi.capturar_imagem, (CAMERA_IP, USERNAME, PASSWORD)),
+        (requests_isapi.capturar_imagem, (CAMERA_IP, USERNAME, "senha-errada")),
+    )
+    assert certa and certa.conteudo == JPEG
+    assert not errada
+    assert errada.status_code == 401
+
+
+def test_voo_unico_janela_nao_serve_senha_errada(camera):
+    VooUnico.instalar(janela_s=60)
+
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD)
+    errada = requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, "senha-errada")
+    assert not errada
+    assert errada.status_code == 401
+
+
+def test_voo_unico_junta_mesma_credencial(camera_lenta):
+    voo = VooUnico.instalar()
+    # Digest já negociado: as três vão direto com Authorization e ficam na mesma chave
+    assert requests_isapi.capturar_imagem(CAMERA_IP, USERNAME, PASSWORD)
+
+    resultados = _em_paralelo(*[(requests_isapi.capturar_imagem, (CAMERA_IP, USERNAME, PASSWORD))] * 3)
+    assert all(r and r.conteudo == JPEG for r in resultados)
+    assert voo.juntadas >= 1
@@ -0,0 +1,167 @@
+"""
+Junção de GETs idênticos e simultâneos (single-flight): quando vários serviços pedem o mesmo
+snapshot ou status da mesma câmera quase ao mesmo tempo, só um GET vai para a câmera e todos
+recebem a mesma resposta.
+
+Como o ControleCarga e o CacheConfiguracao, o VooUnico é um adapter montado na sessão do
+requests_isapi, então salvar_imagem, capturar_imagem, get_device_status_capacities etc. não mudam.
+A chave é (câmera, caminho, query, credencial, perna do Digest), em que a credencial é a impressão
+de usuário e senha do HTTPDigestAuth da requisição: quem tem outra senha nunca recebe a resposta de
+quem tem a certa, nem em voo nem na janela. O primeiro pedido (líder) faz a requisição e lê o corpo; os que chegam enquanto ele está em voo esperam e recebem um Response
+próprio apontando para o mesmo bytes do líder, sem cópia (bytes é imutável: o buffer compartilhado
+é só leitura). Com `janela_s` > 0, uma resposta 200 também atende quem pedir até `janela_s`
+segundos depois de ela chegar.
+
+Exceções do líder (timeout, conexão recusada) são repassadas a todos os que esperavam por ele.
+
+Exemplo:
+    voo = VooUnico.instalar(janela_s=0.5)
+    ... várias threads chamando requests_isapi.salvar_imagem(camera_ip, ...) ...
+    print(voo.estatisticas())
+"""
+import datetime
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+import requests_isapi
+
+
+class _Voo:
+    __slots__ = ("pronto", "status_code", "reason", "headers", "encoding", "conteudo", "erro", "chegou_em", "esperando")
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.status_code = None
+        self.reason = None
+        self.headers = None
+        self.encoding = None
+        self.conteudo = None
+        self.erro = None
+        self.chegou_em = None
+        self.esperando = 0
+
+
+class VooUnico(BaseAdapter):
+    """Adapter que junta GETs idênticos em voo e, opcionalmente, reaproveita respostas recentes."""
+
+    def __init__(self, internos, janela_s=0.0, caminhos=None):
+        super().__init__()
+        self.internos = internos  # prefixo -> adapter original
+        self.janela_s = janela_s
+        self.caminhos = tuple(caminhos) if caminhos else None
+        self._em_voo = {}
+        self._recentes = {}
+        self._lock = threading.Lock()
+
+        self.requisicoes = 0
+        self.lideres = 0
+        self.juntadas = 0
+        self.da_janela = 0
+
+    @classmethod
+    def instalar(cls, sessao=None, **kwargs):
+        """Envolve os adapters da sessão (padrão: requests_isapi.sessao) e devolve o VooUnico."""
+        sessao = sessao or requests_isapi.sessao
+        atual = sessao.get_adapter("http://")
+        if isinstance(atual, VooUnico):
+            return atual
+        voo = cls({prefixo: sessao.get_adapter(prefixo) for prefixo in ("https://", "http://")}, **kwargs)
+        for prefixo in voo.internos:
+            sessao.mount(prefixo, voo)
+        return voo
+
+    def _repassar(self, request, partes, **kwargs):
+        interno = self.internos["https://" if partes.scheme == "https" else "http://"]
+        resposta = interno.send(request, **kwargs)
+        # O HTTPDigestAuth reenvia pelo resposta.connection: a perna autenticada também é juntada
+        resposta.connection = self
+        return resposta
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        partes = urlsplit(request.url)
+        opcoes = {"stream": stream, "timeout": timeout, "verify": verify, "cert": cert, "proxies": proxies}
+        if request.method != "GET" or (self.caminhos and not partes.path.startswith(self.caminhos)):
+            return self._repassar(request, partes, **opcoes)
+
+        # Só junta pedidos com as mesmas credenciais; e, dentro delas, a primeira perna do Digest
+        # (sem Authorization) só com outras primeiras pernas
+        chave = (partes.scheme, partes.netloc, partes.path, partes.query,
+                 requests_isapi._credencial_da_requisicao(request), "Authorization" in request.headers)
+
+        with self._lock:
+            self.requisicoes += 1
+            recente = self._recentes.get(chave)
+            if recente is not None and time.monotonic() - recente.chegou_em <= self.janela_s:
+                self.da_janela += 1
+                return self._resposta(request, recente)
+            voo = self._em_voo.get(chave)
+            if voo is not None:
+                voo.esperando += 1
+                self.juntadas += 1
+                lider = False
+            else:
+                voo = self._em_voo[chave] = _Voo()
+                self.lideres += 1
+                lider = True
+
+        if not lider:
+            voo.pronto.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return self._resposta(request, voo)
+
+        try:
+            resposta = self._repassar(request, partes, **opcoes)
+            voo.conteudo = resposta.content  # lido uma vez, compartilhado com quem esperou
+            voo.status_code, voo.reason, voo.encoding = resposta.status_code, resposta.reason, resposta.encoding
+            voo.headers = dict(resposta.headers)
+            voo.chegou_em = time.monotonic()
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+                if self.janela_s > 0 and voo.erro is None and voo.status_code == 200:
+                    self._recentes[chave] = voo
+                    self._limpar_recentes()
+            voo.pronto.set()
+        return resposta
+
+    def _limpar_recentes(self):
+        # Chamado com o lock; só varre quando há muitas entradas
+        if len(self._recentes) > 1024:
+            agora = time.monotonic()
+            for chave in [c for c, v in self._recentes.items() if agora - v.chegou_em > self.janela_s]:
+                del self._recentes[chave]
+
+    def _resposta(self, request, voo):
+        resposta = Response()
+        resposta.status_code = voo.status_code
+        resposta.reason = voo.reason
+        resposta.headers = CaseInsensitiveDict(voo.headers)
+        resposta.encoding = voo.encoding
+        resposta._content = voo.conteudo
+        resposta.url = request.url
+        resposta.request = request
+        resposta.elapsed = datetime.timedelta(0)
+        resposta.connection = self
+        return resposta
+
+    def close(self):
+        for interno in set(self.internos.values()):
+            interno.close()
+
+    def estatisticas(self):
+        return {
+            "requisicoes": self.requisicoes,
+            "enviadas": self.lideres,
+            "juntadas": self.juntadas,
+            "da_janela": self.da_janela,
+            "economia": round((self.juntadas + self.da_janela) / self.requisicoes, 3) if self.requisicoes else 0.0,
+        }